@@ -0,0 +1,175 @@
+"""Benchmark do ciclo completo webhook → agente → envio, sem a Meta.
+
+Sobe o stand-in da Graph API (src/graph_api_stub.py) em uma thread local,
+aponta WA_GRAPH_API_BASE_URL para ele e dispara mensagens de vários
+clientes no webhook. Mede a vazão e a latência de ponta a ponta (do POST
+no webhook até a resposta chegar ao stub), com as falhas injetadas.
+
+No modo "agent" (padrão) o webhook usa o mesmo handler de main.py com um
+SalonAIAgent de verdade: LLM_BACKEND=scripted e DynamoDB/Calendar em memória
+(src/memory_services.py). Cada cliente repete uma conversa de agendamento
+(saudação, botão de serviço, data, botão de horário, consulta e uma pergunta
+livre para o LLM). O modo "pipeline" usa o process_message de exemplo de
+whatsapp_webhook e mede só dispatcher, outbox, limitador e cliente HTTP.
+
+Uso:
+    python benchmarks/bench_end_to_end.py [mensagens] [clientes] [latência_ms] [taxa_429] [taxa_5xx] [agent|pipeline]
+    LLM_SCRIPTED_LATENCY=lognormal:800:0.5 python benchmarks/bench_end_to_end.py 500 50 50 0.02 0.02 agent
+"""
+import io
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import redirect_stdout
+from werkzeug.serving import make_server
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, 'src'))
+
+from graph_api_stub import GraphAPIStub, create_app
+from metrics import RollingStats
+
+# Conversa repetida por cliente no modo agent: (tipo, conteúdo)
+CONVERSATION = [
+    ('text', "Oi"),
+    ('button', ("service_corte_feminino", "Corte Feminino - R$ 50.00")),
+    ('text', "amanhã"),
+    ('button', ("time_10:00", "10:00 - 11:00")),
+    ('text', "meus agendamentos"),
+    ('text', "Vocês aceitam cartão?")
+]
+
+def start_stub(stub):
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = make_server('127.0.0.1', 0, create_app(stub), threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def build_message(phone_number, index, step, mode):
+    message = {
+        "from": phone_number,
+        "id": f"wamid.e2e.{index}",
+        "timestamp": str(int(time.time()))
+    }
+    kind, content = CONVERSATION[step % len(CONVERSATION)] if mode == 'agent' else ('text', f"msg-{index}")
+    if kind == 'button':
+        reply_id, title = content
+        message.update({"type": "interactive",
+                        "interactive": {"type": "button_reply", "button_reply": {"id": reply_id, "title": title}}})
+    else:
+        message.update({"type": "text", "text": {"body": content}})
+    return message
+
+def message_payload(message):
+    return {
+        "object": "whatsapp_business_account",
+        "entry": [{
+            "id": "102290129340398",
+            "changes": [{
+                "field": "messages",
+                "value": {
+                    "messaging_product": "whatsapp",
+                    "metadata": {"display_phone_number": "15550783881", "phone_number_id": "106540352242922"},
+                    "contacts": [{"profile": {"name": "Cliente"}, "wa_id": message["from"]}],
+                    "messages": [message]
+                }
+            }]
+        }]
+    }
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    clients = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    latency_ms = float(sys.argv[3]) if len(sys.argv) > 3 else 50
+    rate_429 = float(sys.argv[4]) if len(sys.argv) > 4 else 0.02
+    rate_5xx = float(sys.argv[5]) if len(sys.argv) > 5 else 0.02
+    mode = sys.argv[6] if len(sys.argv) > 6 else 'agent'
+    
+    stub = GraphAPIStub(latency_ms=latency_ms, latency_jitter_ms=latency_ms / 2,
+                        error_rate_429=rate_429, error_rate_5xx=rate_5xx, retry_after=0.2, seed=42)
+    server = start_stub(stub)
+    
+    # A configuração é lida na importação: precisa ser definida antes
+    temp_dir = tempfile.mkdtemp()
+    os.environ['WA_GRAPH_API_BASE_URL'] = f"http://127.0.0.1:{server.server_port}"
+    os.environ['WA_BUSINESS_API_PHONE_ID'] = '106540352242922'
+    os.environ['OUTBOX_PATH'] = os.path.join(temp_dir, 'outbox.db')
+    os.environ['LLM_BACKEND'] = 'scripted'
+    os.environ.setdefault('LLM_SCRIPTED_LATENCY', 'lognormal:300:0.4')
+    os.environ.setdefault('WA_PAIR_RATE_PER_SEC', '1000')
+    os.environ.setdefault('WA_PAIR_BURST', '1000')
+    os.environ.setdefault('WA_GLOBAL_RATE_PER_SEC', '1000')
+    
+    import whatsapp_webhook
+    agent = None
+    if mode == 'agent':
+        from ai_agent import SalonAIAgent
+        from memory_services import MemoryDynamoDBService, MemoryCalendarService
+        agent = SalonAIAgent(db_service=MemoryDynamoDBService(), calendar_service=MemoryCalendarService())
+        whatsapp_webhook.process_message = whatsapp_webhook.make_agent_handler(agent)
+    whatsapp_webhook.start_outbox_workers()
+    app = whatsapp_webhook.app
+    
+    phones = [f"55119{i:08d}" for i in range(clients)]
+    messages = [build_message(phones[i % clients], i, i // clients, mode) for i in range(total)]
+    bodies = [json.dumps(message_payload(message)).encode('utf-8') for message in messages]
+    sent_at = {}
+    
+    def post(index):
+        sent_at[index] = time.time()
+        app.test_client().post('/webhook', data=bodies[index], headers={"Content-Type": "application/json"})
+    
+    sink = io.StringIO()
+    with redirect_stdout(sink):
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=clients) as executor:
+            list(executor.map(post, range(total)))
+        ingress_elapsed = time.perf_counter() - start
+        
+        deadline = time.time() + 120
+        while len(stub.get_messages()) < total and time.time() < deadline:
+            time.sleep(0.01)
+        elapsed = time.perf_counter() - start
+    
+    # Uma resposta por mensagem, na ordem de chegada de cada cliente
+    sent_by_phone = defaultdict(list)
+    for index, message in enumerate(messages):
+        sent_by_phone[message["from"]].append(sent_at[index])
+    latency = RollingStats(window=total)
+    received = defaultdict(int)
+    for message in stub.get_messages():
+        phone_number = message["payload"]["to"]
+        sent = sorted(sent_by_phone[phone_number])
+        if received[phone_number] < len(sent):
+            latency.add(message["received_at"] - sent[received[phone_number]])
+            received[phone_number] += 1
+    
+    delivered = len(stub.get_messages())
+    print(f"Modo: {mode}  mensagens: {total}  clientes: {clients}  latência do stub: {latency_ms:.0f} ms  "
+          f"429: {rate_429:.0%}  5xx: {rate_5xx:.0%}")
+    if agent is not None:
+        print(f"LLM scripted: {os.environ['LLM_SCRIPTED_LATENCY']}")
+    print(f"Webhook (todas as requisições respondidas): {ingress_elapsed:.2f} s")
+    print(f"Entregues ao stub: {delivered}/{total} em {elapsed:.2f} s ({delivered / elapsed:.1f} msg/s)")
+    print(f"Latência ponta a ponta (ms): {latency.summary(scale=1000)}")
+    if agent is not None:
+        turns = agent.get_turn_stats()
+        intents = agent.get_intent_stats()
+        print(f"Agente: turno (ms) {turns['turn_ms']}  respondidas sem LLM: {intents['absorbed_fraction']:.0%}  "
+              f"seleções diretas: {agent.get_reply_stats()['handled']}")
+    print(f"Stub: {stub.get_stats()}")
+    print(f"Outbox: {whatsapp_webhook.outbox_drainer.get_stats()}")
+    
+    whatsapp_webhook.outbox_drainer.stop()
+    whatsapp_webhook.dispatcher.shutdown()
+    server.shutdown()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""Benchmark do agente inteiro com diferentes backends de LLM, sem AWS nem Google.
+
+Cada turno é um SalonAIAgent.process_message completo (contexto, classificador
+local, caches, proteção do LLM, ação e gravação do contexto) sobre o DynamoDB
+e o Google Calendar em memória de src/memory_services.py. Cada thread
+conduz as conversas de alguns clientes em ordem, como os shards do
+dispatcher. Sem argumentos compara o backend local com algumas distribuições
+de latência; "gemini" na lista de backends usa a API de verdade (precisa de
+GEMINI_API_KEY e gera custo).
+
+Uso:
+    python benchmarks/bench_llm_backend.py [turnos] [concorrência] [backend ...]
+    python benchmarks/bench_llm_backend.py 200 8 constant:800 lognormal:800:0.6 gemini
+"""
+import io
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import redirect_stdout
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, 'src'))
+
+from config.config import GEMINI_API_KEY, LLM_MODEL
+from ai_agent import SalonAIAgent
+from llm_backend import GeminiBackend, ScriptedBackend
+from memory_services import MemoryDynamoDBService, MemoryCalendarService
+from metrics import RollingStats
+
+MESSAGES = [
+    "Oi", "Quanto custa a hidratação?", "Quero marcar um corte para sexta", "Vocês abrem no feriado?",
+    "Quais são meus agendamentos?", "Preciso cancelar meu horário de amanhã", "Aceitam cartão?"
+]
+
+CLIENTS_PER_THREAD = 4
+
+def run(agent, turns, concurrency):
+    latency = RollingStats(window=turns)
+    phones = [f"55119{i:08d}" for i in range(concurrency * CLIENTS_PER_THREAD)]
+    
+    def conversations(worker):
+        # Os clientes de cada thread mandam as mensagens em ordem, um turno por vez
+        own = phones[worker::concurrency]
+        for index in range(worker, turns, concurrency):
+            step = index // concurrency
+            phone_number = own[step % len(own)]
+            start = time.perf_counter()
+            agent.process_message(phone_number, MESSAGES[(step // len(own)) % len(MESSAGES)])
+            latency.add(time.perf_counter() - start)
+    
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(conversations, range(concurrency)))
+    return time.perf_counter() - start, latency
+
+def main():
+    turns = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    specs = sys.argv[3:] or ['constant:300', 'uniform:100:500', 'lognormal:300:0.6']
+    
+    print(f"Turnos: {turns}  concorrência: {concurrency}  clientes: {concurrency * CLIENTS_PER_THREAD}")
+    for spec in specs:
+        if spec == 'gemini':
+            backend, label = GeminiBackend(GEMINI_API_KEY, LLM_MODEL), f"gemini ({LLM_MODEL})"
+        else:
+            backend, label = ScriptedBackend(latency=spec, seed=42), f"scripted {spec}"
+        
+        sink = io.StringIO()
+        with redirect_stdout(sink):
+            agent = SalonAIAgent(db_service=MemoryDynamoDBService(), calendar_service=MemoryCalendarService(),
+                                 llm=backend)
+            elapsed, latency = run(agent, turns, concurrency)
+        
+        llm = agent.get_llm_stats()
+        intents = agent.get_intent_stats()
+        cache = agent.response_cache.get_stats() if agent.response_cache is not None else {"hits": 0}
+        print(f"{label}: {turns / elapsed:.1f} turnos/s  turno (ms): {latency.summary(scale=1000)}")
+        print(f"    chamadas ao LLM: {llm['calls']}  latência do LLM (ms): {llm['latency_ms']}  "
+              f"sem LLM: {intents['absorbed']} pelo classificador, {cache['hits']} pelo cache  "
+              f"respostas alternativas: {llm['fallbacks']}  recusadas: {llm['rejected']}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""Benchmark do índice de similaridade com muitas entradas em um mesmo escopo.
+
+Gera mensagens sintéticas combinando palavras do domínio do salão, indexa
+todas em um único escopo (o pior caso: nenhuma separação por estado) e mede
+o tempo de indexação e a latência das buscas, tanto de paráfrases de
+mensagens indexadas quanto de mensagens novas.
+
+Uso:
+    python benchmarks/bench_similarity_index.py [entradas] [buscas]
+"""
+import io
+import os
+import random
+import sys
+import time
+from contextlib import redirect_stdout
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, 'src'))
+
+from metrics import RollingStats
+from similarity_index import SimilarityIndex, similarity_scope
+
+WORDS = [
+    "corte", "cabelo", "feminino", "masculino", "manicure", "pedicure", "hidratacao", "escova",
+    "unha", "barba", "franja", "luzes", "tintura", "progressiva", "horario", "preco", "valor",
+    "endereco", "estacionamento", "cartao", "pix", "feriado", "sabado", "aberto", "fechado",
+    "agendar", "marcar", "desmarcar", "remarcar", "atendimento", "profissional", "cabeleireira",
+    "rapido", "demora", "quanto", "custa", "tempo", "dura", "aceitam", "fazem", "tem", "vaga"
+]
+
+def synthetic_message(rng):
+    return ' '.join(rng.sample(WORDS, rng.randint(3, 6))) + f" ref{rng.randint(0, 10 ** 9)}"
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    lookups = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    
+    rng = random.Random(42)
+    index = SimilarityIndex(max_entries=total, background_rebuild=False)
+    scope = similarity_scope('greeting', {})
+    messages = [synthetic_message(rng) for _ in range(total)]
+    
+    sink = io.StringIO()
+    with redirect_stdout(sink):
+        start = time.perf_counter()
+        for i, message in enumerate(messages):
+            index.add(scope, message, {"message": str(i), "action": "continue_conversation", "data": {}})
+        add_elapsed = time.perf_counter() - start
+    
+    # Paráfrases: mesma mensagem com pontuação, acentos e caixa diferentes
+    known = RollingStats(window=lookups)
+    hits = 0
+    for message in rng.sample(messages, lookups):
+        query = message.upper().replace("hidratacao", "hidratação") + "?"
+        start = time.perf_counter()
+        hits += index.lookup(scope, query) is not None
+        known.add(time.perf_counter() - start)
+    
+    unknown = RollingStats(window=lookups)
+    for _ in range(lookups):
+        query = synthetic_message(rng)
+        start = time.perf_counter()
+        index.lookup(scope, query)
+        unknown.add(time.perf_counter() - start)
+    
+    stats = index.get_stats()
+    print(f"Entradas: {stats['entries']}  reconstruções do IVF: {stats['rebuilds']}")
+    print(f"Indexação: {add_elapsed:.1f} s ({add_elapsed / total * 1e6:.0f} µs/entrada)")
+    print(f"Busca de paráfrases (ms): {known.summary(scale=1000, digits=3)}  encontradas: {hits}/{lookups}")
+    print(f"Busca de mensagens novas (ms): {unknown.summary(scale=1000, digits=3)}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+"""Benchmark de inicialização do DynamoDBService (cold start de um worker).
+
+Cada medida roda em um processo novo. As chamadas à AWS não saem da máquina:
+um hook do botocore responde DescribeTable/GetItem localmente depois de
+esperar o RTT simulado, então serialização, assinatura e parsing do boto3
+entram na conta. Compara o construtor antigo, que criava/descrevia as seis
+tabelas ("eager", equivalente a DynamoDBService() + create_tables()), com o
+construtor atual, que não faz chamadas ("lazy"), e mede a primeira leitura.
+
+Uso:
+    python benchmarks/bench_startup.py [execuções] [rtt_ms]
+    python benchmarks/bench_startup.py 10 25
+"""
+import json
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, 'src'))
+
+class FakeRaw:
+    def __init__(self, body):
+        self.body = body
+    
+    def stream(self, **kwargs):
+        yield self.body
+
+def install_fake_dynamodb(rtt_ms, calls):
+    """Responde às chamadas do DynamoDB localmente, com latência de rede simulada"""
+    import boto3
+    from botocore.awsrequest import AWSResponse
+    from dynamodb_service import TABLE_SCHEMAS
+    
+    def handler(request, **kwargs):
+        time.sleep(rtt_ms / 1000.0)
+        operation = request.headers.get('X-Amz-Target', b'').decode().split('.')[-1]
+        payload = json.loads(request.body or b'{}')
+        calls[operation] = calls.get(operation, 0) + 1
+        if operation == 'DescribeTable':
+            schema = TABLE_SCHEMAS[payload['TableName']]
+            body = {"Table": {
+                "TableName": payload['TableName'],
+                "TableStatus": "ACTIVE",
+                "KeySchema": [{"AttributeName": schema['key'], "KeyType": "HASH"}],
+                "GlobalSecondaryIndexes": [{"IndexName": name, "IndexStatus": "ACTIVE"} for name in schema['indexes']]
+            }}
+        else:
+            body = {}
+        return AWSResponse(request.url, 200, {}, FakeRaw(json.dumps(body).encode()))
+    
+    boto3.setup_default_session(aws_access_key_id='bench', aws_secret_access_key='bench', region_name='us-east-1')
+    boto3.DEFAULT_SESSION.events.register('before-send.dynamodb', handler)
+
+def measure(mode, rtt_ms):
+    """Uma medida no processo atual (chamado pelo processo filho)"""
+    calls = {}
+    start = time.perf_counter()
+    install_fake_dynamodb(rtt_ms, calls)
+    from dynamodb_service import DynamoDBService
+    imported = time.perf_counter()
+    
+    service = DynamoDBService()
+    if mode == 'eager':
+        service.create_tables()
+    initialized = time.perf_counter()
+    
+    service.get_conversation_context('5511999999999')
+    first_read = time.perf_counter()
+    return {
+        "import_ms": (imported - start) * 1000,
+        "init_ms": (initialized - imported) * 1000,
+        "first_read_ms": (first_read - initialized) * 1000,
+        "ready_ms": (first_read - start) * 1000,
+        "calls": calls
+    }
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == '--child':
+        result = measure(sys.argv[2], float(sys.argv[3]))
+        print(json.dumps(result))
+        return
+    
+    from metrics import RollingStats
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    rtt_ms = float(sys.argv[2]) if len(sys.argv) > 2 else 25.0
+    print(f"Execuções: {runs}  RTT simulado: {rtt_ms:g} ms")
+    
+    for mode in ('eager', 'lazy'):
+        stats = {key: RollingStats(window=runs) for key in ('init_ms', 'first_read_ms', 'ready_ms')}
+        calls = {}
+        for _ in range(runs):
+            output = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', mode, str(rtt_ms)],
+                                    capture_output=True, text=True, check=True).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            for key, rolling in stats.items():
+                rolling.add(result[key])
+            calls = result['calls']
+        print(f"{mode}: chamadas por processo {calls}")
+        for key, rolling in stats.items():
+            print(f"  {key}: {rolling.summary()}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+"""Benchmark do custo por requisição do webhook POST /webhook.
+
+Compara o caminho de callbacks só de status (filtrados sem parse) com o
+caminho de mensagens, além do custo do tratamento antigo (parse completo +
+json.dumps com indent) para o mesmo payload de status.
+
+Uso:
+    python benchmarks/bench_webhook_ingress.py [iterações]
+"""
+import io
+import json
+import os
+import sys
+import time
+from contextlib import redirect_stdout
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, 'src'))
+
+import whatsapp_webhook
+
+STATUS_PAYLOAD = {
+    "object": "whatsapp_business_account",
+    "entry": [{
+        "id": "102290129340398",
+        "changes": [{
+            "field": "messages",
+            "value": {
+                "messaging_product": "whatsapp",
+                "metadata": {"display_phone_number": "15550783881", "phone_number_id": "106540352242922"},
+                "statuses": [{
+                    "id": "wamid.HBgLMTY0NjcwNDM1OTUVAgARGBI1RjQyNUE3NEYxMzAzMzQ5MkEA",
+                    "status": "delivered",
+                    "timestamp": "1670520389",
+                    "recipient_id": "5511999999999",
+                    "conversation": {"id": "4eea4d3c3ac3d1a7b4b0f6b2e1a7e0a1", "origin": {"type": "service"}},
+                    "pricing": {"billable": True, "pricing_model": "CBP", "category": "service"}
+                }]
+            }
+        }]
+    }]
+}
+
+def message_payload(index):
+    return {
+        "object": "whatsapp_business_account",
+        "entry": [{
+            "id": "102290129340398",
+            "changes": [{
+                "field": "messages",
+                "value": {
+                    "messaging_product": "whatsapp",
+                    "metadata": {"display_phone_number": "15550783881", "phone_number_id": "106540352242922"},
+                    "contacts": [{"profile": {"name": "Cliente"}, "wa_id": "5511999999999"}],
+                    "messages": [{
+                        "from": "5511999999999",
+                        "id": f"wamid.bench.{index}",
+                        "timestamp": "1670520389",
+                        "type": "text",
+                        "text": {"body": "Olá, gostaria de agendar um corte"}
+                    }]
+                }
+            }]
+        }]
+    }
+
+def legacy_receive_message():
+    """Reproduz o handler anterior: parse completo e log com indent"""
+    from flask import request, jsonify
+    data = request.get_json()
+    print(f"Dados recebidos: {json.dumps(data, indent=2)}")
+    if 'entry' in data:
+        for entry in data['entry']:
+            if 'changes' in entry:
+                for change in entry['changes']:
+                    if 'value' in change and 'messages' in change['value']:
+                        pass
+    return jsonify({"status": "success"}), 200
+
+def measure(label, iterations, fn):
+    sink = io.StringIO()
+    with redirect_stdout(sink):
+        start = time.perf_counter()
+        for i in range(iterations):
+            fn(i)
+        elapsed = time.perf_counter() - start
+    print(f"{label:<45} {elapsed / iterations * 1e6:10.1f} µs/req")
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    
+    # Isola o custo de entrada: o processamento da mensagem não faz nada
+    whatsapp_webhook.process_message = lambda message, value: None
+    app = whatsapp_webhook.app
+    app.add_url_rule('/bench/legacy-webhook', 'legacy_webhook', legacy_receive_message, methods=['POST'])
+    client = app.test_client()
+    
+    status_body = json.dumps(STATUS_PAYLOAD).encode('utf-8')
+    message_bodies = [json.dumps(message_payload(i)).encode('utf-8') for i in range(iterations)]
+    headers = {"Content-Type": "application/json"}
+    
+    print(f"Iterações: {iterations}")
+    measure("classify_payload (status)", iterations,
+            lambda i: whatsapp_webhook.classify_payload(status_body))
+    measure("parse + log indentado (antigo, sem HTTP)", iterations,
+            lambda i: print(f"Dados recebidos: {json.dumps(json.loads(status_body), indent=2)}"))
+    measure("POST status - handler antigo (parse + log)", iterations,
+            lambda i: client.post('/bench/legacy-webhook', data=status_body, headers=headers))
+    measure("POST status - filtro rápido", iterations,
+            lambda i: client.post('/webhook', data=status_body, headers=headers))
+    measure("POST mensagem - parse + dispatch", iterations,
+            lambda i: client.post('/webhook', data=message_bodies[i], headers=headers))
+    
+    whatsapp_webhook.dispatcher.shutdown()
+
+if __name__ == '__main__':
+    main()
@@ -11,10 +11,99 @@ AWS_REGION = os.getenv('AWS_REGION', 'us-east-1') # Pode ser alterado para a reg
 
 # Google Gemini LLM
 GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
+LLM_BACKEND = os.getenv('LLM_BACKEND', 'gemini') # 'gemini' ou 'scripted' (respostas locais, sem rede)
+LLM_MODEL = os.getenv('LLM_MODEL', 'gemini-pro')
+LLM_SCRIPTED_LATENCY = os.getenv('LLM_SCRIPTED_LATENCY', 'lognormal:1200:0.4') # Latência do backend local (ms), ex: constant:800
+LLM_TIMEOUT_SECONDS = float(os.getenv('LLM_TIMEOUT_SECONDS', '15')) # Tempo máximo de uma chamada
+LLM_QUEUE_TIMEOUT_SECONDS = float(os.getenv('LLM_QUEUE_TIMEOUT_SECONDS', '2')) # Espera por uma vaga quando o limite está cheio
+LLM_INITIAL_CONCURRENCY = int(os.getenv('LLM_INITIAL_CONCURRENCY', '4')) # Limite inicial de chamadas simultâneas (ajustado por AIMD)
+LLM_MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', '16'))
+LLM_BREAKER_FAILURES = int(os.getenv('LLM_BREAKER_FAILURES', '5')) # Falhas seguidas que abrem o circuito
+LLM_BREAKER_RESET_SECONDS = float(os.getenv('LLM_BREAKER_RESET_SECONDS', '30'))
+LLM_FALLBACK_INTENT_THRESHOLD = float(os.getenv('LLM_FALLBACK_INTENT_THRESHOLD', '0.4')) # Confiança do classificador local quando o LLM não responde
+LLM_PRIORITY_AGING_SECONDS = float(os.getenv('LLM_PRIORITY_AGING_SECONDS', '0.5')) # Espera que vale um nível de prioridade na fila do LLM
 
 # WhatsApp Business API
 WA_BUSINESS_API_TOKEN = os.getenv('WA_BUSINESS_API_TOKEN')
 WA_BUSINESS_API_PHONE_ID = os.getenv('WA_BUSINESS_API_PHONE_ID')
 WA_BUSINESS_API_VERIFY_TOKEN = os.getenv('WA_BUSINESS_API_VERIFY_TOKEN', 'YOUR_VERIFY_TOKEN') # Token para verificação do webhook
+WA_GRAPH_API_BASE_URL = os.getenv('WA_GRAPH_API_BASE_URL', 'https://graph.facebook.com')
+WA_GRAPH_API_VERSION = os.getenv('WA_GRAPH_API_VERSION', 'v18.0')
+WA_HTTP_CONNECT_TIMEOUT = float(os.getenv('WA_HTTP_CONNECT_TIMEOUT', '3.05')) # Segundos
+WA_HTTP_READ_TIMEOUT = float(os.getenv('WA_HTTP_READ_TIMEOUT', '10')) # Segundos
+WA_HTTP_MAX_RETRIES = int(os.getenv('WA_HTTP_MAX_RETRIES', '3')) # Novas tentativas para 429/5xx
+WA_HTTP_POOL_SIZE = int(os.getenv('WA_HTTP_POOL_SIZE', '20')) # Conexões keep-alive mantidas
 
+# Limites de envio (token bucket)
+WA_GLOBAL_RATE_PER_SEC = float(os.getenv('WA_GLOBAL_RATE_PER_SEC', '80')) # Throughput do número do negócio
+WA_GLOBAL_BURST = int(os.getenv('WA_GLOBAL_BURST', '80'))
+WA_PAIR_RATE_PER_SEC = float(os.getenv('WA_PAIR_RATE_PER_SEC', '0.17')) # ~1 mensagem a cada 6s por destinatário
+WA_PAIR_BURST = int(os.getenv('WA_PAIR_BURST', '10'))
 
+# Processamento assíncrono do webhook (spool local)
+WEBHOOK_ASYNC_MODE = os.getenv('WEBHOOK_ASYNC_MODE', 'false').lower() == 'true' # Responde 200 imediatamente e processa em background
+MESSAGE_SPOOL_PATH = os.getenv('MESSAGE_SPOOL_PATH', 'data/message_spool.db')
+SPOOL_MAX_ATTEMPTS = int(os.getenv('SPOOL_MAX_ATTEMPTS', '3'))
+SPOOL_RETENTION_HOURS = int(os.getenv('SPOOL_RETENTION_HOURS', '72')) # Tempo que as mensagens descartadas ficam guardadas
+
+# Processamento ordenado por conversa
+DISPATCHER_SHARDS = int(os.getenv('DISPATCHER_SHARDS', '32'))
+DISPATCHER_WORKERS = int(os.getenv('DISPATCHER_WORKERS', '8')) # Conversas processadas em paralelo
+
+# Deduplicação de mensagens reentregues pelo webhook
+DEDUP_BACKEND = os.getenv('DEDUP_BACKEND', 'memory') # 'memory' ou 'dynamodb' (compartilhado entre workers)
+DEDUP_TTL_SECONDS = int(os.getenv('DEDUP_TTL_SECONDS', '86400'))
+DEDUP_MAX_ENTRIES = int(os.getenv('DEDUP_MAX_ENTRIES', '50000'))
+
+# Agrupamento de mensagens em rajada (0 desativa)
+COALESCE_WINDOW_MS = int(os.getenv('COALESCE_WINDOW_MS', '0'))
+COALESCE_MAX_WAIT_MS = int(os.getenv('COALESCE_MAX_WAIT_MS', str(COALESCE_WINDOW_MS * 3))) # Espera máxima desde a primeira mensagem
+
+# Outbox de mensagens enviadas (fila local persistente)
+OUTBOX_ENABLED = os.getenv('OUTBOX_ENABLED', 'true').lower() == 'true' # Grava as respostas antes de enviar e reenvia em caso de falha
+OUTBOX_PATH = os.getenv('OUTBOX_PATH', 'data/outbox.db')
+OUTBOX_WORKERS = int(os.getenv('OUTBOX_WORKERS', '4')) # Envios simultâneos
+OUTBOX_MAX_ATTEMPTS = int(os.getenv('OUTBOX_MAX_ATTEMPTS', '8'))
+OUTBOX_RETENTION_HOURS = int(os.getenv('OUTBOX_RETENTION_HOURS', '24')) # Tempo que as mensagens finalizadas (entregues, unknown, dead) ficam guardadas
+
+# Classificador local de intenções (responde mensagens comuns sem chamar o LLM)
+INTENT_ENGINE_ENABLED = os.getenv('INTENT_ENGINE_ENABLED', 'true').lower() == 'true'
+INTENT_CONFIDENCE_THRESHOLD = float(os.getenv('INTENT_CONFIDENCE_THRESHOLD', '0.75')) # Fração da mensagem que precisa ser reconhecida
+
+# Cache de respostas do LLM
+RESPONSE_CACHE_ENABLED = os.getenv('RESPONSE_CACHE_ENABLED', 'true').lower() == 'true'
+RESPONSE_CACHE_BACKEND = os.getenv('RESPONSE_CACHE_BACKEND', 'memory') # 'memory' ou 'dynamodb' (compartilhado entre workers)
+RESPONSE_CACHE_TTL_SECONDS = int(os.getenv('RESPONSE_CACHE_TTL_SECONDS', '3600'))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', '5000'))
+
+# Cache por similaridade (mensagens parecidas reaproveitam a resposta do LLM)
+SIMILARITY_CACHE_ENABLED = os.getenv('SIMILARITY_CACHE_ENABLED', 'true').lower() == 'true'
+SIMILARITY_THRESHOLD = float(os.getenv('SIMILARITY_THRESHOLD', '0.8')) # Similaridade de cosseno mínima para reutilizar
+SIMILARITY_MAX_ENTRIES = int(os.getenv('SIMILARITY_MAX_ENTRIES', '100000'))
+SIMILARITY_NPROBE = int(os.getenv('SIMILARITY_NPROBE', '8')) # Grupos do índice comparados em cada busca
+
+# Orçamento do prompt do LLM (tokens estimados, ~4 caracteres por token)
+PROMPT_MAX_TOKENS = int(os.getenv('PROMPT_MAX_TOKENS', '2000')) # Limite do prompt inteiro
+PROMPT_DATA_MAX_TOKENS = int(os.getenv('PROMPT_DATA_MAX_TOKENS', '400')) # Dados da conversa
+PROMPT_MESSAGE_MAX_TOKENS = int(os.getenv('PROMPT_MESSAGE_MAX_TOKENS', '500')) # Mensagem do cliente
+PROMPT_HISTORY_MAX_TOKENS = int(os.getenv('PROMPT_HISTORY_MAX_TOKENS', '800')) # Resumo e mensagens recentes
+
+# Histórico da conversa guardado com o contexto
+HISTORY_MAX_TURNS = int(os.getenv('HISTORY_MAX_TURNS', '8')) # Mensagens recentes mantidas na íntegra
+HISTORY_MAX_TOKENS = int(os.getenv('HISTORY_MAX_TOKENS', '600'))
+HISTORY_SUMMARY_MAX_TOKENS = int(os.getenv('HISTORY_SUMMARY_MAX_TOKENS', '200')) # Resumo das mensagens antigas
+CONVERSATION_MAX_CONTEXT_BYTES = int(os.getenv('CONVERSATION_MAX_CONTEXT_BYTES', '32768')) # Limite do item no DynamoDB (máx. 400 KB)
+
+# Leituras de cada turno feitas em paralelo (contexto, cliente, serviços, disponibilidade)
+TURN_READ_WORKERS = int(os.getenv('TURN_READ_WORKERS', '16'))
+TURN_SPECULATIVE_AVAILABILITY = os.getenv('TURN_SPECULATIVE_AVAILABILITY', 'true').lower() == 'true' # Consulta a agenda antes do LLM pedir
+TURN_MAX_DB_READS = int(os.getenv('TURN_MAX_DB_READS', '20')) # Leituras do DynamoDB por mensagem (acima disso são recusadas)
+TURN_MAX_DB_WRITES = int(os.getenv('TURN_MAX_DB_WRITES', '5'))
+
+# Verificação do esquema das tabelas (/status): uma falha é refeita após esse tempo
+TABLE_CHECK_RETRY_SECONDS = float(os.getenv('TABLE_CHECK_RETRY_SECONDS', '30'))
+
+# Catálogo de serviços em memória (preços e durações)
+SERVICE_CATALOG_TTL_SECONDS = int(os.getenv('SERVICE_CATALOG_TTL_SECONDS', '300')) # Recarrega do DynamoDB após esse tempo
+SERVICE_CATALOG_RETRY_SECONDS = int(os.getenv('SERVICE_CATALOG_RETRY_SECONDS', '30')) # Espera entre tentativas após uma recarga com erro
+CATALOG_ADMIN_TOKEN = os.getenv('CATALOG_ADMIN_TOKEN', '') # Segredo do POST /catalog/invalidate (vazio: rota desativada)
@@ -1,20 +1,298 @@
-import google.generativeai as genai
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-import json
+import itertools
 import re
-from config.config import GEMINI_API_KEY
+import threading
+import time
+import unicodedata
+from config.config import GEMINI_API_KEY, LLM_BACKEND, LLM_MODEL, LLM_SCRIPTED_LATENCY
+from config.config import LLM_TIMEOUT_SECONDS, LLM_QUEUE_TIMEOUT_SECONDS, LLM_INITIAL_CONCURRENCY, LLM_MAX_CONCURRENCY
+from config.config import LLM_BREAKER_FAILURES, LLM_BREAKER_RESET_SECONDS, LLM_FALLBACK_INTENT_THRESHOLD
+from config.config import LLM_PRIORITY_AGING_SECONDS
+from config.config import INTENT_ENGINE_ENABLED, INTENT_CONFIDENCE_THRESHOLD
+from config.config import RESPONSE_CACHE_ENABLED, RESPONSE_CACHE_BACKEND, RESPONSE_CACHE_TTL_SECONDS, RESPONSE_CACHE_MAX_ENTRIES
+from config.config import PROMPT_MAX_TOKENS, PROMPT_DATA_MAX_TOKENS, PROMPT_MESSAGE_MAX_TOKENS, PROMPT_HISTORY_MAX_TOKENS
+from config.config import HISTORY_MAX_TURNS, HISTORY_MAX_TOKENS, HISTORY_SUMMARY_MAX_TOKENS
+from config.config import SIMILARITY_CACHE_ENABLED, SIMILARITY_THRESHOLD, SIMILARITY_MAX_ENTRIES, SIMILARITY_NPROBE
+from config.config import TURN_READ_WORKERS, TURN_SPECULATIVE_AVAILABILITY, SERVICE_CATALOG_TTL_SECONDS
+from config.config import TURN_MAX_DB_READS, TURN_MAX_DB_WRITES, SERVICE_CATALOG_RETRY_SECONDS
 from dynamodb_service import DynamoDBService
 from google_calendar_service import GoogleCalendarService
+from llm_backend import create_backend
+from llm_guard import LLMGuard, AdaptiveLimiter, CircuitBreaker, LLMUnavailable
+from metrics import RollingStats
+from prompt_builder import PromptBuilder
+from conversation_history import ConversationHistory
+from response_schema import ResponseParser
+from response_cache import ResponseCache, MemoryCacheBackend, DynamoDBCacheBackend, CLIENT_FIELDS, is_reusable
+from service_catalog import ServiceCatalog
+from similarity_index import SimilarityIndex, similarity_scope
+from turn_prefetch import TurnPrefetch, TurnTimer, TurnStats
+from unit_of_work import TurnUnitOfWork, UnitOfWorkStats
+
+# Prioridade na fila do LLM por estado da conversa (0 = mais urgente):
+# quem já está fechando um horário passa à frente de conversas novas
+LLM_STATE_PRIORITY = {
+    'confirmation': 0,
+    'time_selection': 1,
+    'date_selection': 2,
+    'service_selection': 2
+}
+LLM_DEFAULT_PRIORITY = 3
+
+# Agendamentos listados por show_appointments (e os campos lidos de cada um)
+SHOW_APPOINTMENTS_LIMIT = 5
+APPOINTMENT_LIST_FIELDS = ['appointment_date', 'appointment_time', 'service_name', 'price']
+
+# Limite do título de um botão de resposta no WhatsApp (a API recusa títulos maiores)
+BUTTON_TITLE_MAX_LENGTH = 20
+
+# Ids dos botões gerados por show_services e check_availability
+SERVICE_REPLY_PATTERN = re.compile(r'^service_(?P<service_id>.+)$')
+TIME_REPLY_PATTERN = re.compile(r'^time_(?P<time>\d{2}:\d{2})$')
+
+# Frases reconhecidas pelo classificador local, por intenção
+INTENT_PHRASES = {
+    'greeting': [
+        "oi", "ola", "opa", "e ai", "bom dia", "boa tarde", "boa noite", "hello", "hey"
+    ],
+    'show_services': [
+        "servicos", "servico", "quais servicos", "lista de servicos", "tabela de precos", "precos",
+        "preco", "valores", "quanto custa", "o que voces fazem", "agendar", "marcar", "marcar horario",
+        "fazer um agendamento", "quero agendar", "gostaria de agendar", "novo agendamento"
+    ],
+    'show_appointments': [
+        "meus agendamentos", "meu agendamento", "meus horarios", "meu horario", "minha reserva",
+        "minhas reservas", "ver agendamentos", "consultar agendamento", "tenho horario marcado"
+    ],
+    'cancel_appointment': [
+        "cancelar", "cancela", "cancelamento", "desmarcar", "desmarca"
+    ]
+}
+
+# Palavras que não mudam a intenção e não reduzem a confiança
+INTENT_STOPWORDS = {
+    "eu", "quero", "queria", "gostaria", "de", "do", "da", "dos", "das", "o", "a", "os", "as",
+    "um", "uma", "para", "pra", "por", "favor", "pf", "pfv", "me", "ver", "e", "no", "na",
+    "meu", "minha", "tudo", "bem", "sim", "voces", "vcs", "qual", "quais", "ja", "que", "com"
+}
+
+WEEKDAYS = {
+    "segunda": 0, "terca": 1, "quarta": 2, "quinta": 3, "sexta": 4, "sabado": 5, "domingo": 6
+}
+
+MONTHS = {
+    "janeiro": 1, "fevereiro": 2, "marco": 3, "abril": 4, "maio": 5, "junho": 6, "julho": 7,
+    "agosto": 8, "setembro": 9, "outubro": 10, "novembro": 11, "dezembro": 12
+}
+
+TOKEN_PATTERN = re.compile(r'[a-z0-9]+(?:[:/][0-9]+)*')
+NUMERIC_DATE_PATTERN = re.compile(r'^(\d{1,2})/(\d{1,2})(?:/(\d{2}|\d{4}))?$')
+TIME_PATTERN = re.compile(r'^(\d{1,2})(?:h(\d{2})?|:(\d{2}))$')
+
+def normalize_tokens(text):
+    """Minúsculas, sem acentos, separado em palavras/números (14:30, 25/12)"""
+    text = unicodedata.normalize('NFKD', text.lower())
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    return TOKEN_PATTERN.findall(text)
+
+def build_phrase_trie(phrases_by_intent):
+    """Monta uma trie por palavra: cada nó é um dict; '$' marca o fim de uma frase"""
+    trie = {}
+    for intent, phrases in phrases_by_intent.items():
+        for phrase in phrases:
+            node = trie
+            for token in normalize_tokens(phrase):
+                node = node.setdefault(token, {})
+            node['$'] = intent
+    return trie
+
+def parse_date(tokens, index, today):
+    """Tenta ler uma data a partir de tokens[index]; retorna (data, tokens usados) ou (None, 0)"""
+    token = tokens[index]
+    following = tokens[index + 1:index + 3]
+    value, used = None, 0
+    
+    if token == 'hoje':
+        value, used = today, 1
+    elif token == 'amanha':
+        value, used = today + timedelta(days=1), 1
+    elif token == 'depois' and following == ['de', 'amanha']:
+        value, used = today + timedelta(days=2), 3
+    elif token in WEEKDAYS:
+        # Dia da semana: a próxima ocorrência (hoje não conta)
+        days_ahead = (WEEKDAYS[token] - today.weekday()) % 7 or 7
+        value, used = today + timedelta(days=days_ahead), 2 if following[:1] == ['feira'] else 1
+    elif NUMERIC_DATE_PATTERN.match(token):
+        day, month, year = NUMERIC_DATE_PATTERN.match(token).groups()
+        if year:
+            year = int(year) + 2000 if len(year) == 2 else int(year)
+        value, used = next_date(today, int(day), int(month), year), 1
+    else:
+        # "dia 25", "dia 25 de dezembro", "25 de dezembro"
+        offset = 1 if token == 'dia' else 0
+        if index + offset < len(tokens) and tokens[index + offset].isdigit():
+            day = int(tokens[index + offset])
+            rest = tokens[index + offset + 1:index + offset + 3]
+            if len(rest) == 2 and rest[0] == 'de' and rest[1] in MONTHS:
+                value, used = next_date(today, day, MONTHS[rest[1]]), offset + 3
+            elif offset:
+                # Só o dia: este mês, ou o próximo se o dia já passou
+                value = next_date(today, day, today.month, today.year)
+                if value is None or value < today:
+                    next_year = today.year + (1 if today.month == 12 else 0)
+                    value = next_date(today, day, today.month % 12 + 1, next_year)
+                used = 2
+    
+    return (value, used) if value else (None, 0)
+
+def next_date(today, day, month, year=None):
+    """Monta a data; sem ano explícito, usa a próxima ocorrência a partir de hoje"""
+    try:
+        candidate = datetime(year or today.year, month, day).date()
+        if year is None and candidate < today:
+            candidate = datetime(today.year + 1, month, day).date()
+        return candidate
+    except ValueError:
+        return None
+
+def parse_time(tokens, index):
+    """Tenta ler um horário ("14h", "14h30", "14:30", "as 14"); retorna ("HH:MM", tokens usados)"""
+    token = tokens[index]
+    used = 1
+    if token == 'as' and index + 1 < len(tokens):
+        token = tokens[index + 1]
+        used = 2
+        if token.isdigit() and 0 <= int(token) <= 23:
+            return f"{int(token):02d}:00", used
+    
+    match = TIME_PATTERN.match(token)
+    if match:
+        hour = int(match.group(1))
+        minute = int(match.group(2) or match.group(3) or 0)
+        if hour <= 23 and minute <= 59:
+            return f"{hour:02d}:{minute:02d}", used
+    return None, 0
+
+def message_date(message_text, today=None):
+    """Primeira data citada na mensagem, como YYYY-MM-DD (ou None)"""
+    today = today or datetime.now().date()
+    tokens = normalize_tokens(message_text or '')
+    for index in range(len(tokens)):
+        value, used = parse_date(tokens, index, today)
+        if used:
+            return value.strftime('%Y-%m-%d')
+    return None
+
+class IntentEngine:
+    """Classificador local de intenções para mensagens comuns.
+    
+    Reconhece saudações, pedidos de serviços, consulta e cancelamento de
+    agendamentos e datas/horários soltos, usando uma trie de frases e
+    expressões regulares. A confiança é a fração das palavras relevantes da
+    mensagem explicada pelas frases e datas reconhecidas; abaixo do limite a
+    mensagem segue para o LLM.
+    """
+    
+    def __init__(self, threshold=0.75, phrases=INTENT_PHRASES):
+        self.threshold = threshold
+        self.trie = build_phrase_trie(phrases)
+    
+    def classify(self, message_text, today=None, threshold=None):
+        """Retorna {"intent", "confidence", "date", "time"} ou None se abaixo do limite"""
+        threshold = self.threshold if threshold is None else threshold
+        today = today or datetime.now().date()
+        tokens = normalize_tokens(message_text)
+        content = [t for t in tokens if t not in INTENT_STOPWORDS]
+        if not content:
+            return None
+        
+        intents = []
+        covered = set()
+        date_value = None
+        time_value = None
+        index = 0
+        while index < len(tokens):
+            intent, used = self._match_phrase(tokens, index)
+            if intent is None:
+                parsed_date, used = parse_date(tokens, index, today)
+                if used:
+                    date_value, intent = parsed_date, 'date'
+            if intent is None:
+                parsed_time, used = parse_time(tokens, index)
+                if used:
+                    time_value, intent = parsed_time, 'time'
+            
+            if intent is None:
+                index += 1
+                continue
+            
+            if intent not in ('date', 'time'):
+                intents.append(intent)
+            covered.update(range(index, index + used))
+            index += used
+        
+        covered_content = sum(1 for i, t in enumerate(tokens) if i in covered and t not in INTENT_STOPWORDS)
+        confidence = covered_content / len(content)
+        
+        # Saudação junto com outro pedido: vale o pedido
+        distinct = [i for i in dict.fromkeys(intents) if i != 'greeting'] or list(dict.fromkeys(intents))
+        if len(distinct) > 1:
+            # Pedidos diferentes na mesma mensagem ficam para o LLM
+            confidence *= 0.5
+        
+        intent = distinct[0] if distinct else ('date' if date_value else None)
+        if intent is None or confidence < threshold:
+            return None
+        
+        return {
+            "intent": intent,
+            "confidence": round(confidence, 2),
+            "date": date_value.strftime('%Y-%m-%d') if date_value else None,
+            "time": time_value
+        }
+    
+    def _match_phrase(self, tokens, index):
+        """Maior frase da trie começando em tokens[index]; retorna (intenção, tokens usados)"""
+        node = self.trie
+        best = (None, 0)
+        for offset in range(index, len(tokens)):
+            node = node.get(tokens[offset])
+            if node is None:
+                break
+            if '$' in node:
+                best = (node['$'], offset - index + 1)
+        return best
 
 class SalonAIAgent:
-    def __init__(self):
-        # Configura o Gemini
-        genai.configure(api_key=GEMINI_API_KEY)
-        self.model = genai.GenerativeModel('gemini-pro')
+    def __init__(self, db_service=None, calendar_service=None, llm=None):
+        # Configura o LLM (Gemini ou backend local para testes de carga)
+        self.llm = llm or create_backend(LLM_BACKEND, api_key=GEMINI_API_KEY, model_name=LLM_MODEL,
+                                         latency=LLM_SCRIPTED_LATENCY)
+        
+        # Limite adaptativo, timeout e circuit breaker nas chamadas ao LLM
+        self.llm_guard = LLMGuard(
+            timeout=LLM_TIMEOUT_SECONDS,
+            queue_timeout=LLM_QUEUE_TIMEOUT_SECONDS,
+            limiter=AdaptiveLimiter(initial=LLM_INITIAL_CONCURRENCY, max_limit=LLM_MAX_CONCURRENCY,
+                                    latency_target=LLM_TIMEOUT_SECONDS / 2, aging=LLM_PRIORITY_AGING_SECONDS),
+            breaker=CircuitBreaker(failure_threshold=LLM_BREAKER_FAILURES, reset_timeout=LLM_BREAKER_RESET_SECONDS)
+        )
+        self.fallback_stats = {"intent": 0, "canned": 0}
+        
+        # Inicializa serviços (os benchmarks injetam as versões de memory_services)
+        self.db_service = db_service or DynamoDBService()
+        self.calendar_service = calendar_service or GoogleCalendarService()
+        
+        # Serviços e preços lidos da memória (recarregados por TTL ou invalidate)
+        self.service_catalog = ServiceCatalog(self.db_service, ttl_seconds=SERVICE_CATALOG_TTL_SECONDS,
+                                              retry_seconds=SERVICE_CATALOG_RETRY_SECONDS)
         
-        # Inicializa serviços
-        self.db_service = DynamoDBService()
-        self.calendar_service = GoogleCalendarService()
+        # Leituras independentes do turno feitas em paralelo antes do LLM
+        self.read_pool = ThreadPoolExecutor(max_workers=TURN_READ_WORKERS, thread_name_prefix='turn-read')
+        self.speculative_availability = TURN_SPECULATIVE_AVAILABILITY
+        self.turn_stats = TurnStats()
+        self.db_stats = UnitOfWorkStats()
         
         # Estados da conversa
         self.conversation_states = {
@@ -27,6 +305,35 @@ class SalonAIAgent:
             'HELP': 'help'
         }
         
+        # Interpretação e validação do JSON devolvido pelo LLM
+        self.response_parser = ResponseParser(states=self.conversation_states.values())
+        
+        # Respostas de botões/listas tratadas sem chamar o LLM
+        self.reply_stats = {"handled": 0, "fallback": 0}
+        self.stats_lock = threading.Lock()
+        self.reply_latency = RollingStats()
+        
+        # Mensagens comuns respondidas pelo classificador local
+        self.intent_engine = IntentEngine(threshold=INTENT_CONFIDENCE_THRESHOLD) if INTENT_ENGINE_ENABLED else None
+        self.intent_stats = {"turns": 0, "absorbed": 0, "by_intent": {}}
+        self.intent_latency = RollingStats()
+        self.llm_latency = RollingStats()
+        
+        # Cache das respostas do LLM (compartilhado via DynamoDB se configurado)
+        self.response_cache = None
+        if RESPONSE_CACHE_ENABLED:
+            if RESPONSE_CACHE_BACKEND == 'dynamodb':
+                cache_backend = DynamoDBCacheBackend(self.db_service)
+            else:
+                cache_backend = MemoryCacheBackend(max_entries=RESPONSE_CACHE_MAX_ENTRIES)
+            self.response_cache = ResponseCache(cache_backend, ttl_seconds=RESPONSE_CACHE_TTL_SECONDS)
+        
+        # Mensagens parecidas (paráfrases, erros de digitação) no mesmo estado
+        self.similarity_index = None
+        if SIMILARITY_CACHE_ENABLED:
+            self.similarity_index = SimilarityIndex(threshold=SIMILARITY_THRESHOLD, max_entries=SIMILARITY_MAX_ENTRIES,
+                                                    nprobe=SIMILARITY_NPROBE)
+        
         # Prompt do sistema para o agente
         self.system_prompt = """
         Você é um assistente de IA para um salão de beleza. Seu objetivo é ajudar os clientes a agendar serviços de forma amigável e eficiente.
@@ -57,8 +364,13 @@ class SalonAIAgent:
         {
             "message": "Sua resposta para o cliente",
             "action": "próxima ação a ser executada",
-            "data": "dados relevantes para a ação"
+            "data": {dados relevantes para a ação}
         }
+        
+        DADOS POR AÇÃO (datas AAAA-MM-DD, horários HH:MM):
+        - "check_availability": {"service_id": "...", "date": "..."}
+        - "create_appointment": {"service_id": "...", "date": "...", "time": "...", "client_name": "..."}
+        - Qualquer ação pode incluir "state" (novo estado da conversa) e "conversation_data" (dados a guardar)
 
         AÇÕES POSSÍVEIS:
         - "show_services": Mostrar lista de serviços
@@ -68,29 +380,70 @@ class SalonAIAgent:
         - "cancel_appointment": Cancelar agendamento
         - "continue_conversation": Continuar conversa normal
         """
+        
+        # Prefixo estático montado uma vez; seções dinâmicas com orçamento de tokens
+        self.prompt_builder = PromptBuilder(self.system_prompt, max_tokens=PROMPT_MAX_TOKENS,
+                                            data_max_tokens=PROMPT_DATA_MAX_TOKENS,
+                                            message_max_tokens=PROMPT_MESSAGE_MAX_TOKENS,
+                                            history_max_tokens=PROMPT_HISTORY_MAX_TOKENS)
+        
+        # Últimas mensagens da conversa (as antigas viram um resumo curto)
+        self.conversation_history = ConversationHistory(max_turns=HISTORY_MAX_TURNS, max_tokens=HISTORY_MAX_TOKENS,
+                                                        summary_max_tokens=HISTORY_SUMMARY_MAX_TOKENS)
     
-    def process_message(self, phone_number, message_text):
-        """Processa uma mensagem do cliente e retorna a resposta"""
+    def process_message(self, phone_number, message_text, uow=None):
+        """Processa uma mensagem do cliente e retorna a resposta.
+        
+        Sem `uow`, o turno abre a própria unidade de trabalho e grava as
+        escritas pendentes no fim; com `uow` (ex.: vindo de process_reply), quem
+        chamou faz o flush.
+        """
+        timer = TurnTimer()
+        prefetch = TurnPrefetch(self.read_pool)
+        owns_uow = uow is None
+        if owns_uow:
+            uow = self.new_unit_of_work()
         try:
+            # Contexto, cliente e catálogo são independentes: lidos em paralelo
+            prefetch.submit('context', phone_number, uow.get_conversation_context, phone_number)
+            prefetch.submit('client', phone_number, uow.get_client, phone_number)
+            prefetch.submit('services', None, self.service_catalog.get_all_services)
+            
             # Obtém o contexto da conversa
-            success, context = self.db_service.get_conversation_context(phone_number)
+            success, context = prefetch.result('context', (False, None))
             if not success:
                 context = {'state': self.conversation_states['GREETING'], 'data': {}}
             
+            # Agenda do dia em discussão consultada enquanto o LLM responde
+            self.prefetch_availability(prefetch, message_text, context)
+            
             # Obtém informações do cliente
-            client_success, client_info = self.db_service.get_client(phone_number)
+            client_success, client_info = prefetch.result('client', (False, None))
             if client_success:
                 context['client_info'] = client_info
+            timer.mark('reads')
             
-            # Gera resposta usando IA
-            response = self.generate_ai_response(message_text, context)
+            # Mensagens comuns são respondidas sem chamar o LLM
+            response = self.classify_intent(message_text, context)
+            if response is None:
+                # Gera resposta usando IA
+                response = self.generate_ai_response(message_text, context)
+            timer.mark('llm')
             
             # Processa a ação solicitada
-            result = self.process_action(phone_number, response, context)
+            result = self.process_action(phone_number, response, context, prefetch, uow)
+            context['last_action'] = response.get('action', 'continue_conversation')
+            self.conversation_history.record(context, message_text, result.get('message'))
+            timer.mark('action')
             
             # Salva o contexto atualizado
-            self.db_service.save_conversation_context(phone_number, context)
+            uow.save_conversation_context(phone_number, context)
+            if owns_uow:
+                self.finish_unit_of_work(uow)
+            timer.mark('save')
             
+            self.turn_stats.record(timer, prefetch, blocking_reads=('context', 'client'),
+                                   speculative_reads=('availability',))
             return result
         
         except Exception as e:
@@ -100,43 +453,265 @@ class SalonAIAgent:
                 "buttons": None
             }
     
-    def generate_ai_response(self, message_text, context):
-        """Gera resposta usando o modelo Gemini"""
+    def new_unit_of_work(self):
+        return TurnUnitOfWork(self.db_service, max_reads=TURN_MAX_DB_READS, max_writes=TURN_MAX_DB_WRITES)
+    
+    def finish_unit_of_work(self, uow):
+        """Grava as escritas pendentes do turno e registra as chamadas ao DynamoDB"""
+        uow.flush()
+        self.db_stats.record(uow)
+    
+    def get_db_stats(self):
+        """Chamadas ao DynamoDB e capacidade estimada por turno"""
+        return self.db_stats.get_stats()
+    
+    def prefetch_availability(self, prefetch, message_text, context):
+        """Dispara a consulta de horários quando o próximo passo provável é check_availability.
+        
+        Nos estados de escolha de data/horário, com o serviço já definido, usa a
+        data citada na mensagem (ou a já guardada na conversa). O resultado só
+        é usado se a ação pedir o mesmo serviço e data.
+        """
+        if not self.speculative_availability:
+            return
+        if context.get('state') not in (self.conversation_states['DATE_SELECTION'],
+                                        self.conversation_states['TIME_SELECTION']):
+            return
+        data = context.get('data') or {}
+        service_id = data.get('service_id')
+        date_str = message_date(message_text) or data.get('date')
+        if service_id and date_str:
+            prefetch.submit('availability', (service_id, date_str), self.load_availability, service_id, date_str)
+    
+    def get_turn_stats(self):
+        """Tempo por etapa do turno, leituras paralelas e consultas antecipadas"""
+        return self.turn_stats.get_stats()
+    
+    def process_reply(self, phone_number, reply_id, reply_title):
+        """Processa a seleção de um botão ou item de lista.
+        
+        Os ids gerados pelo próprio agente (service_<id>, time_<HH:MM>) avançam
+        a conversa diretamente; ids desconhecidos ou sem o contexto necessário
+        seguem para o LLM como texto.
+        """
+        start = time.perf_counter()
+        uow = self.new_unit_of_work()
+        result = None
         try:
-            # Constrói o prompt com contexto
-            prompt = f"""
-            {self.system_prompt}
-            
-            CONTEXTO DA CONVERSA:
-            Estado atual: {context.get('state', 'greeting')}
-            Dados da conversa: {json.dumps(context.get('data', {}), ensure_ascii=False)}
+            success, context = uow.get_conversation_context(phone_number)
+            if not success:
+                context = {'state': self.conversation_states['GREETING'], 'data': {}}
+            context.setdefault('data', {})
             
-            MENSAGEM DO CLIENTE: "{message_text}"
+            result = self.route_reply(phone_number, reply_id, context, uow)
+        
+        except Exception as e:
+            print(f"Erro ao processar seleção {reply_id}: {str(e)}")
+        
+        # Com a ação já executada (ex.: agendamento gravado) não há volta para o LLM,
+        # que poderia repetir o agendamento ou responder o contrário
+        if result is not None:
+            self.conversation_history.record(context, f"Selecionei: {reply_title}", result.get('message'))
+            uow.save_conversation_context(phone_number, context)
+            self.finish_unit_of_work(uow)
+            with self.stats_lock:
+                self.reply_stats["handled"] += 1
+            self.reply_latency.add(time.perf_counter() - start)
+            return result
+        
+        with self.stats_lock:
+            self.reply_stats["fallback"] += 1
+        
+        # Processa a seleção como uma mensagem de texto (o contexto já lido é reaproveitado)
+        result = self.process_message(phone_number, f"Selecionei: {reply_title}", uow)
+        self.finish_unit_of_work(uow)
+        return result
+    
+    def route_reply(self, phone_number, reply_id, context, uow=None):
+        """Executa a ação correspondente ao id do botão; retorna None se não reconhecido"""
+        data = context['data']
+        
+        match = SERVICE_REPLY_PATTERN.match(reply_id or '')
+        if match:
+            service_id = match.group('service_id')
+            success, service = self.service_catalog.get_service(service_id)
+            if not success:
+                return None
             
-            Responda em formato JSON válido.
-            """
+            data['service_id'] = service_id
+            if data.get('date'):
+                result = self.check_availability(f"Ótima escolha: {service['name']}!", data)
+                # Sem horários na data, a conversa volta para a escolha de outra data
+                context['state'] = self.conversation_states['TIME_SELECTION' if result.get('buttons') else 'DATE_SELECTION']
+                context['last_action'] = 'check_availability'
+                return result
             
-            response = self.model.generate_content(prompt)
+            context['state'] = self.conversation_states['DATE_SELECTION']
+            context['last_action'] = 'ask_date'
+            return {
+                "message": f"Ótima escolha: {service['name']}! Para qual data você gostaria de agendar? (ex: 25/12)",
+                "buttons": None
+            }
+        
+        match = TIME_REPLY_PATTERN.match(reply_id or '')
+        if match:
+            if not data.get('service_id') or not data.get('date'):
+                return None
             
-            # Tenta extrair JSON da resposta
-            response_text = response.text
+            appointment_data = dict(data, time=match.group('time'))
+            if not appointment_data.get('client_name'):
+                client_success, client_info = (uow or self.db_service).get_client(phone_number)
+                if client_success:
+                    appointment_data['client_name'] = client_info.get('name')
+            context['last_action'] = 'create_appointment'
+            return self.create_appointment(phone_number, "Perfeito!", appointment_data, context, uow)
+        
+        return None
+    
+    def get_reply_stats(self):
+        """Seleções tratadas diretamente x enviadas ao LLM, com latência (ms)"""
+        with self.stats_lock:
+            stats = dict(self.reply_stats)
+        stats["latency_ms"] = self.reply_latency.summary(scale=1000)
+        return stats
+    
+    def classify_intent(self, message_text, context):
+        """Resposta no formato do LLM para mensagens reconhecidas localmente, ou None"""
+        if self.intent_engine is None:
+            return None
+        
+        start = time.perf_counter()
+        match = self.intent_engine.classify(message_text)
+        response = self.intent_response(match, context) if match else None
+        self.intent_latency.add(time.perf_counter() - start)
+        
+        with self.stats_lock:
+            self.intent_stats["turns"] += 1
+            if response is not None:
+                self.intent_stats["absorbed"] += 1
+                by_intent = self.intent_stats["by_intent"]
+                by_intent[match["intent"]] = by_intent.get(match["intent"], 0) + 1
+        return response
+    
+    def intent_response(self, match, context):
+        """Mapeia a intenção reconhecida para uma das ações existentes"""
+        intent = match["intent"]
+        conversation_data = {}
+        if match["date"]:
+            conversation_data["date"] = match["date"]
+        if match["time"]:
+            conversation_data["preferred_time"] = match["time"]
+        
+        if intent == 'greeting':
+            name = (context.get('client_info') or {}).get('name')
+            greeting = f"Olá, {name}!" if name else "Olá!"
+            return {
+                "message": f"{greeting} Bem-vindo(a) ao nosso salão! 💇 Qual serviço você gostaria de agendar?",
+                "action": "show_services",
+                "data": {"state": self.conversation_states['SERVICE_SELECTION'], "conversation_data": conversation_data}
+            }
+        
+        if intent == 'show_services':
+            return {
+                "message": "Estes são alguns dos nossos serviços. Qual você gostaria de agendar?",
+                "action": "show_services",
+                "data": {"state": self.conversation_states['SERVICE_SELECTION'], "conversation_data": conversation_data}
+            }
+        
+        if intent == 'show_appointments':
+            return {"message": "Claro!", "action": "show_appointments", "data": {}}
+        
+        if intent == 'cancel_appointment':
+            return {"message": "", "action": "cancel_appointment", "data": {}}
+        
+        if intent == 'date':
+            service_id = context.get('data', {}).get('service_id')
+            if service_id:
+                return {
+                    "message": "Vou verificar os horários para você.",
+                    "action": "check_availability",
+                    "data": {"date": match["date"], "service_id": service_id, "conversation_data": conversation_data}
+                }
             
-            # Remove markdown se presente
-            if "```json" in response_text:
-                response_text = response_text.split("```json")[1].split("```")[0]
-            elif "```" in response_text:
-                response_text = response_text.split("```")[1].split("```")[0]
+            day = datetime.strptime(match["date"], '%Y-%m-%d').strftime('%d/%m')
+            return {
+                "message": f"Anotado: {day}. Qual serviço você gostaria de agendar?",
+                "action": "show_services",
+                "data": {"state": self.conversation_states['SERVICE_SELECTION'], "conversation_data": conversation_data}
+            }
+        
+        return None
+    
+    def get_intent_stats(self):
+        """Fração dos turnos respondida localmente e estimativa do tempo de LLM evitado"""
+        with self.stats_lock:
+            stats = {
+                "turns": self.intent_stats["turns"],
+                "absorbed": self.intent_stats["absorbed"],
+                "by_intent": dict(self.intent_stats["by_intent"])
+            }
+        stats["absorbed_fraction"] = round(stats["absorbed"] / stats["turns"], 4) if stats["turns"] else 0.0
+        stats["classify_ms"] = self.intent_latency.summary(scale=1000, digits=3)
+        stats["llm_ms"] = self.llm_latency.summary(scale=1000)
+        
+        # Cada turno absorvido economiza, em média, uma chamada ao LLM
+        saved_per_turn = stats["llm_ms"]["avg"] - stats["classify_ms"]["avg"]
+        stats["estimated_saved_ms"] = round(max(0.0, saved_per_turn) * stats["absorbed"], 1)
+        return stats
+    
+    def generate_ai_response(self, message_text, context):
+        """Gera resposta usando o LLM configurado"""
+        # Mesmo estado, mensagem e dados já respondidos antes: reutiliza a resposta
+        # A ação do turno anterior e o histórico enviado no prompt entram na chave, pois a resposta
+        # depende deles; conversas que começaram iguais (ex.: pelo cache) continuam compartilhando
+        cache_data = dict(context.get('data') or {}, last_action=context.get('last_action', ''),
+                          history=ConversationHistory.digest(context))
+        
+        cache_key = None
+        if self.response_cache is not None:
+            cache_key = self.response_cache.make_key(context.get('state', 'greeting'), message_text, cache_data)
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                return cached
+        
+        scope = None
+        if self.similarity_index is not None:
+            scope = similarity_scope(context.get('state', 'greeting'), cache_data)
+            similar = self.similarity_index.lookup(scope, message_text)
+            if similar is not None:
+                return similar
+        
+        try:
+            # Constrói o prompt com contexto
+            prompt, _ = self.prompt_builder.build(context.get('state', 'greeting'), context.get('data', {}), message_text,
+                                                  history=context.get('history'), summary=context.get('summary'))
             
-            # Parse do JSON
+            start = time.perf_counter()
             try:
-                ai_response = json.loads(response_text.strip())
-            except json.JSONDecodeError:
-                # Se não conseguir fazer parse, cria resposta padrão
+                state = context.get('state', 'greeting')
+                response_text = self.llm_guard.call(self.llm.generate, prompt,
+                                                    priority=LLM_STATE_PRIORITY.get(state, LLM_DEFAULT_PRIORITY),
+                                                    priority_class=state)
+            except LLMUnavailable as e:
+                print(f"LLM indisponível ({e}), usando resposta alternativa")
+                return self.fallback_response(message_text, context)
+            self.llm_latency.add(time.perf_counter() - start)
+            
+            # Extrai, corrige e valida o JSON da resposta
+            ai_response = self.response_parser.parse(response_text, context.get('data'))
+            if ai_response is None:
+                # Sem JSON na resposta: usa o texto como mensagem
                 ai_response = {
                     "message": response_text.strip(),
                     "action": "continue_conversation",
                     "data": {}
                 }
+            else:
+                personal = self.personal_values(context)
+                if cache_key is not None:
+                    self.response_cache.put(cache_key, ai_response, personal)
+                if scope is not None and is_reusable(ai_response, personal):
+                    self.similarity_index.add(scope, message_text, ai_response)
             
             return ai_response
         
@@ -148,8 +723,42 @@ class SalonAIAgent:
                 "data": {}
             }
     
-    def process_action(self, phone_number, ai_response, context):
-        """Processa a ação solicitada pela IA"""
+    def fallback_response(self, message_text, context):
+        """Resposta sem o LLM: fluxo determinístico com limite menor, ou aviso de demora"""
+        if self.intent_engine is not None:
+            match = self.intent_engine.classify(message_text, threshold=LLM_FALLBACK_INTENT_THRESHOLD)
+            response = self.intent_response(match, context) if match else None
+            if response is not None:
+                with self.stats_lock:
+                    self.fallback_stats["intent"] += 1
+                return response
+        
+        with self.stats_lock:
+            self.fallback_stats["canned"] += 1
+        return {
+            "message": "Recebemos sua mensagem! Estamos com muitos atendimentos agora e já vamos te responder. "
+                       "Se preferir, envie \"serviços\" para ver as opções e agendar.",
+            "action": "continue_conversation",
+            "data": {}
+        }
+    
+    def get_llm_stats(self):
+        """Proteção das chamadas ao LLM e respostas alternativas usadas"""
+        stats = self.llm_guard.get_stats()
+        with self.stats_lock:
+            stats["fallbacks"] = dict(self.fallback_stats)
+        return stats
+    
+    def personal_values(self, context):
+        """Dados do cliente presentes no contexto (respostas que os citam não vão para o cache)"""
+        values = []
+        for source in (context.get('client_info') or {}, context.get('data') or {}):
+            if isinstance(source, dict):
+                values.extend(str(v) for k, v in source.items() if k in CLIENT_FIELDS and isinstance(v, str))
+        return values
+    
+    def process_action(self, phone_number, ai_response, context, prefetch=None, uow=None):
+        """Processa a ação solicitada pela IA (reaproveitando as leituras antecipadas do turno)"""
         action = ai_response.get('action', 'continue_conversation')
         message = ai_response.get('message', '')
         data = ai_response.get('data', {})
@@ -160,16 +769,23 @@ class SalonAIAgent:
         }
         
         if action == "show_services":
-            result = self.show_services(message)
+            result = self.show_services(message, prefetch)
         
         elif action == "check_availability":
-            result = self.check_availability(message, data)
+            result = self.check_availability(message, data, prefetch)
+            
+            # Guarda serviço e data para que o botão de horário possa concluir o agendamento
+            for key in ('service_id', 'date'):
+                if data.get(key):
+                    context.setdefault('data', {})[key] = data[key]
+            if result.get('buttons'):
+                context['state'] = self.conversation_states['TIME_SELECTION']
         
         elif action == "create_appointment":
-            result = self.create_appointment(phone_number, message, data, context)
+            result = self.create_appointment(phone_number, message, data, context, uow)
         
         elif action == "show_appointments":
-            result = self.show_appointments(phone_number, message)
+            result = self.show_appointments(phone_number, message, uow)
         
         elif action == "cancel_appointment":
             result = self.cancel_appointment(phone_number, message, data)
@@ -182,9 +798,11 @@ class SalonAIAgent:
         
         return result
     
-    def show_services(self, message):
+    def show_services(self, message, prefetch=None):
         """Mostra os serviços disponíveis com botões"""
-        success, services = self.db_service.get_all_services()
+        success, services = prefetch.result('services', (False, None)) if prefetch else (False, None)
+        if not success:
+            success, services = self.service_catalog.get_all_services()
         
         if not success:
             return {
@@ -192,23 +810,25 @@ class SalonAIAgent:
                 "buttons": None
             }
         
-        # Cria botões para os serviços
+        # Cria botões para os serviços (o preço vai no texto: o título tem até 20 caracteres)
         buttons = []
+        prices = []
         for service in services[:3]:  # Máximo 3 botões por mensagem no WhatsApp
             buttons.append({
                 "type": "reply",
                 "reply": {
                     "id": f"service_{service['service_id']}",
-                    "title": f"{service['name']} - R$ {service['price']:.2f}"
+                    "title": service['name'][:BUTTON_TITLE_MAX_LENGTH]
                 }
             })
+            prices.append(f"💇 {service['name']} - R$ {service['price']:.2f}")
         
         return {
-            "message": message,
+            "message": f"{message}\n\n" + "\n".join(prices),
             "buttons": buttons
         }
     
-    def check_availability(self, message, data):
+    def check_availability(self, message, data, prefetch=None):
         """Verifica disponibilidade para uma data específica"""
         try:
             date_str = data.get('date')
@@ -220,23 +840,20 @@ class SalonAIAgent:
                     "buttons": None
                 }
             
-            # Converte string para data
-            date_obj = datetime.strptime(date_str, '%Y-%m-%d').date()
+            # Usa a consulta antecipada se foi feita para o mesmo serviço e data
+            availability = None
+            if prefetch is not None and prefetch.has('availability', (service_id, date_str)):
+                availability = prefetch.result('availability')
+            if availability is None:
+                availability = self.load_availability(service_id, date_str)
+            service, available_slots = availability
             
-            # Obtém informações do serviço
-            success, service = self.db_service.get_service(service_id)
-            if not success:
+            if service is None:
                 return {
                     "message": "Serviço não encontrado.",
                     "buttons": None
                 }
             
-            # Obtém slots disponíveis
-            available_slots = self.calendar_service.get_available_slots(
-                date_obj, 
-                duration_minutes=service['duration_minutes']
-            )
-            
             if not available_slots:
                 return {
                     "message": f"Infelizmente não temos horários disponíveis para {date_str}. Gostaria de tentar outra data?",
@@ -266,7 +883,24 @@ class SalonAIAgent:
                 "buttons": None
             }
     
-    def create_appointment(self, phone_number, message, data, context):
+    def load_availability(self, service_id, date_str):
+        """Serviço e horários livres na data; (None, []) se o serviço não existe"""
+        # Converte string para data
+        date_obj = datetime.strptime(date_str, '%Y-%m-%d').date()
+        
+        # Obtém informações do serviço
+        success, service = self.service_catalog.get_service(service_id)
+        if not success:
+            return None, []
+        
+        # Obtém slots disponíveis
+        available_slots = self.calendar_service.get_available_slots(
+            date_obj, 
+            duration_minutes=service['duration_minutes']
+        )
+        return service, available_slots
+    
+    def create_appointment(self, phone_number, message, data, context, uow=None):
         """Cria um novo agendamento"""
         try:
             service_id = data.get('service_id')
@@ -280,13 +914,22 @@ class SalonAIAgent:
                     "buttons": None
                 }
             
+            # Obtém informações do serviço
+            success, service = self.service_catalog.get_service(service_id)
+            if not success:
+                return {
+                    "message": "Serviço não encontrado.",
+                    "buttons": None
+                }
+            
             # Cria agendamento no banco de dados
-            success, appointment_id = self.db_service.create_appointment(
+            success, appointment_id = (uow or self.db_service).create_appointment(
                 phone_number=phone_number,
                 service_id=service_id,
                 appointment_date=date_str,
                 appointment_time=time_str,
-                client_name=client_name
+                client_name=client_name,
+                service=service
             )
             
             if not success:
@@ -295,24 +938,25 @@ class SalonAIAgent:
                     "buttons": None
                 }
             
-            # Obtém informações do serviço
-            success, service = self.db_service.get_service(service_id)
-            
-            # Cria evento no Google Calendar
-            start_datetime = datetime.strptime(f"{date_str} {time_str}", '%Y-%m-%d %H:%M')
-            end_datetime = start_datetime + timedelta(minutes=service['duration_minutes'])
-            
-            calendar_success, calendar_event = self.calendar_service.create_appointment(
-                summary=f"{service['name']} - {client_name or 'Cliente'}",
-                start_time=start_datetime,
-                end_time=end_datetime,
-                description=f"Cliente: {phone_number}\nServiço: {service['name']}\nPreço: R$ {service['price']:.2f}"
-            )
-            
-            if calendar_success:
-                # Salva o ID do evento do Google Calendar no agendamento
-                # (Aqui você poderia atualizar o registro no DynamoDB com o event_id)
-                pass
+            # Cria evento no Google Calendar (o agendamento já está gravado: uma falha
+            # aqui não pode virar "tente novamente", senão o cliente agenda duas vezes)
+            try:
+                start_datetime = datetime.strptime(f"{date_str} {time_str}", '%Y-%m-%d %H:%M')
+                end_datetime = start_datetime + timedelta(minutes=service['duration_minutes'])
+                
+                calendar_success, calendar_event = self.calendar_service.create_appointment(
+                    summary=f"{service['name']} - {client_name or 'Cliente'}",
+                    start_time=start_datetime,
+                    end_time=end_datetime,
+                    description=f"Cliente: {phone_number}\nServiço: {service['name']}\nPreço: R$ {service['price']:.2f}"
+                )
+                
+                if calendar_success:
+                    # Salva o ID do evento do Google Calendar no agendamento
+                    # (Aqui você poderia atualizar o registro no DynamoDB com o event_id)
+                    pass
+            except Exception as e:
+                print(f"Erro ao criar evento no Google Calendar para o agendamento {appointment_id}: {str(e)}")
             
             # Limpa o contexto da conversa
             context['state'] = self.conversation_states['COMPLETED']
@@ -330,34 +974,38 @@ class SalonAIAgent:
                 "buttons": None
             }
     
-    def show_appointments(self, phone_number, message):
+    def show_appointments(self, phone_number, message, uow=None):
         """Mostra agendamentos existentes do cliente"""
-        success, appointments = self.db_service.get_appointments_by_phone(phone_number)
-        
-        if not success or not appointments:
+        # Só os agendamentos ativos a partir de hoje, e só os primeiros da lista
+        try:
+            appointments = list(itertools.islice((uow or self.db_service).iter_appointments_by_phone(
+                phone_number,
+                from_date=datetime.now().strftime('%Y-%m-%d'),
+                status='scheduled',
+                projection=APPOINTMENT_LIST_FIELDS,
+                page_size=SHOW_APPOINTMENTS_LIMIT + 1
+            ), SHOW_APPOINTMENTS_LIMIT + 1))
+        except Exception as e:
+            # Limite do turno ou erro do DynamoDB: não dizer ao cliente que ele não tem agendamentos
+            print(f"Erro ao buscar agendamentos: {str(e)}")
             return {
-                "message": "Você não possui agendamentos no momento.",
+                "message": "Não consegui consultar seus agendamentos agora. Tente novamente em alguns instantes.",
                 "buttons": None
             }
         
-        # Filtra apenas agendamentos futuros e ativos
-        future_appointments = [
-            apt for apt in appointments 
-            if apt.get('status') == 'scheduled' and 
-            datetime.strptime(apt['appointment_date'], '%Y-%m-%d').date() >= datetime.now().date()
-        ]
-        
-        if not future_appointments:
+        if not appointments:
             return {
                 "message": "Você não possui agendamentos futuros.",
                 "buttons": None
             }
         
         appointments_text = "Seus agendamentos:\n\n"
-        for apt in future_appointments:
+        for apt in appointments[:SHOW_APPOINTMENTS_LIMIT]:
             appointments_text += f"📅 {apt['appointment_date']} às {apt['appointment_time']}\n"
             appointments_text += f"💇 {apt['service_name']}\n"
             appointments_text += f"💰 R$ {apt['price']:.2f}\n\n"
+        if len(appointments) > SHOW_APPOINTMENTS_LIMIT:
+            appointments_text += "E outros agendamentos mais adiante.\n"
         
         return {
             "message": f"{message}\n\n{appointments_text}",
@@ -0,0 +1,89 @@
+import threading
+import zlib
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+class ConversationDispatcher:
+    """Executor ordenado por conversa.
+    
+    Cada telefone é mapeado (hash) para um shard. As tarefas de um shard
+    rodam estritamente em ordem, uma de cada vez; shards diferentes rodam em
+    paralelo em um pool de threads limitado.
+    """
+    
+    def __init__(self, num_shards=32, max_workers=8):
+        self.num_shards = num_shards
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='conversation')
+        self._lock = threading.Lock()
+        self._queues = [deque() for _ in range(num_shards)]
+        self._running = [False] * num_shards
+        self._completed = 0
+    
+    def shard_for(self, key):
+        """Retorna o shard de uma chave (telefone)"""
+        return zlib.crc32(str(key).encode('utf-8')) % self.num_shards
+    
+    def submit(self, key, fn, *args, **kwargs):
+        """Enfileira fn(*args, **kwargs) no shard da chave e retorna um Future"""
+        future = Future()
+        shard = self.shard_for(key)
+        
+        with self._lock:
+            self._queues[shard].append((future, fn, args, kwargs))
+            if not self._running[shard]:
+                self._running[shard] = True
+                self._executor.submit(self._run_next, shard)
+        
+        return future
+    
+    def _run_next(self, shard):
+        """Executa a próxima tarefa do shard e reagenda o shard se houver mais"""
+        # A tarefa só sai da fila ao terminar, para contar na profundidade
+        with self._lock:
+            future, fn, args, kwargs = self._queues[shard][0]
+        
+        result, error = None, None
+        should_run = future.set_running_or_notify_cancel()
+        if should_run:
+            try:
+                result = fn(*args, **kwargs)
+            except BaseException as e:
+                error = e
+        
+        with self._lock:
+            self._queues[shard].popleft()
+            self._completed += 1
+            if self._queues[shard]:
+                # Volta para o fim da fila do pool para não monopolizar um worker
+                self._executor.submit(self._run_next, shard)
+            else:
+                self._running[shard] = False
+        
+        # O Future só é resolvido depois que a tarefa saiu da fila
+        if should_run:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+    
+    def get_queue_depths(self):
+        """Tarefas aguardando ou em execução em cada shard"""
+        with self._lock:
+            return [len(queue) for queue in self._queues]
+    
+    def get_stats(self):
+        """Métricas do dispatcher"""
+        depths = self.get_queue_depths()
+        return {
+            "shards": self.num_shards,
+            "max_workers": self.max_workers,
+            "active_shards": sum(1 for depth in depths if depth),
+            "queued": sum(depths),
+            "max_queue_depth": max(depths) if depths else 0,
+            "completed": self._completed,
+            "queue_depths": depths
+        }
+    
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,83 @@
+import hashlib
+import json
+import threading
+from metrics import RollingStats
+from prompt_builder import ROLE_LABELS, estimate_tokens, truncate_text
+
+class ConversationHistory:
+    """Histórico recente da conversa, guardado no próprio contexto.
+    
+    As últimas mensagens ficam em context['history']; quando passam de
+    `max_turns` ou de `max_tokens`, as mais antigas são resumidas em
+    context['summary'] (uma linha curta por mensagem, descartando as linhas
+    mais antigas acima de `summary_max_tokens`). Assim o item da conversa no
+    DynamoDB tem tamanho limitado, qualquer que seja a duração da conversa.
+    """
+    
+    def __init__(self, max_turns=8, max_tokens=600, summary_max_tokens=200, turn_max_tokens=150,
+                 summary_line_chars=80):
+        self.max_turns = max_turns
+        self.max_tokens = max_tokens
+        self.summary_max_tokens = summary_max_tokens
+        self.turn_max_tokens = turn_max_tokens
+        self.summary_line_chars = summary_line_chars
+        
+        self._lock = threading.Lock()
+        self.recorded = 0
+        self.compacted = 0
+        self.history_bytes = RollingStats()
+    
+    def record(self, context, client_text, agent_text):
+        """Adiciona a mensagem do cliente e a resposta do turno e compacta se preciso"""
+        turns = context.setdefault('history', [])
+        for role, text in (('client', client_text), ('agent', agent_text)):
+            if text:
+                turns.append({'role': role, 'text': truncate_text(text, self.turn_max_tokens)})
+        
+        compacted = self.compact(context)
+        size = len(json.dumps({'history': context['history'], 'summary': context.get('summary', '')},
+                              ensure_ascii=False).encode('utf-8'))
+        with self._lock:
+            self.recorded += 1
+            self.compacted += compacted
+        self.history_bytes.add(size)
+    
+    def compact(self, context):
+        """Move as mensagens mais antigas para o resumo; retorna quantas foram movidas"""
+        turns = context.get('history') or []
+        folded = []
+        while turns and (len(turns) > self.max_turns or self.history_tokens(turns) > self.max_tokens):
+            folded.append(turns.pop(0))
+        if not folded:
+            return 0
+        
+        lines = [line for line in (context.get('summary') or '').split('\n') if line]
+        for turn in folded:
+            text = ' '.join(turn['text'].split())
+            lines.append(f"{ROLE_LABELS.get(turn['role'], turn['role'])}: {truncate_text(text, self.summary_line_chars // 4)}")
+        while lines and estimate_tokens('\n'.join(lines)) > self.summary_max_tokens:
+            lines.pop(0)
+        
+        context['history'] = turns
+        context['summary'] = '\n'.join(lines)
+        return len(folded)
+    
+    @staticmethod
+    def history_tokens(turns):
+        return sum(estimate_tokens(turn['text']) for turn in turns)
+    
+    @staticmethod
+    def digest(context):
+        """Hash do histórico e do resumo ('' sem histórico), para chaves de cache que dependem da conversa"""
+        if not context.get('history') and not context.get('summary'):
+            return ''
+        canonical = json.dumps({'history': context.get('history') or [], 'summary': context.get('summary') or ''},
+                               sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+        return hashlib.sha256(canonical.encode('utf-8')).hexdigest()[:16]
+    
+    def get_stats(self):
+        """Turnos registrados, mensagens resumidas e tamanho do histórico (bytes)"""
+        with self._lock:
+            stats = {"recorded": self.recorded, "compacted": self.compacted}
+        stats["history_bytes"] = self.history_bytes.summary(digits=0)
+        return stats
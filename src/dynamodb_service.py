@@ -1,22 +1,164 @@
 import boto3
 from boto3.dynamodb.conditions import Key, Attr
+from botocore.exceptions import ClientError
 from datetime import datetime, timedelta
 import json
+import threading
+import time
 import uuid
-from config.config import AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY, AWS_REGION
+from config.config import AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY, AWS_REGION, CONVERSATION_MAX_CONTEXT_BYTES
+from config.config import TABLE_CHECK_RETRY_SECONDS
+
+# Tabelas usadas pelo serviço: chave de partição e índices secundários esperados
+TABLE_SCHEMAS = {
+    'salon_appointments': {'key': 'appointment_id', 'indexes': ('phone-date-index', 'date-time-index')},
+    'salon_clients': {'key': 'phone_number', 'indexes': ()},
+    'salon_services': {'key': 'service_id', 'indexes': ()},
+    'salon_conversations': {'key': 'phone_number', 'indexes': ()},
+    'salon_processed_messages': {'key': 'message_id', 'indexes': ()},
+    'salon_response_cache': {'key': 'cache_key', 'indexes': ()}
+}
+
+# Agendamentos por dia, ordenados por horário (agenda do dia e lembretes)
+DATE_TIME_INDEX = {
+    'IndexName': 'date-time-index',
+    'KeySchema': [
+        {
+            'AttributeName': 'appointment_date',
+            'KeyType': 'HASH'
+        },
+        {
+            'AttributeName': 'appointment_time',
+            'KeyType': 'RANGE'
+        }
+    ],
+    'Projection': {
+        'ProjectionType': 'ALL'
+    },
+    'ProvisionedThroughput': {
+        'ReadCapacityUnits': 5,
+        'WriteCapacityUnits': 5
+    }
+}
+
+# Serviços gravados por populate_default_services
+DEFAULT_SERVICES = [
+    {
+        'service_id': 'corte_feminino',
+        'name': 'Corte Feminino',
+        'duration_minutes': 60,
+        'price': 50.00,
+        'description': 'Corte de cabelo feminino'
+    },
+    {
+        'service_id': 'corte_masculino',
+        'name': 'Corte Masculino',
+        'duration_minutes': 30,
+        'price': 25.00,
+        'description': 'Corte de cabelo masculino'
+    },
+    {
+        'service_id': 'manicure',
+        'name': 'Manicure',
+        'duration_minutes': 45,
+        'price': 20.00,
+        'description': 'Manicure completa'
+    },
+    {
+        'service_id': 'pedicure',
+        'name': 'Pedicure',
+        'duration_minutes': 60,
+        'price': 25.00,
+        'description': 'Pedicure completa'
+    },
+    {
+        'service_id': 'hidratacao',
+        'name': 'Hidratação',
+        'duration_minutes': 90,
+        'price': 40.00,
+        'description': 'Hidratação capilar'
+    },
+    {
+        'service_id': 'escova',
+        'name': 'Escova',
+        'duration_minutes': 45,
+        'price': 30.00,
+        'description': 'Escova progressiva'
+    }
+]
+
+class LazyTable:
+    """Referência a uma tabela criada no primeiro acesso, sem chamadas à AWS.
+    
+    `dynamodb.Table(nome)` só monta o objeto local; a tabela é lida pela
+    primeira operação feita nela. Cada thread recebe o seu objeto, montado
+    sobre o resource da própria thread. Atribuir o atributo (ex.: um Mock
+    nos testes) substitui a referência para todas as threads.
+    """
+    
+    def __init__(self, table_name):
+        self.table_name = table_name
+    
+    def __set_name__(self, owner, name):
+        self.attribute = name
+    
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        tables = instance._local.__dict__.setdefault('tables', {})
+        table = tables.get(self.table_name)
+        if table is None:
+            table = tables[self.table_name] = instance.dynamodb.Table(self.table_name)
+        return table
 
 class DynamoDBService:
+    """Acesso às tabelas do salão no DynamoDB.
+    
+    O construtor não faz chamadas à AWS: o cliente boto3 e as tabelas são
+    criados no primeiro uso. As tabelas são criadas antes do deploy por
+    `python src/provision_tables.py` (create_tables); verify_tables confere
+    o esquema uma única vez por processo (e de novo enquanto houver problemas).
+    
+    Resources do boto3 (e os objetos Table) não são thread-safe, e a mesma
+    instância é usada pelas leituras paralelas do turno (TurnPrefetch) e
+    pelos workers do dispatcher: cada thread cria o seu resource no
+    primeiro uso, a partir da sessão padrão, com a criação serializada.
+    """
+    
+    appointments_table = LazyTable('salon_appointments')
+    clients_table = LazyTable('salon_clients')
+    services_table = LazyTable('salon_services')
+    conversations_table = LazyTable('salon_conversations')
+    processed_messages_table = LazyTable('salon_processed_messages')
+    response_cache_table = LazyTable('salon_response_cache')
+    
+    # Resultado de verify_tables, compartilhado por todas as instâncias do processo
+    _schema_status = None
+    _schema_checked_at = 0.0
+    _schema_lock = threading.Lock()
+    
     def __init__(self):
-        self.dynamodb = boto3.resource(
-            'dynamodb',
-            aws_access_key_id=AWS_ACCESS_KEY_ID,
-            aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
-            region_name=AWS_REGION
-        )
-        self.create_tables()
+        self._local = threading.local()
+        self._resource_lock = threading.Lock()
+    
+    @property
+    def dynamodb(self):
+        """Resource do DynamoDB da thread atual"""
+        dynamodb = getattr(self._local, 'dynamodb', None)
+        if dynamodb is None:
+            # A sessão padrão do boto3 também não é thread-safe: uma criação por vez
+            with self._resource_lock:
+                dynamodb = boto3.resource(
+                    'dynamodb',
+                    aws_access_key_id=AWS_ACCESS_KEY_ID,
+                    aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
+                    region_name=AWS_REGION
+                )
+            self._local.dynamodb = dynamodb
+        return dynamodb
     
     def create_tables(self):
-        """Cria as tabelas necessárias no DynamoDB se não existirem"""
+        """Cria as tabelas necessárias no DynamoDB se não existirem (provisionamento, fora do caminho de execução)"""
         try:
             # Tabela de agendamentos
             self.appointments_table = self.create_appointments_table()
@@ -30,10 +172,60 @@ class DynamoDBService:
             # Tabela de conversas (para manter contexto)
             self.conversations_table = self.create_conversations_table()
             
+            # Tabela de mensagens já recebidas (deduplicação do webhook)
+            self.processed_messages_table = self.create_processed_messages_table()
+            
+            # Tabela do cache compartilhado de respostas do LLM
+            self.response_cache_table = self.create_response_cache_table()
+            
             print("Tabelas DynamoDB configuradas com sucesso!")
+            return True
             
         except Exception as e:
             print(f"Erro ao configurar tabelas DynamoDB: {str(e)}")
+            return False
+    
+    def verify_tables(self, refresh=False):
+        """Confere se as tabelas existem, estão ativas e têm as chaves e índices esperados.
+        
+        Um resultado sem problemas é reaproveitado pelo resto do processo; com
+        problemas (tabela sendo criada, índice em construção, erro de rede) vale
+        só por TABLE_CHECK_RETRY_SECONDS, para o /status mostrar a correção
+        sem reiniciar o serviço. `refresh=True` força uma nova verificação.
+        """
+        cls = type(self)
+        with cls._schema_lock:
+            if cls._schema_status is not None and not refresh:
+                if cls._schema_status[0] or time.monotonic() - cls._schema_checked_at < TABLE_CHECK_RETRY_SECONDS:
+                    return cls._schema_status
+            
+            problems = []
+            for table_name, schema in TABLE_SCHEMAS.items():
+                try:
+                    description = self.dynamodb.meta.client.describe_table(TableName=table_name)['Table']
+                except ClientError as e:
+                    problems.append(f"{table_name}: {e.response['Error']['Code']}")
+                    continue
+                except Exception as e:
+                    problems.append(f"{table_name}: {str(e)}")
+                    continue
+                
+                if description.get('TableStatus') != 'ACTIVE':
+                    problems.append(f"{table_name}: status {description.get('TableStatus')}")
+                hash_keys = [k['AttributeName'] for k in description.get('KeySchema', []) if k['KeyType'] == 'HASH']
+                if hash_keys != [schema['key']]:
+                    problems.append(f"{table_name}: chave {hash_keys}, esperada {schema['key']}")
+                indexes = {index['IndexName']: index.get('IndexStatus')
+                           for index in description.get('GlobalSecondaryIndexes', [])}
+                for index_name in schema['indexes']:
+                    if index_name not in indexes:
+                        problems.append(f"{table_name}: índice {index_name} não encontrado")
+                    elif indexes[index_name] != 'ACTIVE':
+                        problems.append(f"{table_name}: índice {index_name} com status {indexes[index_name]}")
+            
+            cls._schema_status = (not problems, problems)
+            cls._schema_checked_at = time.monotonic()
+            return cls._schema_status
     
     def create_appointments_table(self):
         """Cria a tabela de agendamentos"""
@@ -43,8 +235,24 @@ class DynamoDBService:
             table = self.dynamodb.Table(table_name)
             table.load()
             print(f"Tabela {table_name} já existe")
-            return table
         except:
+            table = None
+        
+        if table is not None:
+            # Tabelas criadas antes do índice por data: adiciona o índice
+            indexes = {index['IndexName'] for index in table.global_secondary_indexes or []}
+            if DATE_TIME_INDEX['IndexName'] not in indexes:
+                self.dynamodb.meta.client.update_table(
+                    TableName=table_name,
+                    AttributeDefinitions=[
+                        {'AttributeName': 'appointment_date', 'AttributeType': 'S'},
+                        {'AttributeName': 'appointment_time', 'AttributeType': 'S'}
+                    ],
+                    GlobalSecondaryIndexUpdates=[{'Create': DATE_TIME_INDEX}]
+                )
+                print(f"Índice {DATE_TIME_INDEX['IndexName']} em criação na tabela {table_name}")
+            return table
+        else:
             # Tabela não existe, criar
             table = self.dynamodb.create_table(
                 TableName=table_name,
@@ -66,6 +274,10 @@ class DynamoDBService:
                     {
                         'AttributeName': 'appointment_date',
                         'AttributeType': 'S'
+                    },
+                    {
+                        'AttributeName': 'appointment_time',
+                        'AttributeType': 'S'
                     }
                 ],
                 GlobalSecondaryIndexes=[
@@ -88,7 +300,8 @@ class DynamoDBService:
                             'ReadCapacityUnits': 5,
                             'WriteCapacityUnits': 5
                         }
-                    }
+                    },
+                    DATE_TIME_INDEX
                 ],
                 ProvisionedThroughput={
                     'ReadCapacityUnits': 5,
@@ -206,54 +419,58 @@ class DynamoDBService:
             print(f"Tabela {table_name} criada com sucesso")
             return table
     
+    def create_processed_messages_table(self):
+        """Cria a tabela de ids de mensagens recebidas (com TTL)"""
+        return self.create_ttl_table('salon_processed_messages', 'message_id')
+    
+    def create_response_cache_table(self):
+        """Cria a tabela do cache compartilhado de respostas do LLM (com TTL)"""
+        return self.create_ttl_table('salon_response_cache', 'cache_key')
+    
+    def create_ttl_table(self, table_name, key_name):
+        """Cria uma tabela chave-valor cujos itens expiram pelo atributo expires_at"""
+        try:
+            table = self.dynamodb.Table(table_name)
+            table.load()
+            print(f"Tabela {table_name} já existe")
+            return table
+        except:
+            table = self.dynamodb.create_table(
+                TableName=table_name,
+                KeySchema=[
+                    {
+                        'AttributeName': key_name,
+                        'KeyType': 'HASH'  # Partition key
+                    }
+                ],
+                AttributeDefinitions=[
+                    {
+                        'AttributeName': key_name,
+                        'AttributeType': 'S'
+                    }
+                ],
+                ProvisionedThroughput={
+                    'ReadCapacityUnits': 5,
+                    'WriteCapacityUnits': 5
+                }
+            )
+            
+            table.wait_until_exists()
+            
+            # Os itens expiram sozinhos pelo atributo expires_at
+            self.dynamodb.meta.client.update_time_to_live(
+                TableName=table_name,
+                TimeToLiveSpecification={
+                    'Enabled': True,
+                    'AttributeName': 'expires_at'
+                }
+            )
+            print(f"Tabela {table_name} criada com sucesso")
+            return table
+    
     def populate_default_services(self, table):
         """Popula a tabela de serviços com dados padrão"""
-        default_services = [
-            {
-                'service_id': 'corte_feminino',
-                'name': 'Corte Feminino',
-                'duration_minutes': 60,
-                'price': 50.00,
-                'description': 'Corte de cabelo feminino'
-            },
-            {
-                'service_id': 'corte_masculino',
-                'name': 'Corte Masculino',
-                'duration_minutes': 30,
-                'price': 25.00,
-                'description': 'Corte de cabelo masculino'
-            },
-            {
-                'service_id': 'manicure',
-                'name': 'Manicure',
-                'duration_minutes': 45,
-                'price': 20.00,
-                'description': 'Manicure completa'
-            },
-            {
-                'service_id': 'pedicure',
-                'name': 'Pedicure',
-                'duration_minutes': 60,
-                'price': 25.00,
-                'description': 'Pedicure completa'
-            },
-            {
-                'service_id': 'hidratacao',
-                'name': 'Hidratação',
-                'duration_minutes': 90,
-                'price': 40.00,
-                'description': 'Hidratação capilar'
-            },
-            {
-                'service_id': 'escova',
-                'name': 'Escova',
-                'duration_minutes': 45,
-                'price': 30.00,
-                'description': 'Escova progressiva'
-            }
-        ]
-        
-        for service in default_services:
+        for service in DEFAULT_SERVICES:
             try:
                 table.put_item(Item=service)
                 print(f"Serviço {service['name']} adicionado")
@@ -299,17 +516,19 @@ class DynamoDBService:
             return False, f"Erro ao buscar cliente: {str(e)}"
     
     # Métodos para gerenciar agendamentos
-    def create_appointment(self, phone_number, service_id, appointment_date, appointment_time, client_name=None):
-        """Cria um novo agendamento"""
+    def create_appointment(self, phone_number, service_id, appointment_date, appointment_time, client_name=None,
+                           service=None):
+        """Cria um novo agendamento (`service` evita reler o serviço se o chamador já o tem)"""
         try:
             appointment_id = str(uuid.uuid4())
             
             # Obtém informações do serviço
-            service_info = self.get_service(service_id)
-            if not service_info[0]:
-                return False, "Serviço não encontrado"
-            
-            service = service_info[1]
+            if service is None:
+                service_info = self.get_service(service_id)
+                if not service_info[0]:
+                    return False, "Serviço não encontrado"
+                
+                service = service_info[1]
             
             item = {
                 'appointment_id': appointment_id,
@@ -337,28 +556,88 @@ class DynamoDBService:
     def get_appointments_by_phone(self, phone_number):
         """Obtém agendamentos de um cliente"""
         try:
-            response = self.appointments_table.query(
-                IndexName='phone-date-index',
-                KeyConditionExpression=Key('phone_number').eq(phone_number)
-            )
-            
-            return True, response['Items']
+            return True, list(self.iter_appointments_by_phone(phone_number))
         
         except Exception as e:
             return False, f"Erro ao buscar agendamentos: {str(e)}"
     
+    def iter_appointments_by_phone(self, phone_number, from_date=None, status=None, projection=None, page_size=None):
+        """Agendamentos de um cliente em ordem de data, lidos página por página.
+        
+        `from_date` (YYYY-MM-DD) e `status` são aplicados na própria consulta.
+        Erros do DynamoDB são levantados durante a iteração.
+        """
+        key_condition = Key('phone_number').eq(phone_number)
+        if from_date:
+            key_condition = key_condition & Key('appointment_date').gte(from_date)
+        kwargs = {'IndexName': 'phone-date-index', 'KeyConditionExpression': key_condition}
+        if status:
+            kwargs['FilterExpression'] = Attr('status').eq(status)
+        return self.iter_items(self.appointments_table, 'query', projection=projection, page_size=page_size, **kwargs)
+    
     def get_appointments_by_date(self, date):
-        """Obtém todos os agendamentos de uma data específica"""
+        """Obtém todos os agendamentos de uma data específica, ordenados por horário"""
         try:
-            response = self.appointments_table.scan(
-                FilterExpression=Attr('appointment_date').eq(date)
-            )
-            
-            return True, response['Items']
+            return True, list(self.iter_appointments_by_date(date))
         
         except Exception as e:
             return False, f"Erro ao buscar agendamentos por data: {str(e)}"
     
+    def iter_appointments_by_date(self, date, projection=None, page_size=None):
+        """Agendamentos de uma data em ordem de horário, lidos página por página"""
+        return self.iter_items(
+            self.appointments_table, 'query', projection=projection, page_size=page_size,
+            IndexName='date-time-index',
+            KeyConditionExpression=Key('appointment_date').eq(date)
+        )
+    
+    def get_appointments_by_date_range(self, start_date, end_date):
+        """Obtém os agendamentos de start_date a end_date (YYYY-MM-DD, inclusive), por data e horário.
+        
+        O índice date-time-index tem a data como chave de partição, então é
+        feita uma consulta por dia do intervalo.
+        """
+        try:
+            day = datetime.strptime(start_date, '%Y-%m-%d').date()
+            last_day = datetime.strptime(end_date, '%Y-%m-%d').date()
+            
+            items = []
+            while day <= last_day:
+                items.extend(self.iter_appointments_by_date(day.isoformat()))
+                day += timedelta(days=1)
+            
+            return True, items
+        
+        except Exception as e:
+            return False, f"Erro ao buscar agendamentos por período: {str(e)}"
+    
+    def iter_items(self, table, operation='query', projection=None, page_size=None, **kwargs):
+        """Itens de um query ou scan, buscando a próxima página só quando a anterior acaba.
+        
+        `projection` é a lista de atributos a trazer e `page_size` o Limit de
+        cada página; o gerador segue LastEvaluatedKey até o fim, então quem
+        para de iterar antes não lê as páginas seguintes.
+        """
+        if projection:
+            names = dict(kwargs.get('ExpressionAttributeNames') or {})
+            placeholders = []
+            for index, attribute in enumerate(projection):
+                names[f'#p{index}'] = attribute
+                placeholders.append(f'#p{index}')
+            kwargs['ProjectionExpression'] = ', '.join(placeholders)
+            kwargs['ExpressionAttributeNames'] = names
+        if page_size:
+            kwargs['Limit'] = page_size
+        
+        read = getattr(table, operation)
+        while True:
+            response = read(**kwargs)
+            yield from response['Items']
+            last_key = response.get('LastEvaluatedKey')
+            if not last_key:
+                return
+            kwargs['ExclusiveStartKey'] = last_key
+    
     def update_appointment_status(self, appointment_id, status):
         """Atualiza o status de um agendamento"""
         try:
@@ -381,12 +660,15 @@ class DynamoDBService:
     def get_all_services(self):
         """Obtém todos os serviços disponíveis"""
         try:
-            response = self.services_table.scan()
-            return True, response['Items']
+            return True, list(self.iter_services())
         
         except Exception as e:
             return False, f"Erro ao buscar serviços: {str(e)}"
     
+    def iter_services(self, projection=None, page_size=None):
+        """Serviços cadastrados, lidos página por página"""
+        return self.iter_items(self.services_table, 'scan', projection=projection, page_size=page_size)
+    
     def get_service(self, service_id):
         """Obtém informações de um serviço específico"""
         try:
@@ -402,13 +684,77 @@ class DynamoDBService:
         except Exception as e:
             return False, f"Erro ao buscar serviço: {str(e)}"
     
+    # Métodos para deduplicação de mensagens
+    def register_message_id(self, message_id, expires_at):
+        """Registra o id de uma mensagem recebida.
+        
+        Retorna (True, True) se a mensagem é nova e (True, False) se o id já
+        estava registrado (reentrega do webhook).
+        """
+        try:
+            self.processed_messages_table.put_item(
+                Item={
+                    'message_id': message_id,
+                    'expires_at': expires_at
+                },
+                ConditionExpression='attribute_not_exists(message_id)'
+            )
+            return True, True
+        
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') == 'ConditionalCheckFailedException':
+                return True, False
+            return False, f"Erro ao registrar mensagem: {str(e)}"
+        
+        except Exception as e:
+            return False, f"Erro ao registrar mensagem: {str(e)}"
+    
+    def unregister_message_id(self, message_id):
+        """Remove o registro de uma mensagem, para que a reentrega seja aceita"""
+        try:
+            self.processed_messages_table.delete_item(Key={'message_id': message_id})
+            return True, "Registro removido"
+        
+        except Exception as e:
+            return False, f"Erro ao remover registro da mensagem: {str(e)}"
+    
+    # Métodos para o cache de respostas do LLM
+    def get_cached_response(self, cache_key):
+        """Obtém uma resposta do cache; retorna (True, resposta ou None)"""
+        try:
+            response = self.response_cache_table.get_item(Key={'cache_key': cache_key})
+            item = response.get('Item')
+            
+            # O TTL do DynamoDB remove os itens com atraso; ignora os já expirados
+            if not item or int(item['expires_at']) <= int(time.time()):
+                return True, None
+            return True, json.loads(item['response'])
+        
+        except Exception as e:
+            return False, f"Erro ao buscar resposta em cache: {str(e)}"
+    
+    def put_cached_response(self, cache_key, response, expires_at):
+        """Grava uma resposta no cache"""
+        try:
+            self.response_cache_table.put_item(
+                Item={
+                    'cache_key': cache_key,
+                    'response': json.dumps(response, ensure_ascii=False),
+                    'expires_at': expires_at
+                }
+            )
+            return True, "Resposta salva no cache"
+        
+        except Exception as e:
+            return False, f"Erro ao salvar resposta em cache: {str(e)}"
+    
     # Métodos para gerenciar conversas
     def save_conversation_context(self, phone_number, context):
         """Salva o contexto da conversa"""
         try:
             item = {
                 'phone_number': phone_number,
-                'context': json.dumps(context),
+                'context': self.serialize_context(context),
                 'updated_at': datetime.now().isoformat()
             }
             
@@ -418,6 +764,24 @@ class DynamoDBService:
         except Exception as e:
             return False, f"Erro ao salvar contexto: {str(e)}"
     
+    def serialize_context(self, context, max_bytes=CONVERSATION_MAX_CONTEXT_BYTES):
+        """JSON do contexto limitado a max_bytes: descarta o histórico mais antigo e depois o resumo"""
+        serialized = json.dumps(context)
+        if len(serialized.encode('utf-8')) <= max_bytes:
+            return serialized
+        
+        context = dict(context, history=list(context.get('history') or []))
+        while len(serialized.encode('utf-8')) > max_bytes and (context['history'] or context.get('summary')):
+            if context['history']:
+                context['history'].pop(0)
+            else:
+                context['summary'] = ''
+            serialized = json.dumps(context)
+        
+        if len(serialized.encode('utf-8')) > max_bytes:
+            print(f"Contexto da conversa com {len(serialized.encode('utf-8'))} bytes (limite {max_bytes})")
+        return serialized
+    
     def get_conversation_context(self, phone_number):
         """Obtém o contexto da conversa"""
         try:
@@ -0,0 +1,236 @@
+"""Servidor local que imita o endpoint de mensagens da Graph API do WhatsApp.
+
+Serve para testes de carga sem falar com a Meta: aceita os mesmos payloads
+de POST /<versão>/<phone_id>/messages, valida o formato, pode injetar
+latência, respostas 429 e erros 5xx, e guarda todas as mensagens aceitas.
+
+Uso:
+    python src/graph_api_stub.py --port 5005 --latency-ms 120 --error-rate-429 0.02
+    WA_GRAPH_API_BASE_URL=http://localhost:5005 python src/main.py
+
+Endpoints de controle (prefixo /_stub):
+    GET    /_stub/messages   mensagens aceitas (filtro opcional ?to=)
+    DELETE /_stub/messages   limpa as mensagens e contadores
+    GET    /_stub/config     configuração atual de falhas/latência
+    POST   /_stub/config     altera a configuração (JSON parcial)
+    GET    /_stub/stats      contadores de requisições por resultado
+"""
+import argparse
+import itertools
+import random
+import threading
+import time
+from flask import Flask, request, jsonify
+
+MAX_TEXT_LENGTH = 4096
+MAX_BUTTONS = 3
+MAX_BUTTON_TITLE_LENGTH = 20
+MAX_LIST_ROWS = 10
+MAX_ROW_TITLE_LENGTH = 24
+
+class GraphAPIStub:
+    """Estado do servidor: configuração de falhas, mensagens e contadores"""
+    
+    def __init__(self, latency_ms=0, latency_jitter_ms=0, error_rate_429=0.0, error_rate_5xx=0.0,
+                 retry_after=None, access_token=None, seed=None):
+        self.config = {
+            "latency_ms": latency_ms,
+            "latency_jitter_ms": latency_jitter_ms,
+            "error_rate_429": error_rate_429,
+            "error_rate_5xx": error_rate_5xx,
+            "retry_after": retry_after,
+            "access_token": access_token
+        }
+        self._random = random.Random(seed)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self.reset()
+    
+    def reset(self):
+        with self._lock:
+            self.messages = []
+            self.stats = {"requests": 0, "accepted": 0, "invalid": 0, "unauthorized": 0,
+                          "rate_limited": 0, "server_errors": 0}
+    
+    def update_config(self, changes):
+        """Altera a configuração; ignora chaves desconhecidas"""
+        with self._lock:
+            for key, value in changes.items():
+                if key in self.config:
+                    self.config[key] = value
+            return dict(self.config)
+    
+    def handle(self, phone_id, headers, payload):
+        """Processa uma requisição de envio; retorna (status, corpo, cabeçalhos)"""
+        with self._lock:
+            config = dict(self.config)
+            self.stats["requests"] += 1
+            roll = self._random.random()
+            delay = config["latency_ms"] + self._random.uniform(0, config["latency_jitter_ms"])
+        
+        if delay > 0:
+            time.sleep(delay / 1000.0)
+        
+        if config["access_token"] and headers.get('Authorization') != f"Bearer {config['access_token']}":
+            return self._error("unauthorized", 401, 190, "Invalid OAuth access token.", "OAuthException")
+        
+        if roll < config["error_rate_429"]:
+            response_headers = {}
+            if config["retry_after"] is not None:
+                response_headers["Retry-After"] = str(config["retry_after"])
+            return self._error("rate_limited", 429, 130429, "Rate limit hit", "OAuthException", response_headers)
+        if roll < config["error_rate_429"] + config["error_rate_5xx"]:
+            return self._error("server_errors", 503, 2, "Service temporarily unavailable", "OAuthException")
+        
+        problem = validate_payload(payload)
+        if problem:
+            return self._error("invalid", 400, 100, f"Invalid parameter: {problem}", "OAuthException")
+        
+        message_id = f"wamid.stub.{next(self._ids)}"
+        with self._lock:
+            self.stats["accepted"] += 1
+            self.messages.append({
+                "id": message_id,
+                "phone_id": phone_id,
+                "to": payload["to"],
+                "type": payload["type"],
+                "payload": payload,
+                "received_at": time.time()
+            })
+        
+        body = {
+            "messaging_product": "whatsapp",
+            "contacts": [{"input": payload["to"], "wa_id": payload["to"]}],
+            "messages": [{"id": message_id}]
+        }
+        return 200, body, {}
+    
+    def get_messages(self, to=None):
+        with self._lock:
+            return [m for m in self.messages if to is None or m["to"] == to]
+    
+    def get_stats(self):
+        with self._lock:
+            return dict(self.stats)
+    
+    def _error(self, counter, status, code, message, error_type, headers=None):
+        with self._lock:
+            self.stats[counter] += 1
+        body = {"error": {"message": message, "type": error_type, "code": code, "fbtrace_id": "stub"}}
+        return status, body, headers or {}
+
+def validate_payload(payload):
+    """Valida o formato de uma mensagem; retorna a descrição do problema ou None"""
+    if not isinstance(payload, dict):
+        return "corpo deve ser um objeto JSON"
+    if payload.get('messaging_product') != 'whatsapp':
+        return "messaging_product deve ser 'whatsapp'"
+    if not isinstance(payload.get('to'), str) or not payload['to']:
+        return "to é obrigatório"
+    
+    message_type = payload.get('type', 'text')
+    if message_type == 'text':
+        body = (payload.get('text') or {}).get('body')
+        if not isinstance(body, str) or not body:
+            return "text.body é obrigatório"
+        if len(body) > MAX_TEXT_LENGTH:
+            return f"text.body excede {MAX_TEXT_LENGTH} caracteres"
+        return None
+    
+    if message_type == 'interactive':
+        return _validate_interactive(payload.get('interactive'))
+    
+    return f"tipo de mensagem não suportado: {message_type}"
+
+def _validate_interactive(interactive):
+    if not isinstance(interactive, dict):
+        return "interactive é obrigatório"
+    if not (interactive.get('body') or {}).get('text'):
+        return "interactive.body.text é obrigatório"
+    
+    action = interactive.get('action') or {}
+    if interactive.get('type') == 'button':
+        buttons = action.get('buttons')
+        if not isinstance(buttons, list) or not 1 <= len(buttons) <= MAX_BUTTONS:
+            return f"action.buttons deve ter entre 1 e {MAX_BUTTONS} botões"
+        for button in buttons:
+            reply = button.get('reply') or {}
+            if button.get('type') != 'reply' or not reply.get('id') or not reply.get('title'):
+                return "botão deve ter type 'reply', id e title"
+            if len(reply['title']) > MAX_BUTTON_TITLE_LENGTH:
+                return f"título de botão excede {MAX_BUTTON_TITLE_LENGTH} caracteres"
+        return None
+    
+    if interactive.get('type') == 'list':
+        sections = action.get('sections')
+        if not action.get('button') or not isinstance(sections, list) or not sections:
+            return "action.button e action.sections são obrigatórios"
+        rows = [row for section in sections for row in section.get('rows', [])]
+        if not 1 <= len(rows) <= MAX_LIST_ROWS:
+            return f"a lista deve ter entre 1 e {MAX_LIST_ROWS} linhas"
+        for row in rows:
+            if not row.get('id') or not row.get('title'):
+                return "linha da lista deve ter id e title"
+            if len(row['title']) > MAX_ROW_TITLE_LENGTH:
+                return f"título de linha excede {MAX_ROW_TITLE_LENGTH} caracteres"
+        return None
+    
+    return f"tipo interativo não suportado: {interactive.get('type')}"
+
+def create_app(stub=None):
+    """Cria o app Flask do servidor (usa um GraphAPIStub novo se não informado)"""
+    stub = stub or GraphAPIStub()
+    app = Flask(__name__)
+    app.stub = stub
+    
+    @app.route('/<version>/<phone_id>/messages', methods=['POST'])
+    def send_message(version, phone_id):
+        status, body, headers = stub.handle(phone_id, request.headers, request.get_json(silent=True))
+        return jsonify(body), status, headers
+    
+    @app.route('/_stub/messages', methods=['GET'])
+    def list_messages():
+        return jsonify(stub.get_messages(request.args.get('to')))
+    
+    @app.route('/_stub/messages', methods=['DELETE'])
+    def reset_messages():
+        stub.reset()
+        return jsonify({"status": "success"})
+    
+    @app.route('/_stub/config', methods=['GET', 'POST'])
+    def stub_config():
+        if request.method == 'POST':
+            return jsonify(stub.update_config(request.get_json(silent=True) or {}))
+        return jsonify(stub.update_config({}))
+    
+    @app.route('/_stub/stats', methods=['GET'])
+    def stub_stats():
+        return jsonify(stub.get_stats())
+    
+    return app
+
+def main():
+    parser = argparse.ArgumentParser(description="Stand-in local da Graph API do WhatsApp")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5005)
+    parser.add_argument('--latency-ms', type=float, default=0)
+    parser.add_argument('--latency-jitter-ms', type=float, default=0)
+    parser.add_argument('--error-rate-429', type=float, default=0.0)
+    parser.add_argument('--error-rate-5xx', type=float, default=0.0)
+    parser.add_argument('--retry-after', type=float, default=None)
+    parser.add_argument('--access-token', default=None, help="Exige este token no cabeçalho Authorization")
+    args = parser.parse_args()
+    
+    stub = GraphAPIStub(
+        latency_ms=args.latency_ms,
+        latency_jitter_ms=args.latency_jitter_ms,
+        error_rate_429=args.error_rate_429,
+        error_rate_5xx=args.error_rate_5xx,
+        retry_after=args.retry_after,
+        access_token=args.access_token
+    )
+    print(f"📡 Graph API stub em http://{args.host}:{args.port}")
+    create_app(stub).run(host=args.host, port=args.port, threaded=True)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+"""Backends de LLM usados pelo agente.
+
+O agente só depende de `generate(prompt)`, que devolve o texto gerado.
+GeminiBackend chama a API do Gemini; ScriptedBackend responde localmente com
+regras por palavra-chave e latência sorteada de uma distribuição, para
+testes de carga e benchmarks sem rede nem custo de API.
+"""
+import json
+import math
+import random
+import re
+import threading
+import time
+import unicodedata
+import google.generativeai as genai
+
+class LLMBackend:
+    """Interface dos backends: generate(prompt) -> texto da resposta"""
+    name = 'base'
+    
+    def generate(self, prompt):
+        raise NotImplementedError
+
+class GeminiBackend(LLMBackend):
+    """Modelo Gemini via google-generativeai"""
+    name = 'gemini'
+    
+    def __init__(self, api_key, model_name='gemini-pro'):
+        genai.configure(api_key=api_key)
+        self.model_name = model_name
+        self.model = genai.GenerativeModel(model_name)
+    
+    def generate(self, prompt):
+        return self.model.generate_content(prompt).text
+
+class LatencyDistribution:
+    """Distribuição de latência em ms, descrita como "tipo:parâmetros".
+    
+    constant:800           sempre 800 ms
+    uniform:500:1500       uniforme entre 500 e 1500 ms
+    normal:800:200         normal com média 800 e desvio 200 (mínimo 0)
+    lognormal:800:0.5      log-normal com mediana 800 e sigma 0.5 (cauda longa)
+    exponential:800        exponencial com média 800
+    """
+    
+    KINDS = {'constant': 1, 'uniform': 2, 'normal': 2, 'lognormal': 2, 'exponential': 1}
+    
+    def __init__(self, kind='constant', params=(0,), seed=None):
+        if kind not in self.KINDS or len(params) != self.KINDS[kind]:
+            raise ValueError(f"Distribuição de latência inválida: {kind}:{':'.join(map(str, params))}")
+        self.kind = kind
+        self.params = tuple(float(p) for p in params)
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+    
+    @classmethod
+    def parse(cls, spec, seed=None):
+        kind, *params = (spec or 'constant:0').strip().split(':')
+        try:
+            values = [float(p) for p in params]
+        except ValueError:
+            raise ValueError(f"Distribuição de latência inválida: {spec}")
+        return cls(kind, values, seed)
+    
+    def sample(self):
+        """Latência sorteada, em ms"""
+        a = self.params[0]
+        with self._lock:
+            if self.kind == 'constant':
+                value = a
+            elif self.kind == 'uniform':
+                value = self._random.uniform(a, self.params[1])
+            elif self.kind == 'normal':
+                value = self._random.gauss(a, self.params[1])
+            elif self.kind == 'lognormal':
+                value = self._random.lognormvariate(math.log(a), self.params[1]) if a > 0 else 0.0
+            else:
+                value = self._random.expovariate(1.0 / a) if a > 0 else 0.0
+        return max(0.0, value)
+    
+    def __str__(self):
+        return ':'.join([self.kind] + [f"{p:g}" for p in self.params])
+
+# Regras padrão do backend local: (padrão na mensagem do cliente, resposta)
+DEFAULT_RULES = [
+    (r'\bcancel', {
+        "message": "Claro! Vou verificar seus agendamentos para cancelar.",
+        "action": "cancel_appointment",
+        "data": {}
+    }),
+    (r'\bmeus? (agendamentos?|horarios?)\b', {
+        "message": "Vou buscar seus agendamentos.",
+        "action": "show_appointments",
+        "data": {}
+    }),
+    (r'\b(servicos?|precos?|valores?|agendar|marcar|corte|manicure|pedicure|hidratacao|escova)\b', {
+        "message": "Estes são os nossos serviços. Qual você gostaria de agendar?",
+        "action": "show_services",
+        "data": {"state": "service_selection", "conversation_data": {}}
+    })
+]
+
+DEFAULT_RESPONSE = {
+    "message": "Posso ajudar com agendamentos, preços e horários. O que você gostaria?",
+    "action": "continue_conversation",
+    "data": {}
+}
+
+CLIENT_MESSAGE_PATTERN = re.compile(r'MENSAGEM DO CLIENTE: "(?P<message>.*)"', re.DOTALL)
+
+class ScriptedBackend(LLMBackend):
+    """Backend local determinístico: regras por palavra-chave e latência sorteada.
+    
+    A mensagem do cliente é extraída do prompt e comparada (sem acentos, em
+    minúsculas) com as regras na ordem; a primeira que casar define a
+    resposta, devolvida como JSON no mesmo formato pedido ao Gemini.
+    """
+    name = 'scripted'
+    
+    def __init__(self, latency='constant:0', rules=None, default_response=None, seed=None):
+        self.latency = latency if isinstance(latency, LatencyDistribution) else LatencyDistribution.parse(latency, seed)
+        self.rules = [(re.compile(pattern), response) for pattern, response in (rules or DEFAULT_RULES)]
+        self.default_response = default_response or DEFAULT_RESPONSE
+    
+    def generate(self, prompt):
+        delay = self.latency.sample()
+        if delay > 0:
+            time.sleep(delay / 1000.0)
+        
+        match = CLIENT_MESSAGE_PATTERN.search(prompt or '')
+        message = match.group('message') if match else (prompt or '')
+        message = unicodedata.normalize('NFKD', message.lower())
+        message = ''.join(c for c in message if not unicodedata.combining(c))
+        
+        response = self.default_response
+        for pattern, rule_response in self.rules:
+            if pattern.search(message):
+                response = rule_response
+                break
+        return json.dumps(response, ensure_ascii=False)
+
+def create_backend(kind, api_key=None, model_name='gemini-pro', latency='constant:0'):
+    """Cria o backend configurado ('gemini' ou 'scripted')"""
+    if kind == 'scripted':
+        return ScriptedBackend(latency=latency)
+    if kind == 'gemini':
+        return GeminiBackend(api_key, model_name)
+    raise ValueError(f"Backend de LLM desconhecido: {kind}")
@@ -0,0 +1,247 @@
+import heapq
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from metrics import RollingStats
+
+class LLMUnavailable(Exception):
+    """O LLM não foi chamado ou não respondeu a tempo (reason: circuit_open, overloaded, timeout, error)"""
+    
+    def __init__(self, reason, detail=''):
+        super().__init__(f"{reason}: {detail}" if detail else reason)
+        self.reason = reason
+
+class AdaptiveLimiter:
+    """Limite de chamadas simultâneas ajustado por AIMD.
+    
+    Cada resposta rápida aumenta o limite em 1/limite (cerca de +1 por ciclo
+    completo de chamadas); timeouts, erros e respostas acima de
+    `latency_target` multiplicam o limite por `decrease`, no máximo uma vez
+    a cada `decrease_interval` segundos (vários timeouts simultâneos são o
+    mesmo sinal de sobrecarga). Chamadas além do limite esperam por uma vaga.
+    
+    A fila de espera é por prioridade (0 é a mais urgente) com envelhecimento:
+    cada chamada entra com a chave chegada + prioridade * `aging`, então uma
+    chamada de prioridade menor passa à frente das mais urgentes que
+    chegarem mais de `aging` segundos por nível depois dela.
+    """
+    
+    def __init__(self, initial=4, min_limit=1, max_limit=16, latency_target=5.0, decrease=0.5, decrease_interval=1.0,
+                 aging=0.5):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_target = latency_target
+        self.decrease = decrease
+        self.decrease_interval = decrease_interval
+        self.aging = aging
+        self.limit = float(max(min_limit, min(max_limit, initial)))
+        self.in_flight = 0
+        self._last_decrease = float('-inf')
+        self._waiting = []
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+    
+    def acquire(self, timeout=0.0, priority=0):
+        """Reserva uma vaga; retorna False se não houver vaga dentro do timeout"""
+        now = time.monotonic()
+        deadline = now + timeout
+        ticket = (now + priority * self.aging, next(self._sequence))
+        with self._condition:
+            heapq.heappush(self._waiting, ticket)
+            while self.in_flight >= int(self.limit) or self._waiting[0] != ticket:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._waiting.remove(ticket)
+                    heapq.heapify(self._waiting)
+                    self._condition.notify_all()
+                    return False
+                self._condition.wait(remaining)
+            heapq.heappop(self._waiting)
+            self.in_flight += 1
+            # A próxima da fila pode caber em uma vaga que ainda sobra
+            self._condition.notify_all()
+            return True
+    
+    def release(self):
+        with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+    
+    def on_success(self, latency):
+        with self._condition:
+            if latency > self.latency_target:
+                self._decrease()
+            else:
+                self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+                self._condition.notify_all()
+    
+    def on_failure(self):
+        with self._condition:
+            self._decrease()
+    
+    def _decrease(self):
+        now = time.monotonic()
+        if now - self._last_decrease >= self.decrease_interval:
+            self.limit = max(self.min_limit, self.limit * self.decrease)
+            self._last_decrease = now
+    
+    def get_stats(self):
+        with self._condition:
+            return {"limit": round(self.limit, 2), "in_flight": self.in_flight, "queued": len(self._waiting),
+                    "max_limit": self.max_limit}
+
+class CircuitBreaker:
+    """Circuit breaker por falhas consecutivas.
+    
+    Após `failure_threshold` falhas seguidas o circuito abre e as chamadas
+    são recusadas por `reset_timeout` segundos; depois uma única chamada de
+    teste é liberada (half_open): se der certo o circuito fecha, se falhar
+    volta a abrir.
+    """
+    
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = 0.0
+        self.opens = 0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+    
+    def allow(self):
+        """Se a chamada pode ser feita agora"""
+        with self._lock:
+            if self.state == 'open' and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = 'half_open'
+                self._probe_in_flight = False
+            if self.state == 'closed':
+                return True
+            if self.state == 'half_open' and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+    
+    def record_success(self):
+        with self._lock:
+            self.state = 'closed'
+            self.failures = 0
+            self._probe_in_flight = False
+    
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == 'half_open' or self.failures >= self.failure_threshold:
+                if self.state != 'open':
+                    self.opens += 1
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+                self._probe_in_flight = False
+    
+    def release_probe(self):
+        """Devolve a chamada de teste que não chegou a ser feita"""
+        with self._lock:
+            self._probe_in_flight = False
+
+class LLMGuard:
+    """Protege as chamadas ao LLM: limite adaptativo com fila por prioridade, timeout e circuit breaker.
+    
+    A chamada roda em um pool próprio para poder ser abandonada no timeout;
+    a vaga no limitador só é devolvida quando ela realmente termina, então
+    chamadas presas no provedor continuam contando como em andamento.
+    Quando a chamada não pode ser feita ou não termina a tempo, levanta
+    LLMUnavailable para o agente usar uma resposta alternativa.
+    """
+    
+    def __init__(self, timeout=15.0, queue_timeout=2.0, limiter=None, breaker=None):
+        self.timeout = timeout
+        self.queue_timeout = queue_timeout
+        self.limiter = limiter or AdaptiveLimiter(latency_target=timeout / 2)
+        self.breaker = breaker or CircuitBreaker()
+        self._executor = ThreadPoolExecutor(max_workers=self.limiter.max_limit, thread_name_prefix='llm')
+        self._lock = threading.Lock()
+        
+        self.calls = 0
+        self.rejected = {"circuit_open": 0, "overloaded": 0}
+        self.timeouts = 0
+        self.errors = 0
+        self.latency = RollingStats()
+        self.queue_wait = {}
+    
+    def call(self, function, *args, priority=0, priority_class='default'):
+        """Resultado de function(*args) (a chamada ao LLM), ou LLMUnavailable.
+        
+        Com o limite cheio, as chamadas esperam na fila por `priority` (0 é a
+        mais urgente); o tempo de espera é medido por `priority_class`.
+        """
+        if not self.breaker.allow():
+            self._count_rejected("circuit_open")
+            raise LLMUnavailable("circuit_open")
+        queued_at = time.perf_counter()
+        acquired = self.limiter.acquire(self.queue_timeout, priority)
+        self._record_wait(priority_class, time.perf_counter() - queued_at)
+        if not acquired:
+            self.breaker.release_probe()
+            self._count_rejected("overloaded")
+            raise LLMUnavailable("overloaded")
+        
+        start = time.perf_counter()
+        try:
+            future = self._executor.submit(function, *args)
+        except Exception:
+            self.limiter.release()
+            raise
+        future.add_done_callback(lambda _: self.limiter.release())
+        
+        try:
+            result = future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            self._record_failure("timeouts")
+            raise LLMUnavailable("timeout", f"sem resposta em {self.timeout:g}s")
+        except Exception as e:
+            self._record_failure("errors")
+            raise LLMUnavailable("error", str(e))
+        
+        elapsed = time.perf_counter() - start
+        self.latency.add(elapsed)
+        self.limiter.on_success(elapsed)
+        self.breaker.record_success()
+        with self._lock:
+            self.calls += 1
+        return result
+    
+    def _record_wait(self, priority_class, seconds):
+        with self._lock:
+            rolling = self.queue_wait.get(priority_class)
+            if rolling is None:
+                rolling = self.queue_wait[priority_class] = RollingStats()
+        rolling.add(seconds)
+    
+    def _count_rejected(self, reason):
+        with self._lock:
+            self.rejected[reason] += 1
+    
+    def _record_failure(self, counter):
+        self.limiter.on_failure()
+        self.breaker.record_failure()
+        with self._lock:
+            self.calls += 1
+            setattr(self, counter, getattr(self, counter) + 1)
+    
+    def get_stats(self):
+        """Limite atual, chamadas em andamento, estado do circuito e falhas"""
+        with self._lock:
+            stats = {
+                "calls": self.calls,
+                "rejected": dict(self.rejected),
+                "timeouts": self.timeouts,
+                "errors": self.errors
+            }
+            queue_wait = dict(self.queue_wait)
+        stats.update(self.limiter.get_stats())
+        stats["breaker"] = {"state": self.breaker.state, "consecutive_failures": self.breaker.failures,
+                            "opens": self.breaker.opens}
+        stats["latency_ms"] = self.latency.summary(scale=1000)
+        stats["queue_wait_ms"] = {name: rolling.summary(scale=1000) for name, rolling in queue_wait.items()}
+        return stats
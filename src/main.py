@@ -1,4 +1,5 @@
 from flask import Flask, request, jsonify
+import hmac
 import sys
 import os
 
@@ -6,144 +7,89 @@ import os
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from whatsapp_webhook import app as webhook_app
+from whatsapp_webhook import whatsapp_client, make_agent_handler
 from ai_agent import SalonAIAgent
-from config.config import WA_BUSINESS_API_TOKEN, WA_BUSINESS_API_PHONE_ID, WA_BUSINESS_API_VERIFY_TOKEN
-import requests
-import json
+from config.config import DEDUP_BACKEND, DEDUP_TTL_SECONDS, DEDUP_MAX_ENTRIES, CATALOG_ADMIN_TOKEN
+from message_deduplicator import MessageDeduplicator
 
 # Inicializa o agente de IA
 ai_agent = SalonAIAgent()
 
-def send_whatsapp_message(phone_number, message_text):
-    """Envia mensagem via WhatsApp Business API"""
-    try:
-        url = f"https://graph.facebook.com/v18.0/{WA_BUSINESS_API_PHONE_ID}/messages"
-        
-        headers = {
-            "Authorization": f"Bearer {WA_BUSINESS_API_TOKEN}",
-            "Content-Type": "application/json"
-        }
-        
-        payload = {
-            "messaging_product": "whatsapp",
-            "to": phone_number,
-            "type": "text",
-            "text": {
-                "body": message_text
-            }
-        }
-        
-        response = requests.post(url, headers=headers, json=payload)
-        
-        if response.status_code == 200:
-            print(f"Mensagem enviada com sucesso para {phone_number}")
-            return True
-        else:
-            print(f"Erro ao enviar mensagem: {response.status_code} - {response.text}")
-            return False
-    
-    except Exception as e:
-        print(f"Erro ao enviar mensagem WhatsApp: {str(e)}")
-        return False
-
-def send_whatsapp_buttons(phone_number, body_text, buttons):
-    """Envia mensagem com botões interativos"""
-    try:
-        url = f"https://graph.facebook.com/v18.0/{WA_BUSINESS_API_PHONE_ID}/messages"
-        
-        headers = {
-            "Authorization": f"Bearer {WA_BUSINESS_API_TOKEN}",
-            "Content-Type": "application/json"
-        }
-        
-        payload = {
-            "messaging_product": "whatsapp",
-            "to": phone_number,
-            "type": "interactive",
-            "interactive": {
-                "type": "button",
-                "body": {
-                    "text": body_text
-                },
-                "action": {
-                    "buttons": buttons
-                }
-            }
-        }
-        
-        response = requests.post(url, headers=headers, json=payload)
-        
-        if response.status_code == 200:
-            print(f"Mensagem com botões enviada com sucesso para {phone_number}")
-            return True
-        else:
-            print(f"Erro ao enviar mensagem com botões: {response.status_code} - {response.text}")
-            return False
-    
-    except Exception as e:
-        print(f"Erro ao enviar mensagem com botões: {str(e)}")
-        return False
+# Substitui a função process_message do webhook para usar o agente de IA
+import whatsapp_webhook
+whatsapp_webhook.process_message = make_agent_handler(ai_agent)
 
-# Sobrescreve a função process_message do webhook para usar o agente de IA
-def process_message_with_ai(message, value):
-    """Processa uma mensagem individual do WhatsApp usando IA"""
-    try:
-        # Extrai informações da mensagem
-        phone_number = message['from']
-        message_type = message['type']
-        
-        if message_type == 'text':
-            text_content = message['text']['body']
-            print(f"Mensagem de texto de {phone_number}: {text_content}")
-            
-            # Usa o agente de IA para gerar resposta
-            ai_response = ai_agent.process_message(phone_number, text_content)
-            
-            # Envia resposta
-            if ai_response.get('buttons'):
-                send_whatsapp_buttons(phone_number, ai_response['message'], ai_response['buttons'])
-            else:
-                send_whatsapp_message(phone_number, ai_response['message'])
-        
-        elif message_type == 'interactive':
-            # Processa mensagens interativas (botões, listas)
-            interactive_data = message['interactive']
-            print(f"Mensagem interativa de {phone_number}: {interactive_data}")
-            
-            # Extrai a seleção do usuário
-            if interactive_data['type'] == 'button_reply':
-                button_id = interactive_data['button_reply']['id']
-                button_title = interactive_data['button_reply']['title']
-                
-                # Processa a seleção como uma mensagem de texto
-                user_selection = f"Selecionei: {button_title}"
-                ai_response = ai_agent.process_message(phone_number, user_selection)
-                
-                # Envia resposta
-                if ai_response.get('buttons'):
-                    send_whatsapp_buttons(phone_number, ai_response['message'], ai_response['buttons'])
-                else:
-                    send_whatsapp_message(phone_number, ai_response['message'])
-    
-    except Exception as e:
-        print(f"Erro ao processar mensagem individual: {str(e)}")
-        # Envia mensagem de erro para o usuário
-        send_whatsapp_message(phone_number, "Desculpe, ocorreu um erro. Tente novamente em alguns instantes.")
+# Dedup compartilhado entre workers via put condicional no DynamoDB
+if DEDUP_BACKEND == 'dynamodb':
+    whatsapp_webhook.deduplicator = MessageDeduplicator(
+        max_entries=DEDUP_MAX_ENTRIES,
+        ttl_seconds=DEDUP_TTL_SECONDS,
+        db_service=ai_agent.db_service
+    )
 
-# Substitui a função original do webhook
-import whatsapp_webhook
-whatsapp_webhook.process_message = process_message_with_ai
+whatsapp_webhook.start_spool_workers()
+whatsapp_webhook.start_outbox_workers()
 
 # Adiciona rota de status
 @webhook_app.route('/status', methods=['GET'])
 def status():
     """Endpoint para verificar o status do serviço"""
+    # Esquema conferido na primeira chamada; reaproveitado se estiver ok, refeito após TABLE_CHECK_RETRY_SECONDS se não
+    tables_ok, table_problems = ai_agent.db_service.verify_tables()
     return jsonify({
         "status": "online",
         "service": "WhatsApp Salon Agent",
-        "version": "1.0.0"
+        "version": "1.0.0",
+        "tables": {"ok": tables_ok, "problems": table_problems}
     })
 
+# Adiciona rota de métricas
+@webhook_app.route('/metrics', methods=['GET'])
+def metrics():
+    """Endpoint com métricas internas do serviço"""
+    data = {
+        "ingress": whatsapp_webhook.get_ingress_stats(),
+        "dispatcher": whatsapp_webhook.dispatcher.get_stats(),
+        "dedup": whatsapp_webhook.deduplicator.get_stats(),
+        "coalescer": whatsapp_webhook.coalescer.get_stats(),
+        "outbound": whatsapp_client.rate_limiter.get_stats(),
+        "replies": ai_agent.get_reply_stats(),
+        "intents": ai_agent.get_intent_stats(),
+        "prompt": ai_agent.prompt_builder.get_stats(),
+        "llm": ai_agent.get_llm_stats(),
+        "llm_output": ai_agent.response_parser.get_stats(),
+        "history": ai_agent.conversation_history.get_stats(),
+        "turns": ai_agent.get_turn_stats(),
+        "catalog": ai_agent.service_catalog.get_stats(),
+        "dynamodb": ai_agent.get_db_stats()
+    }
+    if ai_agent.response_cache is not None:
+        data["response_cache"] = ai_agent.response_cache.get_stats()
+    if ai_agent.similarity_index is not None:
+        data["similarity"] = ai_agent.similarity_index.get_stats()
+    if whatsapp_webhook.message_spool is not None:
+        data["spool"] = whatsapp_webhook.message_spool.get_stats()
+    if whatsapp_webhook.outbox_drainer is not None:
+        data["outbox"] = whatsapp_webhook.outbox_drainer.get_stats()
+    
+    return jsonify(data)
+
+# Adiciona rota para recarregar o catálogo após mudanças de preço/serviço
+@webhook_app.route('/catalog/invalidate', methods=['POST'])
+def invalidate_catalog():
+    """Descarta o catálogo de serviços em memória deste processo.
+    
+    Exige o cabeçalho X-Admin-Token igual a CATALOG_ADMIN_TOKEN (sem o
+    segredo configurado a rota fica desativada). Só afeta o processo que
+    recebeu a chamada; com vários workers os demais esperam o TTL.
+    """
+    token = request.headers.get('X-Admin-Token', '')
+    if not CATALOG_ADMIN_TOKEN or not hmac.compare_digest(token, CATALOG_ADMIN_TOKEN):
+        return jsonify({"success": False, "error": "Não autorizado"}), 403
+    
+    ai_agent.service_catalog.invalidate()
+    return jsonify({"success": True, "scope": "process", "pid": os.getpid()})
+
 # Adiciona rota para testar o agente
 @webhook_app.route('/test', methods=['POST'])
 def test_agent():
@@ -153,7 +99,10 @@ def test_agent():
         phone_number = data.get('phone_number', '5511999999999')
         message = data.get('message', 'Olá')
         
-        response = ai_agent.process_message(phone_number, message)
+        # Passa pelo dispatcher para não concorrer com o webhook na mesma conversa
+        response = whatsapp_webhook.dispatcher.submit(
+            phone_number, ai_agent.process_message, phone_number, message
+        ).result()
         
         return jsonify({
             "success": True,
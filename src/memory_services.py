@@ -0,0 +1,178 @@
+"""Versões em memória do DynamoDBService e do GoogleCalendarService.
+
+Implementam os métodos usados pelo agente com os mesmos retornos
+((success, valor), listas de horários) para rodar o SalonAIAgent inteiro
+em benchmarks e testes de carga, sem AWS nem conta Google. `latency_ms`
+simula o tempo de ida e volta de cada chamada.
+"""
+import copy
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from dynamodb_service import DEFAULT_SERVICES
+
+class MemoryDynamoDBService:
+    """Tabelas do agente (clientes, serviços, agendamentos, conversas) em dicts"""
+    
+    def __init__(self, services=None, latency_ms=0):
+        self.latency_ms = latency_ms
+        self._lock = threading.Lock()
+        self.services = {service['service_id']: dict(service) for service in (services or DEFAULT_SERVICES)}
+        self.clients = {}
+        self.appointments = {}
+        self.conversations = {}
+        self.processed_messages = {}
+        self.calls = 0
+    
+    def save_client(self, phone_number, name=None, email=None, preferences=None):
+        self._call()
+        item = {'phone_number': phone_number, 'updated_at': datetime.now().isoformat()}
+        if name:
+            item['name'] = name
+        if email:
+            item['email'] = email
+        if preferences:
+            item['preferences'] = preferences
+        with self._lock:
+            self.clients[phone_number] = item
+        return True, "Cliente salvo com sucesso"
+    
+    def get_client(self, phone_number):
+        self._call()
+        with self._lock:
+            client = self.clients.get(phone_number)
+        if client is None:
+            return False, "Cliente não encontrado"
+        return True, dict(client)
+    
+    def create_appointment(self, phone_number, service_id, appointment_date, appointment_time, client_name=None,
+                           service=None):
+        self._call()
+        service = service or self.services.get(service_id)
+        if service is None:
+            return False, "Serviço não encontrado"
+        
+        appointment_id = str(uuid.uuid4())
+        item = {
+            'appointment_id': appointment_id,
+            'phone_number': phone_number,
+            'service_id': service_id,
+            'service_name': service['name'],
+            'appointment_date': appointment_date,
+            'appointment_time': appointment_time,
+            'duration_minutes': service['duration_minutes'],
+            'price': service['price'],
+            'status': 'scheduled',
+            'created_at': datetime.now().isoformat()
+        }
+        if client_name:
+            item['client_name'] = client_name
+        with self._lock:
+            self.appointments[appointment_id] = item
+        return True, appointment_id
+    
+    def get_appointments_by_phone(self, phone_number):
+        return True, list(self.iter_appointments_by_phone(phone_number))
+    
+    def iter_appointments_by_phone(self, phone_number, from_date=None, status=None, projection=None, page_size=None):
+        self._call()
+        with self._lock:
+            items = [
+                item for item in self.appointments.values()
+                if item['phone_number'] == phone_number
+                and (from_date is None or item['appointment_date'] >= from_date)
+                and (status is None or item['status'] == status)
+            ]
+        items.sort(key=lambda item: item['appointment_date'])
+        for item in items:
+            yield {k: item[k] for k in projection if k in item} if projection else dict(item)
+    
+    def get_all_services(self):
+        self._call()
+        with self._lock:
+            return True, [dict(service) for service in self.services.values()]
+    
+    def get_service(self, service_id):
+        self._call()
+        with self._lock:
+            service = self.services.get(service_id)
+        if service is None:
+            return False, "Serviço não encontrado"
+        return True, dict(service)
+    
+    def register_message_id(self, message_id, expires_at):
+        self._call()
+        with self._lock:
+            if message_id in self.processed_messages:
+                return True, False
+            self.processed_messages[message_id] = expires_at
+        return True, True
+    
+    def unregister_message_id(self, message_id):
+        self._call()
+        with self._lock:
+            self.processed_messages.pop(message_id, None)
+        return True, "Registro removido"
+    
+    def save_conversation_context(self, phone_number, context):
+        self._call()
+        with self._lock:
+            self.conversations[phone_number] = copy.deepcopy(context)
+        return True, "Contexto salvo com sucesso"
+    
+    def get_conversation_context(self, phone_number):
+        self._call()
+        with self._lock:
+            context = self.conversations.get(phone_number)
+        if context is None:
+            return False, {}
+        return True, copy.deepcopy(context)
+    
+    def _call(self):
+        with self._lock:
+            self.calls += 1
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000.0)
+
+class MemoryCalendarService:
+    """Agenda em memória com a mesma grade de horários do GoogleCalendarService"""
+    
+    def __init__(self, latency_ms=0):
+        self.latency_ms = latency_ms
+        self._lock = threading.Lock()
+        self.events = []
+    
+    def get_available_slots(self, date, duration_minutes=60, start_hour=9, end_hour=18, calendar_id='primary'):
+        self._call()
+        start_of_day = datetime.combine(date, datetime.min.time().replace(hour=start_hour))
+        end_of_day = datetime.combine(date, datetime.min.time().replace(hour=end_hour))
+        with self._lock:
+            busy_times = [(event['start'], event['end']) for event in self.events
+                          if event['start'] < end_of_day and event['end'] > start_of_day]
+        
+        available_slots = []
+        current_time = start_of_day
+        slot_duration = timedelta(minutes=duration_minutes)
+        while current_time + slot_duration <= end_of_day:
+            slot_end = current_time + slot_duration
+            if all(current_time >= busy_end or slot_end <= busy_start for busy_start, busy_end in busy_times):
+                available_slots.append({
+                    'start': current_time,
+                    'end': slot_end,
+                    'formatted': f"{current_time.strftime('%H:%M')} - {slot_end.strftime('%H:%M')}"
+                })
+            current_time += timedelta(minutes=30)
+        return available_slots
+    
+    def create_appointment(self, summary, start_time, end_time, description="", calendar_id='primary'):
+        self._call()
+        event = {'id': str(uuid.uuid4()), 'summary': summary, 'start': start_time, 'end': end_time,
+                 'description': description}
+        with self._lock:
+            self.events.append(event)
+        return True, event
+    
+    def _call(self):
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000.0)
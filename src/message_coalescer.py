@@ -0,0 +1,140 @@
+import heapq
+import threading
+import time
+from concurrent.futures import Future
+
+class _Burst:
+    """Mensagens de texto de um telefone aguardando o fim da janela"""
+    
+    def __init__(self, now):
+        self.messages = []
+        self.value = None
+        self.first_at = now
+        self.deadline = now
+        self.future = Future()
+
+class MessageCoalescer:
+    """Agrupa mensagens de texto consecutivas do mesmo telefone.
+    
+    Mensagens que chegam dentro de `window_ms` umas das outras são unidas em
+    uma única mensagem (uma linha por mensagem original) e entregues a
+    `submit(message, value)`, que deve retornar um Future. A janela é
+    deslizante, limitada a `max_wait_ms` desde a primeira mensagem; uma
+    mensagem isolada espera no máximo `window_ms`.
+    """
+    
+    def __init__(self, submit, window_ms=0, max_wait_ms=None):
+        self._submit = submit
+        self.window = window_ms / 1000.0
+        self.max_wait = (max_wait_ms if max_wait_ms is not None else window_ms * 3) / 1000.0
+        
+        self._lock = threading.Condition()
+        self._bursts = {}
+        self._deadlines = []
+        self._thread = None
+        
+        self.flushed_turns = 0
+        self.coalesced_messages = 0
+    
+    @property
+    def enabled(self):
+        return self.window > 0
+    
+    def add(self, message, value):
+        """Adiciona uma mensagem de texto; retorna o Future do turno agrupado"""
+        if not self.enabled:
+            return self._submit(message, value)
+        
+        phone_number = message.get('from')
+        now = time.monotonic()
+        
+        with self._lock:
+            burst = self._bursts.get(phone_number)
+            if burst is None:
+                burst = _Burst(now)
+                self._bursts[phone_number] = burst
+            
+            burst.messages.append(message)
+            burst.value = value
+            burst.deadline = min(now + self.window, burst.first_at + self.max_wait)
+            
+            heapq.heappush(self._deadlines, (burst.deadline, phone_number, id(burst)))
+            self._ensure_thread()
+            self._lock.notify()
+            
+            return burst.future
+    
+    def flush(self, phone_number):
+        """Despacha imediatamente o grupo pendente de um telefone, se houver"""
+        with self._lock:
+            burst = self._bursts.pop(phone_number, None)
+        if burst is not None:
+            self._dispatch(burst)
+    
+    def _ensure_thread(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='message-coalescer', daemon=True)
+            self._thread.start()
+    
+    def _run(self):
+        while True:
+            ready = []
+            with self._lock:
+                while not self._deadlines:
+                    self._lock.wait()
+                
+                now = time.monotonic()
+                while self._deadlines and self._deadlines[0][0] <= now:
+                    deadline, phone_number, burst_id = heapq.heappop(self._deadlines)
+                    burst = self._bursts.get(phone_number)
+                    # Entradas antigas (janela estendida ou já despachada) são ignoradas
+                    if burst is not None and id(burst) == burst_id and burst.deadline == deadline:
+                        ready.append(self._bursts.pop(phone_number))
+                
+                if not ready:
+                    self._lock.wait(self._deadlines[0][0] - now)
+                    continue
+            
+            for burst in ready:
+                self._dispatch(burst)
+    
+    def _dispatch(self, burst):
+        message = merge_text_messages(burst.messages)
+        
+        with self._lock:
+            self.flushed_turns += 1
+            self.coalesced_messages += len(burst.messages)
+        
+        try:
+            inner = self._submit(message, burst.value)
+        except Exception as e:
+            burst.future.set_exception(e)
+            return
+        inner.add_done_callback(lambda f: _copy_future_result(f, burst.future))
+    
+    def get_stats(self):
+        """Métricas do agrupamento"""
+        with self._lock:
+            return {
+                "window_ms": int(self.window * 1000),
+                "pending_phones": len(self._bursts),
+                "turns": self.flushed_turns,
+                "messages": self.coalesced_messages,
+                "messages_saved": self.coalesced_messages - self.flushed_turns
+            }
+
+def merge_text_messages(messages):
+    """Une mensagens de texto em uma só, preservando os dados da última"""
+    if len(messages) == 1:
+        return messages[0]
+    
+    merged = dict(messages[-1])
+    merged['text'] = {'body': "\n".join(m.get('text', {}).get('body', '') for m in messages)}
+    merged['coalesced_ids'] = [m.get('id') for m in messages]
+    return merged
+
+def _copy_future_result(source, target):
+    if source.exception() is not None:
+        target.set_exception(source.exception())
+    else:
+        target.set_result(source.result())
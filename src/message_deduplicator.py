@@ -0,0 +1,101 @@
+import threading
+import time
+from collections import OrderedDict
+
+class MessageDeduplicator:
+    """Descarta reentregas do webhook pelo id da mensagem do WhatsApp.
+    
+    Mantém um conjunto em memória, limitado em tamanho e com expiração (TTL).
+    Se `db_service` for informado, também registra os ids no DynamoDB com um
+    put condicional, para que vários workers compartilhem o dedup.
+    """
+    
+    def __init__(self, max_entries=50000, ttl_seconds=86400, db_service=None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.db_service = db_service
+        
+        # message_id -> instante de expiração (ordem de inserção = ordem de expiração)
+        self._seen = OrderedDict()
+        self._lock = threading.Lock()
+        
+        self.hits = 0
+        self.misses = 0
+        self.backend_errors = 0
+    
+    def is_duplicate(self, message_id):
+        """Retorna True se a mensagem já foi recebida; senão a registra"""
+        if not message_id:
+            return False
+        
+        now = time.time()
+        with self._lock:
+            self._evict_expired(now)
+            if message_id in self._seen:
+                self.hits += 1
+                return True
+            
+            if self.db_service is None:
+                self._remember(message_id, now)
+                self.misses += 1
+                return False
+        
+        # Modo compartilhado: o put condicional decide quem viu primeiro
+        success, is_new = self.db_service.register_message_id(message_id, int(now + self.ttl_seconds))
+        with self._lock:
+            self._remember(message_id, now)
+            if not success:
+                # Em caso de erro no DynamoDB, processa a mensagem (fail-open)
+                self.backend_errors += 1
+                self.misses += 1
+                return False
+            if is_new:
+                self.misses += 1
+                return False
+            self.hits += 1
+            return True
+    
+    def forget(self, message_id):
+        """Remove o registro de uma mensagem que não chegou a ser processada.
+        
+        Usado quando o webhook falha depois de registrar o id: a reentrega do
+        WhatsApp precisa ser aceita, senão a mensagem se perde.
+        """
+        if not message_id:
+            return
+        
+        with self._lock:
+            self._seen.pop(message_id, None)
+        
+        if self.db_service is not None:
+            success, message = self.db_service.unregister_message_id(message_id)
+            if not success:
+                with self._lock:
+                    self.backend_errors += 1
+                print(f"Erro ao remover registro da mensagem {message_id}: {message}")
+    
+    def _remember(self, message_id, now):
+        self._seen[message_id] = now + self.ttl_seconds
+        self._seen.move_to_end(message_id)
+        while len(self._seen) > self.max_entries:
+            self._seen.popitem(last=False)
+    
+    def _evict_expired(self, now):
+        while self._seen:
+            message_id, expires_at = next(iter(self._seen.items()))
+            if expires_at > now:
+                break
+            self._seen.popitem(last=False)
+    
+    def get_stats(self):
+        """Contadores de duplicadas (hits) e mensagens novas (misses)"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "backend": "dynamodb" if self.db_service is not None else "memory",
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "backend_errors": self.backend_errors,
+                "entries": len(self._seen)
+            }
@@ -0,0 +1,158 @@
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from sqlite_journal import JournalQueue, JournalDrainer
+
+class MessageSpool(JournalQueue):
+    """Fila local persistente (SQLite) para mensagens recebidas pelo webhook.
+    
+    O webhook apenas grava as mensagens aqui e responde 200; os workers
+    consomem a fila depois. Mensagens que estavam em processamento quando o
+    processo caiu voltam para a fila na próxima inicialização. Mensagens
+    processadas saem do spool no ack; as descartadas ('dead') ficam por
+    `retention_seconds` para análise.
+    """
+    
+    name = 'spool'
+    table = 'spool'
+    statuses = ('pending', 'processing', 'dead')
+    recover_sql = "UPDATE spool SET status = 'pending', claimed_at = NULL WHERE status = 'processing'"
+    # claimed_at da última tentativa, que levou a mensagem para 'dead'
+    purge_sql = "DELETE FROM spool WHERE status = 'dead' AND claimed_at < ?"
+    
+    def __init__(self, db_path, max_attempts=3, retention_seconds=86400):
+        self.max_attempts = max_attempts
+        super().__init__(db_path, retention_seconds)
+    
+    def create_schema(self):
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS spool (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                message TEXT NOT NULL,
+                value TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                last_error TEXT,
+                created_at REAL NOT NULL,
+                claimed_at REAL
+            )
+            """
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS spool_status_id ON spool (status, id)')
+    
+    def append(self, message, value):
+        """Grava uma mensagem no spool e retorna seu id"""
+        return self.append_many([(message, value)])[0]
+    
+    def append_many(self, items):
+        """Grava várias mensagens em uma única transação (um único fsync)"""
+        now = time.time()
+        ids = []
+        with self._available:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                for message, value in items:
+                    cursor = self._conn.execute(
+                        'INSERT INTO spool (message, value, created_at) VALUES (?, ?, ?)',
+                        (json.dumps(message, ensure_ascii=False), json.dumps(value, ensure_ascii=False), now)
+                    )
+                    ids.append(cursor.lastrowid)
+                self._conn.execute('COMMIT')
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+            self._signal()
+        return ids
+    
+    def claim(self, limit):
+        """Reserva até `limit` mensagens pendentes, na ordem de chegada"""
+        if limit <= 0:
+            return []
+        
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                rows = self._conn.execute(
+                    "SELECT id, message, value FROM spool WHERE status = 'pending' ORDER BY id LIMIT ?",
+                    (limit,)
+                ).fetchall()
+                if rows:
+                    self._conn.executemany(
+                        "UPDATE spool SET status = 'processing', claimed_at = ? WHERE id = ?",
+                        [(time.time(), row[0]) for row in rows]
+                    )
+                self._conn.execute('COMMIT')
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+        
+        return [(row[0], json.loads(row[1]), json.loads(row[2])) for row in rows]
+    
+    def ack(self, spool_id):
+        """Remove uma mensagem processada com sucesso"""
+        with self._lock:
+            self._conn.execute('DELETE FROM spool WHERE id = ?', (spool_id,))
+    
+    def release(self, spool_id, error=None):
+        """Devolve uma mensagem que falhou para a fila (ou marca como 'dead'); retorna o novo status"""
+        with self._available:
+            self._conn.execute(
+                """
+                UPDATE spool
+                SET attempts = attempts + 1,
+                    last_error = ?,
+                    status = CASE WHEN attempts + 1 >= ? THEN 'dead' ELSE 'pending' END
+                WHERE id = ?
+                """,
+                (error, self.max_attempts, spool_id)
+            )
+            row = self._conn.execute('SELECT status FROM spool WHERE id = ?', (spool_id,)).fetchone()
+            self._signal()
+        return row[0] if row else None
+
+class SpoolDrainer(JournalDrainer):
+    """Consome o spool e entrega as mensagens a um pool de workers.
+    
+    `submit(message, value)` deve retornar um Future; a mensagem só é removida
+    do spool quando o Future termina sem erro. Um erro devolve a mensagem à
+    fila até `max_attempts`; quando ela vai para 'dead', `on_dead(message,
+    value, erro)` é chamado (ex.: para avisar o cliente).
+    """
+    
+    def __init__(self, spool, submit=None, handler=None, num_workers=4, max_in_flight=None, poll_interval=1.0,
+                 on_dead=None):
+        super().__init__(spool, max_in_flight or num_workers * 2, poll_interval)
+        self.spool = spool
+        self.on_dead = on_dead
+        
+        if submit is None:
+            self._executor = ThreadPoolExecutor(max_workers=num_workers, thread_name_prefix='spool-worker')
+            submit = lambda message, value: self._executor.submit(handler, message, value)
+        self._submit = submit
+    
+    def dispatch(self, entry):
+        try:
+            future = self._submit(entry[1], entry[2])
+        except Exception as e:
+            self._finish(entry, e)
+            return
+        future.add_done_callback(lambda f: self._finish(entry, f.exception()))
+    
+    def _finish(self, entry, error):
+        spool_id, message, value = entry
+        try:
+            if error is None:
+                self.spool.ack(spool_id)
+                return
+            
+            print(f"Erro ao processar mensagem do spool {spool_id}: {str(error)}")
+            status = self.spool.release(spool_id, str(error))
+            if status == 'dead':
+                print(f"Mensagem do spool {spool_id} descartada após {self.spool.max_attempts} tentativas")
+                if self.on_dead is not None:
+                    self.on_dead(message, value, error)
+        except Exception as e:
+            print(f"Erro ao finalizar mensagem do spool {spool_id}: {str(e)}")
+        finally:
+            self.release_slot()
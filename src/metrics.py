@@ -0,0 +1,39 @@
+import threading
+from collections import deque
+
+class RollingStats:
+    """Estatísticas de uma amostra recente de valores (latências, tamanhos...)"""
+    
+    def __init__(self, window=1000):
+        self._values = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+    
+    def add(self, value):
+        with self._lock:
+            self._values.append(value)
+            self.count += 1
+            self.total += value
+            self.max = max(self.max, value)
+    
+    def summary(self, scale=1.0, digits=2):
+        """Resumo com média geral e percentis da janela recente"""
+        with self._lock:
+            values = sorted(self._values)
+            count, total, maximum = self.count, self.total, self.max
+        return {
+            "count": count,
+            "avg": round(total / count * scale, digits) if count else 0.0,
+            "p50": round(percentile(values, 50) * scale, digits),
+            "p95": round(percentile(values, 95) * scale, digits),
+            "max": round(maximum * scale, digits)
+        }
+
+def percentile(sorted_values, pct):
+    """Percentil (nearest-rank) de uma lista já ordenada"""
+    if not sorted_values:
+        return 0.0
+    index = max(0, int(round(pct / 100.0 * len(sorted_values))) - 1)
+    return sorted_values[min(index, len(sorted_values) - 1)]
@@ -0,0 +1,257 @@
+import json
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from sqlite_journal import JournalQueue, JournalDrainer
+from metrics import RollingStats
+from rate_limiter import RateLimitDeferred
+
+class Outbox(JournalQueue):
+    """Fila local persistente (SQLite) para as mensagens enviadas ao cliente.
+    
+    A resposta é gravada aqui antes de qualquer chamada à Graph API; o envio
+    é feito depois pelo OutboxDrainer, com novas tentativas espaçadas até a
+    mensagem ser entregue ou ir para 'dead'. Envios com resultado
+    desconhecido (timeout de leitura) vão para 'unknown' e não são repetidos,
+    para o cliente não receber a mesma resposta duas vezes. Mensagens de um mesmo telefone
+    saem uma de cada vez e na ordem em que foram gravadas.
+    """
+    
+    name = 'outbox'
+    table = 'outbox'
+    statuses = ('pending', 'sending', 'delivered', 'unknown', 'dead')
+    recover_sql = "UPDATE outbox SET status = 'pending' WHERE status = 'sending'"
+    # Finalizadas: entregues, desconhecidas (sent_at) e descartadas (última tentativa agendada)
+    purge_sql = (
+        "DELETE FROM outbox WHERE status IN ('delivered', 'unknown', 'dead') "
+        "AND COALESCE(sent_at, next_attempt_at) < ?"
+    )
+    
+    def __init__(self, db_path, max_attempts=8, retry_base=2.0, retry_max=300.0, retention_seconds=86400):
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        super().__init__(db_path, retention_seconds)
+    
+    def create_schema(self):
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                phone_number TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL NOT NULL,
+                last_error TEXT,
+                wa_message_id TEXT,
+                created_at REAL NOT NULL,
+                sent_at REAL
+            )
+            """
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS outbox_status_id ON outbox (status, id)')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS outbox_phone_status ON outbox (phone_number, status, id)')
+    
+    def enqueue(self, phone_number, payload):
+        """Grava uma mensagem a enviar e retorna seu id"""
+        now = time.time()
+        with self._available:
+            cursor = self._conn.execute(
+                'INSERT INTO outbox (phone_number, payload, next_attempt_at, created_at) VALUES (?, ?, ?, ?)',
+                (phone_number, json.dumps(payload, ensure_ascii=False), now, now)
+            )
+            self._signal()
+        return cursor.lastrowid
+    
+    def claim(self, limit):
+        """Reserva até `limit` mensagens prontas para envio.
+        
+        Só a mensagem mais antiga ainda não entregue de cada telefone é
+        elegível, assim uma resposta nunca ultrapassa outra que está em
+        envio ou aguardando nova tentativa.
+        """
+        if limit <= 0:
+            return []
+        
+        now = time.time()
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                rows = self._conn.execute(
+                    """
+                    SELECT id, phone_number, payload, created_at FROM outbox AS o
+                    WHERE status = 'pending' AND next_attempt_at <= ?
+                      AND id = (
+                          SELECT MIN(id) FROM outbox
+                          WHERE phone_number = o.phone_number AND status IN ('pending', 'sending')
+                      )
+                    ORDER BY id LIMIT ?
+                    """,
+                    (now, limit)
+                ).fetchall()
+                if rows:
+                    self._conn.executemany(
+                        "UPDATE outbox SET status = 'sending' WHERE id = ?",
+                        [(row[0],) for row in rows]
+                    )
+                self._conn.execute('COMMIT')
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+        
+        return [(row[0], row[1], json.loads(row[2]), row[3]) for row in rows]
+    
+    def next_attempt_in(self):
+        """Segundos até a próxima mensagem elegível ficar pronta (None se não houver)"""
+        with self._lock:
+            row = self._conn.execute(
+                """
+                SELECT MIN(next_attempt_at) FROM outbox AS o
+                WHERE status = 'pending'
+                  AND id = (
+                      SELECT MIN(id) FROM outbox
+                      WHERE phone_number = o.phone_number AND status IN ('pending', 'sending')
+                  )
+                """
+            ).fetchone()
+        return None if row[0] is None else row[0] - time.time()
+    
+    def mark_delivered(self, outbox_id, wa_message_id=None):
+        """Marca a mensagem como entregue à API (mantida até a limpeza)"""
+        with self._available:
+            self._conn.execute(
+                "UPDATE outbox SET status = 'delivered', wa_message_id = ?, sent_at = ? WHERE id = ?",
+                (wa_message_id, time.time(), outbox_id)
+            )
+            self._signal()
+    
+    def mark_failed(self, outbox_id, error=None):
+        """Agenda nova tentativa com backoff exponencial (ou marca como 'dead').
+        
+        Retorna o novo status da mensagem.
+        """
+        with self._available:
+            attempts = self._conn.execute('SELECT attempts FROM outbox WHERE id = ?', (outbox_id,)).fetchone()[0] + 1
+            status = 'dead' if attempts >= self.max_attempts else 'pending'
+            delay = random.uniform(0.5, 1.0) * min(self.retry_max, self.retry_base * (2 ** (attempts - 1)))
+            self._conn.execute(
+                'UPDATE outbox SET status = ?, attempts = ?, last_error = ?, next_attempt_at = ? WHERE id = ?',
+                (status, attempts, error, time.time() + delay, outbox_id)
+            )
+            self._signal()
+        return status
+    
+    def defer(self, outbox_id, delay):
+        """Devolve a mensagem para 'pending' daqui a `delay` segundos, sem contar tentativa"""
+        with self._available:
+            self._conn.execute(
+                "UPDATE outbox SET status = 'pending', next_attempt_at = ? WHERE id = ?",
+                (time.time() + delay, outbox_id)
+            )
+            self._signal()
+    
+    def mark_unknown(self, outbox_id, error=None):
+        """Marca um envio cujo resultado é desconhecido; não há nova tentativa"""
+        with self._available:
+            self._conn.execute(
+                "UPDATE outbox SET status = 'unknown', attempts = attempts + 1, last_error = ?, sent_at = ? WHERE id = ?",
+                (error, time.time(), outbox_id)
+            )
+            self._signal()
+
+class OutboxDrainer(JournalDrainer):
+    """Envia as mensagens do outbox em paralelo usando o WhatsAppClient.
+    
+    Cada mensagem reservada é enviada por um worker; sucesso marca como
+    'delivered', falha agenda nova tentativa no próprio outbox e timeout de
+    leitura marca como 'unknown'. O worker não espera no limitador de envio:
+    uma mensagem cujo destinatário (ou o número) está no limite volta ao
+    outbox para o momento em que será liberada, e o worker segue com as
+    mensagens de outros clientes.
+    """
+    
+    def __init__(self, outbox, client, num_workers=4, poll_interval=1.0, purge_interval=600):
+        super().__init__(outbox, num_workers, poll_interval, purge_interval)
+        self.outbox = outbox
+        self.client = client
+        
+        self._executor = ThreadPoolExecutor(max_workers=num_workers, thread_name_prefix='outbox-worker')
+        
+        self.delivered = 0
+        self.deferred = 0
+        self.failed_attempts = 0
+        self.unknown = 0
+        self.dead = 0
+        self.delivery_latency = RollingStats()
+    
+    def dispatch(self, entry):
+        self._executor.submit(self._deliver, *entry)
+    
+    def idle_timeout(self):
+        # Acorda quando a próxima mensagem reagendada (ex.: pelo limitador) fica pronta
+        delay = self.outbox.next_attempt_in()
+        if delay is None or delay <= 0:
+            return self.poll_interval
+        return min(self.poll_interval, delay)
+    
+    def _deliver(self, outbox_id, phone_number, payload, created_at):
+        try:
+            try:
+                success, result = self.client.send(payload, block=False)
+            except RateLimitDeferred as e:
+                self.outbox.defer(outbox_id, e.wait)
+                with self._in_flight_lock:
+                    self.deferred += 1
+                return
+            except Exception as e:
+                success, result = False, str(e)
+            
+            if success:
+                self.outbox.mark_delivered(outbox_id, _message_id(result))
+                with self._in_flight_lock:
+                    self.delivered += 1
+                self.delivery_latency.add(time.time() - created_at)
+                return
+            
+            if success is None:
+                # A API pode ter recebido a mensagem; reenviar arriscaria duplicá-la
+                self.outbox.mark_unknown(outbox_id, str(result))
+                with self._in_flight_lock:
+                    self.unknown += 1
+                print(f"Mensagem {outbox_id} para {phone_number} com entrega desconhecida, não será reenviada: {result}")
+                return
+            
+            status = self.outbox.mark_failed(outbox_id, str(result))
+            with self._in_flight_lock:
+                self.failed_attempts += 1
+                if status == 'dead':
+                    self.dead += 1
+            if status == 'dead':
+                print(f"Mensagem {outbox_id} para {phone_number} descartada após {self.outbox.max_attempts} tentativas: {result}")
+        except Exception as e:
+            print(f"Erro no envio da mensagem {outbox_id} do outbox: {str(e)}")
+        finally:
+            self.release_slot()
+    
+    def get_stats(self):
+        """Métricas do outbox: mensagens por status, envios e tempo até a entrega (ms)"""
+        stats = self.outbox.get_stats()
+        with self._in_flight_lock:
+            stats.update({
+                "in_flight": self._in_flight,
+                "delivered_total": self.delivered,
+                "deferred_total": self.deferred,
+                "failed_attempts": self.failed_attempts,
+                "unknown_total": self.unknown,
+                "dead_total": self.dead
+            })
+        stats["delivery_ms"] = self.delivery_latency.summary(scale=1000)
+        return stats
+
+def _message_id(result):
+    """Extrai o id (wamid) da resposta da Graph API, se houver"""
+    try:
+        return result['messages'][0]['id']
+    except (KeyError, IndexError, TypeError):
+        return None
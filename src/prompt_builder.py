@@ -0,0 +1,167 @@
+import json
+import math
+import textwrap
+import threading
+from metrics import RollingStats
+
+# Aproximação para português no Gemini: ~4 caracteres por token
+CHARS_PER_TOKEN = 4
+
+TRUNCATION_MARK = " [...]"
+
+ROLE_LABELS = {'client': "Cliente", 'agent': "Atendente"}
+
+def estimate_tokens(text):
+    """Estimativa de tokens de um texto (sem chamar a API)"""
+    return math.ceil(len(text or '') / CHARS_PER_TOKEN)
+
+def truncate_text(text, max_tokens):
+    """Corta o texto para caber em max_tokens, mantendo o início"""
+    text = text or ''
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    limit = max(0, max_tokens * CHARS_PER_TOKEN - len(TRUNCATION_MARK))
+    return text[:limit].rstrip() + TRUNCATION_MARK
+
+def compact_json(value):
+    """JSON sem espaços (cada caractere conta no orçamento)"""
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':'), default=str)
+
+def fit_data(data, max_tokens, max_value_chars=200):
+    """Serializa os dados da conversa em até max_tokens.
+    
+    Primeiro encurta valores de texto longos; se ainda não couber, remove as
+    chaves maiores e lista os nomes removidos em "_omitted".
+    """
+    text = compact_json(data)
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    
+    shortened = {}
+    for key, value in data.items():
+        text_value = value if isinstance(value, str) else compact_json(value)
+        if len(text_value) > max_value_chars:
+            value = truncate_text(text_value, max_value_chars // CHARS_PER_TOKEN)
+        shortened[key] = value
+    
+    omitted = []
+    for key in sorted(shortened, key=lambda k: len(compact_json(shortened[k])), reverse=True):
+        text = compact_json(dict(shortened, _omitted=omitted) if omitted else shortened)
+        if estimate_tokens(text) <= max_tokens:
+            return text
+        del shortened[key]
+        omitted.append(key)
+    
+    text = compact_json({'_omitted': omitted})
+    return text if estimate_tokens(text) <= max_tokens else '{}'
+
+class PromptBuilder:
+    """Monta o prompt do LLM com orçamento de tokens.
+    
+    O prefixo estático (instruções, serviços, formato de resposta) é montado
+    uma única vez e é idêntico em todos os turnos. As seções dinâmicas têm
+    limites próprios e, se o total passar de `max_tokens`, o histórico é
+    reduzido primeiro (das mensagens mais antigas para as mais recentes),
+    depois os dados da conversa e a mensagem do cliente por último.
+    O tamanho de cada seção é registrado por turno.
+    """
+    
+    def __init__(self, system_prompt, max_tokens=2000, data_max_tokens=400, message_max_tokens=500,
+                 history_max_tokens=800):
+        self.prefix = textwrap.dedent(system_prompt).strip()
+        self.prefix_tokens = estimate_tokens(self.prefix)
+        self.max_tokens = max_tokens
+        self.data_max_tokens = data_max_tokens
+        self.message_max_tokens = message_max_tokens
+        self.history_max_tokens = history_max_tokens
+        
+        self._lock = threading.Lock()
+        self.turns = 0
+        self.truncated = 0
+        self.prompt_tokens = RollingStats()
+        self.section_tokens = {}
+    
+    def build(self, state, data, message_text, history=None, summary=''):
+        """Retorna (prompt, tokens estimados por seção)"""
+        if not isinstance(data, dict):
+            data = {'value': data}
+        # Espaço que sobra para as seções dinâmicas depois do texto fixo
+        fixed = self.prefix_tokens + estimate_tokens(self._render('', '', '', ''))
+        available = max(0, self.max_tokens - fixed)
+        
+        message = truncate_text(message_text, min(self.message_max_tokens, available))
+        available -= estimate_tokens(message)
+        context = fit_data(data, min(self.data_max_tokens, max(0, available)))
+        available -= estimate_tokens(context)
+        state = truncate_text(str(state), 20)
+        history_text, history_complete = self.fit_history(history or [], summary or '',
+                                                          min(self.history_max_tokens, max(0, available)))
+        
+        sections = {
+            "system": self.prefix_tokens,
+            "context": estimate_tokens(state) + estimate_tokens(context),
+            "history": estimate_tokens(history_text),
+            "message": estimate_tokens(message)
+        }
+        prompt = self._render(state, context, history_text, message)
+        total = estimate_tokens(prompt)
+        truncated = message != (message_text or '') or context != compact_json(data) or not history_complete
+        self._record(sections, total, truncated)
+        return prompt, dict(sections, total=total)
+    
+    def fit_history(self, history, summary, max_tokens):
+        """Resumo e mensagens recentes em até max_tokens; retorna (texto, se coube tudo)"""
+        lines = []
+        used = 0
+        for turn in reversed(history):
+            line = f"{ROLE_LABELS.get(turn.get('role'), turn.get('role'))}: {turn.get('text', '')}"
+            if used + estimate_tokens(line) + 1 > max_tokens:
+                break
+            lines.insert(0, line)
+            used += estimate_tokens(line) + 1
+        complete = len(lines) == len(history)
+        
+        parts = []
+        if summary:
+            # O resumo fica com o que sobrar, mantendo as linhas mais recentes
+            summary_lines = summary.split('\n')
+            while summary_lines and estimate_tokens('\n'.join(summary_lines)) + used + 8 > max_tokens:
+                summary_lines.pop(0)
+                complete = False
+            if summary_lines:
+                parts.append("RESUMO DA CONVERSA ANTERIOR:\n" + '\n'.join(summary_lines))
+        if lines:
+            parts.append("MENSAGENS RECENTES:\n" + '\n'.join(lines))
+        return '\n\n'.join(parts), complete
+    
+    def _render(self, state, context, history, message):
+        history = f"{history}\n\n" if history else ''
+        return (f"{self.prefix}\n\n"
+                f"CONTEXTO DA CONVERSA:\n"
+                f"Estado atual: {state}\n"
+                f"Dados da conversa: {context}\n\n"
+                f"{history}"
+                f"MENSAGEM DO CLIENTE: \"{message}\"\n\n"
+                f"Responda em formato JSON válido.")
+    
+    def _record(self, sections, total, truncated):
+        with self._lock:
+            self.turns += 1
+            self.truncated += truncated
+            for name, tokens in sections.items():
+                self.section_tokens.setdefault(name, RollingStats()).add(tokens)
+        self.prompt_tokens.add(total)
+    
+    def get_stats(self):
+        """Tamanho dos prompts (tokens estimados) e turnos com seções cortadas"""
+        with self._lock:
+            sections = dict(self.section_tokens)
+            stats = {
+                "turns": self.turns,
+                "truncated": self.truncated,
+                "max_tokens": self.max_tokens,
+                "prefix_tokens": self.prefix_tokens
+            }
+        stats["prompt_tokens"] = self.prompt_tokens.summary(digits=1)
+        stats["sections"] = {name: rolling.summary(digits=1) for name, rolling in sections.items()}
+        return stats
@@ -0,0 +1,37 @@
+"""Provisionamento das tabelas do DynamoDB.
+
+Cria as tabelas que não existirem (e os serviços padrão em salon_services)
+e confere o esquema de todas. Roda uma vez por ambiente, antes do deploy;
+o serviço em execução não cria nem descreve tabelas ao iniciar.
+
+Uso:
+    python src/provision_tables.py            cria o que faltar e verifica
+    python src/provision_tables.py --check    só verifica (código de saída 1 se houver problemas)
+"""
+import argparse
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from dynamodb_service import DynamoDBService
+
+def main():
+    parser = argparse.ArgumentParser(description="Cria e verifica as tabelas do DynamoDB")
+    parser.add_argument('--check', action='store_true', help="Só verifica o esquema, sem criar tabelas")
+    args = parser.parse_args()
+    
+    db_service = DynamoDBService()
+    if not args.check and not db_service.create_tables():
+        return 1
+    
+    ok, problems = db_service.verify_tables()
+    for problem in problems:
+        print(f"❌ {problem}")
+    if ok:
+        print("✅ Tabelas DynamoDB conferidas")
+    return 0 if ok else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,156 @@
+import threading
+import time
+from config.config import WA_GLOBAL_RATE_PER_SEC, WA_GLOBAL_BURST, WA_PAIR_RATE_PER_SEC, WA_PAIR_BURST
+from metrics import RollingStats
+
+# Códigos de erro da Graph API que indicam limite de envio atingido
+GLOBAL_RATE_LIMIT_CODES = {4, 80007, 130429, 131048}
+PAIR_RATE_LIMIT_CODES = {131056}
+
+class RateLimitDeferred(Exception):
+    """O envio não pode sair agora sem esperar `wait` segundos (acquire sem bloqueio)"""
+    
+    def __init__(self, wait):
+        super().__init__(f"limite de envio, liberado em {wait:.2f}s")
+        self.wait = wait
+
+class TokenBucket:
+    """Token bucket com reservas: cada chamada reserva o próximo token livre"""
+    
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self.blocked_until = 0.0
+    
+    def reserve(self, now):
+        """Consome um token e retorna quantos segundos esperar até poder usá-lo"""
+        elapsed = max(0.0, now - self.updated_at)
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+        self.updated_at = max(self.updated_at, now)
+        self.tokens -= 1
+        
+        wait = 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+        return max(wait, self.blocked_until - now)
+    
+    def wait_time(self, now):
+        """Segundos até haver um token livre, sem consumi-lo"""
+        tokens = min(self.capacity, self.tokens + max(0.0, now - self.updated_at) * self.rate)
+        wait = 0.0 if tokens >= 1 else (1 - tokens) / self.rate
+        return max(wait, self.blocked_until - now)
+    
+    def block(self, now, seconds):
+        """Suspende o bucket (backoff pedido pela API)"""
+        self.blocked_until = max(self.blocked_until, now + seconds)
+    
+    def is_idle(self, now):
+        refilled = self.tokens + (now - self.updated_at) * self.rate
+        return refilled >= self.capacity and self.blocked_until <= now
+
+class OutboundRateLimiter:
+    """Limita o envio de mensagens aos limites de throughput do WhatsApp.
+    
+    Usa um bucket global para o número do negócio (phone id) e um bucket por
+    destinatário (limite de par). Mensagens acima do limite esperam sua vez
+    em vez de serem descartadas; erros de limite da API suspendem o bucket
+    correspondente pelo tempo do Retry-After ou por um backoff exponencial.
+    Com `block=False` o acquire não espera: retorna o tempo que faltaria e
+    quem chama reagenda o envio (o outbox libera o worker nesse meio tempo).
+    """
+    
+    def __init__(self, phone_id=None, global_rate=WA_GLOBAL_RATE_PER_SEC, global_burst=WA_GLOBAL_BURST,
+                 pair_rate=WA_PAIR_RATE_PER_SEC, pair_burst=WA_PAIR_BURST,
+                 backoff_base=1.0, backoff_max=60.0, max_tracked_recipients=10000):
+        self.phone_id = phone_id
+        self.pair_rate = pair_rate
+        self.pair_burst = pair_burst
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_tracked_recipients = max_tracked_recipients
+        
+        self._lock = threading.Lock()
+        self._global = TokenBucket(global_rate, global_burst)
+        self._pairs = {}
+        self._penalties = 0
+        
+        self.queued = 0
+        self.sent = 0
+        self.deferred = 0
+        self.rate_limited = 0
+        self.wait_times = RollingStats()
+    
+    def acquire(self, recipient, block=True):
+        """Bloqueia até o envio para `recipient` estar liberado; retorna a espera.
+        
+        Com `block=False`, se o envio não puder sair agora nenhum token é
+        consumido e o retorno é a espera necessária (0.0 quando liberado).
+        """
+        with self._lock:
+            now = time.monotonic()
+            pair = self._pair_bucket(recipient, now)
+            if not block:
+                wait = max(self._global.wait_time(now), pair.wait_time(now))
+                if wait > 0:
+                    self.deferred += 1
+                    return wait
+            wait = max(self._global.reserve(now), pair.reserve(now))
+            self.queued += 1
+        
+        if wait > 0:
+            time.sleep(wait)
+        
+        with self._lock:
+            self.queued -= 1
+            self.sent += 1
+        self.wait_times.add(wait)
+        return wait
+    
+    def penalize(self, recipient=None, error_code=None, retry_after=None):
+        """Registra um erro de limite da API e suspende o bucket afetado"""
+        with self._lock:
+            now = time.monotonic()
+            self._penalties += 1
+            self.rate_limited += 1
+            
+            delay = min(self.backoff_max, self.backoff_base * (2 ** (self._penalties - 1)))
+            if retry_after:
+                try:
+                    delay = float(retry_after)
+                except ValueError:
+                    pass
+            
+            if error_code in PAIR_RATE_LIMIT_CODES and recipient is not None:
+                self._pair_bucket(recipient, now).block(now, delay)
+            else:
+                self._global.block(now, delay)
+            return delay
+    
+    def record_success(self):
+        """Zera o backoff após um envio bem-sucedido"""
+        with self._lock:
+            self._penalties = 0
+    
+    def _pair_bucket(self, recipient, now):
+        bucket = self._pairs.get(recipient)
+        if bucket is None:
+            if len(self._pairs) >= self.max_tracked_recipients:
+                # Descarta buckets ociosos (cheios), que não guardam estado útil
+                self._pairs = {key: b for key, b in self._pairs.items() if not b.is_idle(now)}
+            bucket = TokenBucket(self.pair_rate, self.pair_burst)
+            self._pairs[recipient] = bucket
+        return bucket
+    
+    def get_stats(self):
+        """Métricas do limitador, incluindo tempos de espera na fila (ms)"""
+        with self._lock:
+            stats = {
+                "phone_id": self.phone_id,
+                "queued": self.queued,
+                "sent": self.sent,
+                "deferred": self.deferred,
+                "rate_limited": self.rate_limited,
+                "tracked_recipients": len(self._pairs)
+            }
+        stats["wait_ms"] = self.wait_times.summary(scale=1000)
+        return stats
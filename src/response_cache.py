@@ -0,0 +1,169 @@
+import copy
+import hashlib
+import json
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from datetime import datetime
+
+# Ações cuja resposta do LLM não depende de dados ao vivo (agenda, agendamentos)
+CACHEABLE_ACTIONS = {'continue_conversation', 'show_services'}
+
+# Campos do cliente que não entram na chave (a resposta não pode depender deles)
+CLIENT_FIELDS = {'client_name', 'name', 'email', 'phone_number', 'client_info', 'preferences'}
+
+def normalize_message(text):
+    """Minúsculas, sem acentos e sem pontuação/espaços repetidos"""
+    text = unicodedata.normalize('NFKD', (text or '').lower())
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    return ' '.join(re.findall(r'[a-z0-9]+', text))
+
+def is_reusable(response, personal_values=(), cacheable_actions=CACHEABLE_ACTIONS):
+    """Se a resposta pode ser reutilizada para outro cliente"""
+    action = response.get('action', 'continue_conversation')
+    # Compara palavras inteiras ("ana" não casa com "semana")
+    text = f" {normalize_message(json.dumps(response, ensure_ascii=False))} "
+    personal = [normalize_message(str(value)) for value in personal_values if value]
+    return action in cacheable_actions and not any(p and f" {p} " in text for p in personal)
+
+def conversation_data(data):
+    """Dados da conversa sem os campos do cliente"""
+    if not isinstance(data, dict):
+        data = {'value': data}
+    return {key: value for key, value in data.items() if key not in CLIENT_FIELDS}
+
+class MemoryCacheBackend:
+    """Cache em memória do processo: LRU limitado em tamanho, com expiração"""
+    
+    def __init__(self, max_entries=5000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= now:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+    
+    def put(self, key, value, ttl_seconds):
+        with self._lock:
+            self._entries[key] = (time.time() + ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+class DynamoDBCacheBackend:
+    """Cache compartilhado entre workers na tabela salon_response_cache (TTL)"""
+    
+    def __init__(self, db_service):
+        self.db_service = db_service
+    
+    def get(self, key):
+        success, value = self.db_service.get_cached_response(key)
+        if not success:
+            raise RuntimeError(value)
+        return value
+    
+    def put(self, key, value, ttl_seconds):
+        success, message = self.db_service.put_cached_response(key, value, int(time.time() + ttl_seconds))
+        if not success:
+            raise RuntimeError(message)
+
+class ResponseCache:
+    """Cache das respostas do LLM por (estado, mensagem normalizada, dados da conversa).
+    
+    A chave é um hash SHA-256 da serialização canônica desses campos, sem os
+    dados pessoais do cliente e com a data do dia (respostas com "amanhã" não
+    atravessam a meia-noite). Só são guardadas respostas de ações que não
+    dependem de dados ao vivo, e nunca respostas que citam dados do cliente.
+    Erros do backend compartilhado contam como miss.
+    """
+    
+    def __init__(self, backend, ttl_seconds=3600, cacheable_actions=CACHEABLE_ACTIONS):
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+        self.cacheable_actions = set(cacheable_actions)
+        self._lock = threading.Lock()
+        
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.skipped = 0
+        self.backend_errors = 0
+    
+    def make_key(self, state, message_text, data, today=None):
+        """Hash canônico das entradas do prompt"""
+        canonical = json.dumps({
+            'day': (today or datetime.now().date()).isoformat(),
+            'state': state,
+            'message': normalize_message(message_text),
+            'data': conversation_data(data)
+        }, sort_keys=True, ensure_ascii=False, separators=(',', ':'), default=str)
+        return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+    
+    def get(self, key):
+        """Resposta em cache (cópia) ou None"""
+        try:
+            value = self.backend.get(key)
+        except Exception as e:
+            print(f"Erro ao consultar cache de respostas: {str(e)}")
+            value = None
+            with self._lock:
+                self.backend_errors += 1
+        
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return copy.deepcopy(value)
+    
+    def put(self, key, response, personal_values=()):
+        """Guarda a resposta se a ação for cacheável e ela não citar dados do cliente"""
+        if not is_reusable(response, personal_values, self.cacheable_actions):
+            with self._lock:
+                self.skipped += 1
+            return False
+        
+        try:
+            self.backend.put(key, copy.deepcopy(response), self.ttl_seconds)
+        except Exception as e:
+            print(f"Erro ao gravar no cache de respostas: {str(e)}")
+            with self._lock:
+                self.backend_errors += 1
+            return False
+        
+        with self._lock:
+            self.stores += 1
+        return True
+    
+    def get_stats(self):
+        """Métricas do cache, incluindo a taxa de acerto"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            stats = {
+                "backend": "memory" if isinstance(self.backend, MemoryCacheBackend) else "dynamodb",
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "stores": self.stores,
+                "skipped": self.skipped,
+                "backend_errors": self.backend_errors
+            }
+        if isinstance(self.backend, MemoryCacheBackend):
+            stats["entries"] = len(self.backend)
+        return stats
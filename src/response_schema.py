@@ -0,0 +1,294 @@
+import json
+import re
+import threading
+from datetime import date, datetime
+
+# Campos de "data" por ação: obrigatórios para executar a ação e opcionais
+RESPONSE_SCHEMA = {
+    'show_services': {'required': (), 'optional': ()},
+    'check_availability': {'required': ('service_id', 'date'), 'optional': ()},
+    'create_appointment': {'required': ('service_id', 'date', 'time'), 'optional': ('client_name',)},
+    'show_appointments': {'required': (), 'optional': ()},
+    'cancel_appointment': {'required': (), 'optional': ('appointment_id', 'date', 'time')},
+    'continue_conversation': {'required': (), 'optional': ()}
+}
+
+# Tipo de cada campo conhecido em "data" e "data.conversation_data"
+FIELD_TYPES = {
+    'service_id': 'id',
+    'appointment_id': 'id',
+    'client_name': 'text',
+    'date': 'date',
+    'time': 'time',
+    'preferred_time': 'time'
+}
+
+LITERALS = {'True': 'true', 'False': 'false', 'None': 'null', 'true': 'true', 'false': 'false', 'null': 'null'}
+# Aspas de abertura e os caracteres que fecham a string
+QUOTES = {'"': '"', "'": "'", '“': '”"', '”': '”"'}
+CLOSING = {'{': '}', '[': ']'}
+
+TIME_PATTERN = re.compile(r'^(?P<hour>\d{1,2})(?:[:h](?P<minute>\d{2})?)?(?::\d{2})?h?$')
+DATE_PATTERN = re.compile(r'^(?P<day>\d{1,2})[/-](?P<month>\d{1,2})(?:[/-](?P<year>\d{2,4}))?$')
+
+def extract_json(text):
+    """Primeiro objeto JSON do texto, corrigido em uma única passada.
+    
+    Ignora cercas de markdown e texto antes/depois do objeto, e corrige os
+    erros comuns do LLM: aspas simples ou tipográficas, vírgulas sobrando
+    antes de } ou ], True/False/None do Python, chaves e palavras sem aspas, quebras de
+    linha dentro de strings e objeto cortado no final. Retorna
+    (texto JSON, correções aplicadas) ou (None, []) se não houver objeto.
+    """
+    text = text or ''
+    start = text.find('{')
+    if start < 0:
+        return None, []
+    
+    out = []
+    stack = []
+    repairs = set()
+    i = start
+    while i < len(text):
+        c = text[i]
+        
+        if c in QUOTES:
+            if c != '"':
+                repairs.add('quotes')
+            closing = QUOTES[c]
+            chars = []
+            i += 1
+            while i < len(text) and text[i] not in closing:
+                d = text[i]
+                if d == '\\' and i + 1 < len(text):
+                    chars.append(text[i:i + 2])
+                    i += 2
+                    continue
+                if d == '"':
+                    chars.append('\\"')
+                elif d == '\n':
+                    chars.append('\\n')
+                    repairs.add('newlines')
+                else:
+                    chars.append(d)
+                i += 1
+            if i >= len(text):
+                repairs.add('truncated')
+            out.append('"' + ''.join(chars) + '"')
+            i += 1
+            continue
+        
+        if c in CLOSING:
+            stack.append(CLOSING[c])
+        elif c in '}]':
+            # Vírgula sobrando antes do fechamento
+            k = len(out) - 1
+            while k >= 0 and out[k].isspace():
+                k -= 1
+            if k >= 0 and out[k] == ',':
+                del out[k]
+                repairs.add('trailing_comma')
+            if stack:
+                stack.pop()
+            out.append(c)
+            if not stack:
+                return ''.join(out), sorted(repairs)
+            i += 1
+            continue
+        elif c.isalpha() or c == '_':
+            end = i
+            while end < len(text) and (text[end].isalnum() or text[end] == '_'):
+                end += 1
+            word = text[i:end]
+            rest = text[end:].lstrip()
+            if rest.startswith(':'):
+                out.append(f'"{word}"')
+                repairs.add('unquoted_keys')
+            elif word in LITERALS:
+                out.append(LITERALS[word])
+                if word in ('True', 'False', 'None'):
+                    repairs.add('literals')
+            else:
+                out.append(f'"{word}"')
+                repairs.add('unquoted_values')
+            i = end
+            continue
+        
+        out.append(c)
+        i += 1
+    
+    # Resposta cortada: fecha o que ficou aberto
+    k = len(out) - 1
+    while k >= 0 and (out[k].isspace() or out[k] in ',:'):
+        del out[k]
+        k -= 1
+    repairs.add('truncated')
+    return ''.join(out) + ''.join(reversed(stack)), sorted(repairs)
+
+def normalize_date(value, today=None):
+    """Data como YYYY-MM-DD (aceita DD/MM/AAAA e DD/MM); None se inválida"""
+    value = str(value).strip()
+    try:
+        return datetime.strptime(value[:10], '%Y-%m-%d').date().isoformat()
+    except ValueError:
+        pass
+    
+    match = DATE_PATTERN.match(value)
+    if not match:
+        return None
+    today = today or date.today()
+    day, month = int(match.group('day')), int(match.group('month'))
+    year = match.group('year')
+    try:
+        if year:
+            year = int(year) + (2000 if len(year) == 2 else 0)
+            return date(year, month, day).isoformat()
+        result = date(today.year, month, day)
+        if result < today:
+            result = date(today.year + 1, month, day)
+        return result.isoformat()
+    except ValueError:
+        return None
+
+def normalize_time(value):
+    """Horário como HH:MM (aceita 9:00, 14h, 14h30, 14:00:00); None se inválido"""
+    match = TIME_PATTERN.match(str(value).strip().lower())
+    if not match:
+        return None
+    hour, minute = int(match.group('hour')), int(match.group('minute') or 0)
+    if hour > 23 or minute > 59:
+        return None
+    return f"{hour:02d}:{minute:02d}"
+
+class ResponseParser:
+    """Interpreta a saída do LLM em uma resposta validada para process_action.
+    
+    A resposta tem "message" (texto), "action" (uma das ações de
+    RESPONSE_SCHEMA) e "data" (objeto). Campos conhecidos de "data" e de
+    "data.conversation_data" são convertidos para o formato usado pelo agente
+    (datas YYYY-MM-DD, horários HH:MM, ids em minúsculas); valores inválidos
+    são descartados e contados. Campos obrigatórios da ação que faltarem são
+    completados com os dados já guardados na conversa.
+    """
+    
+    def __init__(self, states=()):
+        self.states = set(states)
+        self._lock = threading.Lock()
+        self.parsed = 0
+        self.failures = 0
+        self.repaired = 0
+        self.filled = 0
+        self.repairs = {}
+        self.invalid_fields = {}
+    
+    def parse(self, text, conversation_data=None, today=None):
+        """Resposta validada, ou None se o texto não contém um objeto JSON"""
+        candidate, repairs = extract_json(text)
+        response = None
+        if candidate is not None:
+            try:
+                response = json.loads(candidate)
+            except json.JSONDecodeError:
+                response = None
+        if not isinstance(response, dict):
+            with self._lock:
+                self.parsed += 1
+                self.failures += 1
+            return None
+        
+        response, invalid, filled = self.validate(response, conversation_data, today)
+        with self._lock:
+            self.parsed += 1
+            self.repaired += bool(repairs)
+            self.filled += filled
+            for repair in repairs:
+                self.repairs[repair] = self.repairs.get(repair, 0) + 1
+            for field in invalid:
+                self.invalid_fields[field] = self.invalid_fields.get(field, 0) + 1
+        return response
+    
+    def validate(self, response, conversation_data=None, today=None):
+        """Converte os campos para os tipos esperados; retorna (resposta, campos inválidos, campos completados)"""
+        invalid = []
+        message = response.get('message')
+        if not isinstance(message, str):
+            if message is not None:
+                invalid.append('message')
+            message = '' if message is None else json.dumps(message, ensure_ascii=False)
+        
+        action = response.get('action') or 'continue_conversation'
+        if action not in RESPONSE_SCHEMA:
+            invalid.append('action')
+            action = 'continue_conversation'
+        
+        data = response.get('data')
+        if isinstance(data, str):
+            # O prompt descreve "data" como texto: aceita um objeto dentro da string
+            candidate, _ = extract_json(data)
+            try:
+                data = json.loads(candidate) if candidate else {}
+            except json.JSONDecodeError:
+                data = {}
+        if not isinstance(data, dict):
+            if data is not None:
+                invalid.append('data')
+            data = {}
+        
+        data = self._validate_fields(data, 'data', invalid, today)
+        if 'state' in data and data['state'] not in self.states:
+            invalid.append('data.state')
+            del data['state']
+        if 'conversation_data' in data:
+            if isinstance(data['conversation_data'], dict):
+                data['conversation_data'] = self._validate_fields(data['conversation_data'], 'data.conversation_data',
+                                                                  invalid, today)
+            else:
+                invalid.append('data.conversation_data')
+                del data['conversation_data']
+        
+        filled = 0
+        known = self._validate_fields(conversation_data or {}, 'context', [], today)
+        for field in RESPONSE_SCHEMA[action]['required']:
+            if not data.get(field) and known.get(field):
+                data[field] = known[field]
+                filled += 1
+        
+        return {"message": message, "action": action, "data": data}, invalid, filled
+    
+    def _validate_fields(self, data, prefix, invalid, today):
+        result = {}
+        for key, value in data.items():
+            kind = FIELD_TYPES.get(key)
+            if kind is None or value is None:
+                result[key] = value
+                continue
+            
+            if kind == 'date':
+                converted = normalize_date(value, today)
+            elif kind == 'time':
+                converted = normalize_time(value)
+            elif isinstance(value, bool) or not isinstance(value, (str, int)):
+                converted = None
+            else:
+                converted = str(value).strip()
+                if kind == 'id':
+                    converted = converted.lower()
+            
+            if converted is None:
+                invalid.append(f"{prefix}.{key}")
+            elif converted != '':
+                result[key] = converted
+        return result
+    
+    def get_stats(self):
+        """Respostas interpretadas, falhas, correções aplicadas e campos inválidos"""
+        with self._lock:
+            return {
+                "parsed": self.parsed,
+                "failures": self.failures,
+                "failure_rate": round(self.failures / self.parsed, 4) if self.parsed else 0.0,
+                "repaired": self.repaired,
+                "filled_from_context": self.filled,
+                "repairs": dict(self.repairs),
+                "invalid_fields": dict(self.invalid_fields)
+            }
@@ -0,0 +1,113 @@
+import threading
+import time
+
+class ServiceCatalog:
+    """Catálogo de serviços em memória, carregado do DynamoDB e renovado por TTL.
+    
+    O catálogo inteiro (poucos itens) é lido com um scan e guardado como
+    lista e dict por service_id; get_service e get_all_services respondem da
+    memória enquanto a carga tiver menos de `ttl_seconds`. Ids que não estão
+    na carga são lidos com get_item e acrescentados ao dict. invalidate()
+    descarta a carga (ex.: após mudar preços) e a próxima leitura recarrega.
+    Se a recarga falhar, a carga anterior continua sendo usada e a próxima
+    tentativa só acontece após `retry_seconds`, sem um scan por turno
+    enquanto o DynamoDB estiver fora.
+    """
+    
+    def __init__(self, db_service, ttl_seconds=300, retry_seconds=30):
+        self.db_service = db_service
+        self.ttl_seconds = ttl_seconds
+        self.retry_seconds = retry_seconds
+        self._services = None
+        self._by_id = {}
+        self._loaded_at = 0.0
+        self._failed_at = None
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        
+        self.hits = 0
+        self.loads = 0
+        self.load_errors = 0
+        self.item_reads = 0
+        self.invalidations = 0
+    
+    def get_all_services(self):
+        """(success, lista de serviços), no mesmo formato de DynamoDBService"""
+        services = self._current()
+        if services is None:
+            return False, "Erro ao buscar serviços"
+        return True, list(services)
+    
+    def get_service(self, service_id):
+        """(success, serviço), no mesmo formato de DynamoDBService"""
+        self._current()
+        with self._lock:
+            service = self._by_id.get(service_id)
+        if service is not None:
+            return True, service
+        
+        # Serviço fora da carga (ou carga indisponível): lê só o item
+        success, service = self.db_service.get_service(service_id)
+        with self._lock:
+            self.item_reads += 1
+            if success:
+                self._by_id[service_id] = service
+        return success, service
+    
+    def invalidate(self):
+        """Descarta o catálogo carregado; a próxima leitura busca no DynamoDB"""
+        with self._lock:
+            self._services = None
+            self._by_id = {}
+            self._failed_at = None
+            self.invalidations += 1
+    
+    def _current(self):
+        with self._lock:
+            if self._usable():
+                self.hits += 1
+                return self._services
+        
+        # Uma única carga por vez; quem esperava usa o resultado dela
+        with self._load_lock:
+            with self._lock:
+                if self._usable():
+                    self.hits += 1
+                    return self._services
+            try:
+                success, services = self.db_service.get_all_services()
+            except Exception as e:
+                success, services = False, str(e)
+            
+            with self._lock:
+                if success:
+                    self._services = services
+                    self._by_id = {service['service_id']: service for service in services}
+                    self._loaded_at = time.monotonic()
+                    self._failed_at = None
+                    self.loads += 1
+                else:
+                    print(f"Erro ao carregar catálogo de serviços: {services}")
+                    self._failed_at = time.monotonic()
+                    self.load_errors += 1
+                return self._services
+    
+    def _usable(self):
+        """Carga dentro do TTL, ou falha recente: responde sem novo scan (chamar com _lock)"""
+        now = time.monotonic()
+        if self._failed_at is not None and now - self._failed_at < self.retry_seconds:
+            return True
+        return self._services is not None and now - self._loaded_at < self.ttl_seconds
+    
+    def get_stats(self):
+        """Leituras servidas da memória, cargas do DynamoDB e idade do catálogo"""
+        with self._lock:
+            return {
+                "services": len(self._services) if self._services is not None else 0,
+                "hits": self.hits,
+                "loads": self.loads,
+                "load_errors": self.load_errors,
+                "item_reads": self.item_reads,
+                "invalidations": self.invalidations,
+                "age_seconds": round(time.monotonic() - self._loaded_at, 1) if self._services is not None else None
+            }
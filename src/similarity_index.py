@@ -0,0 +1,297 @@
+import copy
+import json
+import re
+import threading
+import unicodedata
+import zlib
+import numpy as np
+from datetime import datetime
+from response_cache import conversation_data
+
+# Palavras que não distinguem pedidos ("quero um corte" ~ "corte")
+SIMILARITY_STOPWORDS = {
+    "eu", "quero", "queria", "gostaria", "de", "do", "da", "dos", "das", "o", "a", "os", "as",
+    "um", "uma", "meu", "minha", "para", "pra", "no", "na", "e", "por", "favor", "vcs", "voces",
+    "voce", "fazer", "me", "mim", "tudo", "bem", "oi", "ola"
+}
+
+# Palavras que mudam o sentido com pouca diferença de n-gramas: precisam coincidir
+GUARD_WORDS = {
+    "nao", "nunca", "cancelar", "desmarcar", "remarcar", "hoje", "amanha", "depois", "ontem",
+    "segunda", "terca", "quarta", "quinta", "sexta", "sabado", "domingo"
+}
+
+WORD_PATTERN = re.compile(r'[a-z0-9]+')
+
+def message_words(text):
+    """Palavras normalizadas (minúsculas, sem acentos)"""
+    text = unicodedata.normalize('NFKD', (text or '').lower())
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    return WORD_PATTERN.findall(text)
+
+def similarity_scope(state, data):
+    """Escopo de busca: estado e dados da conversa (sem os dados do cliente)"""
+    return json.dumps({'state': state, 'data': conversation_data(data)},
+                      sort_keys=True, ensure_ascii=False, separators=(',', ':'), default=str)
+
+class _Cluster:
+    """Bloco contíguo de vetores (cresce dobrando a capacidade)"""
+    
+    def __init__(self, dim, capacity=16):
+        self.vectors = np.zeros((capacity, dim), dtype=np.float32)
+        self.ids = np.zeros(capacity, dtype=np.int64)
+        self.size = 0
+    
+    def append(self, entry_id, vector):
+        if self.size == len(self.ids):
+            self.vectors = np.concatenate([self.vectors, np.zeros_like(self.vectors)])
+            self.ids = np.concatenate([self.ids, np.zeros_like(self.ids)])
+        self.vectors[self.size] = vector
+        self.ids[self.size] = entry_id
+        self.size += 1
+
+class _Partition:
+    """Entradas de um escopo (estado + dados da conversa).
+    
+    Até `flat_limit` entradas a busca é exaustiva em um único bloco; acima
+    disso as entradas são agrupadas por k-means (IVF) e a busca só compara
+    os `nprobe` grupos com centróide mais próximo da consulta.
+    """
+    
+    def __init__(self, dim, centroids=None):
+        self.dim = dim
+        self.centroids = centroids
+        count = 1 if centroids is None else len(centroids)
+        self.clusters = [_Cluster(dim) for _ in range(count)]
+        self.entries = []
+        self.built_size = 0
+        self.rebuilding = False
+        self.pending = []
+    
+    def __len__(self):
+        return len(self.entries)
+    
+    def insert(self, vector, entry):
+        entry_id = len(self.entries)
+        self.entries.append(entry)
+        cluster = 0 if self.centroids is None else int(np.argmax(self.centroids @ vector))
+        self.clusters[cluster].append(entry_id, vector)
+    
+    def search(self, vector, nprobe):
+        """Vizinho mais próximo: retorna (id da entrada, similaridade) ou (None, 0.0)"""
+        if self.centroids is None:
+            probes = [0]
+        else:
+            scores = self.centroids @ vector
+            probes = np.argpartition(-scores, nprobe - 1)[:nprobe] if len(scores) > nprobe else range(len(scores))
+        
+        best_id, best_score = None, 0.0
+        for index in probes:
+            cluster = self.clusters[index]
+            if cluster.size == 0:
+                continue
+            scores = cluster.vectors[:cluster.size] @ vector
+            position = int(np.argmax(scores))
+            if scores[position] > best_score:
+                best_id, best_score = int(cluster.ids[position]), float(scores[position])
+        return best_id, best_score
+    
+    def all_vectors(self):
+        """Vetores na ordem dos ids das entradas"""
+        vectors = np.zeros((len(self.entries), self.dim), dtype=np.float32)
+        for cluster in self.clusters:
+            vectors[cluster.ids[:cluster.size]] = cluster.vectors[:cluster.size]
+        return vectors
+
+def train_centroids(vectors, num_clusters, iterations=6, sample_size=8192, seed=0):
+    """K-means esférico (similaridade de cosseno) sobre uma amostra dos vetores"""
+    rng = np.random.default_rng(seed)
+    if len(vectors) > sample_size:
+        vectors = vectors[rng.choice(len(vectors), sample_size, replace=False)]
+    centroids = vectors[rng.choice(len(vectors), num_clusters, replace=False)].copy()
+    
+    for _ in range(iterations):
+        labels = np.argmax(vectors @ centroids.T, axis=1)
+        for cluster in range(num_clusters):
+            members = vectors[labels == cluster]
+            if len(members):
+                centroid = members.sum(axis=0)
+                norm = np.linalg.norm(centroid)
+                if norm > 0:
+                    centroids[cluster] = centroid / norm
+    return centroids
+
+class SimilarityIndex:
+    """Índice de similaridade (state, mensagem) -> resposta do LLM já interpretada.
+    
+    As mensagens viram vetores de n-gramas de caracteres (3 e 4) com feature
+    hashing em `dim` posições, normalizados para similaridade de cosseno e
+    guardados em arrays float32. Cada escopo (estado + dados da conversa) tem
+    sua partição; partições grandes usam um índice IVF treinado em background.
+    Um vizinho acima de `threshold` só é reutilizado se números, negações e
+    datas relativas da mensagem forem os mesmos. Como no cache exato, as
+    respostas valem só para o dia em que foram geradas.
+    """
+    
+    def __init__(self, threshold=0.8, dim=256, max_entries=100000, flat_limit=4096, nprobe=8,
+                 dedup_threshold=0.98, background_rebuild=True):
+        self.threshold = threshold
+        self.dim = dim
+        self.max_entries = max_entries
+        self.flat_limit = flat_limit
+        self.nprobe = nprobe
+        self.dedup_threshold = dedup_threshold
+        self.background_rebuild = background_rebuild
+        
+        self._partitions = {}
+        self._size = 0
+        self._day = None
+        self._lock = threading.Lock()
+        
+        self.hits = 0
+        self.misses = 0
+        self.added = 0
+        self.skipped = 0
+        self.rebuilds = 0
+    
+    def vectorize(self, message_text):
+        """Vetor unitário de n-gramas de caracteres e a assinatura de palavras de guarda"""
+        words = message_words(message_text)
+        guard = frozenset(w for w in words if w in GUARD_WORDS or w.isdigit() or any(c.isdigit() for c in w))
+        
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for word in words:
+            if word in SIMILARITY_STOPWORDS:
+                continue
+            padded = f" {word} "
+            for size in (3, 4):
+                for start in range(max(1, len(padded) - size + 1)):
+                    digest = zlib.crc32(padded[start:start + size].encode('utf-8'))
+                    # Hash com sinal: colisões tendem a se cancelar
+                    vector[digest % self.dim] += 1.0 if digest & 0x80000000 else -1.0
+        
+        norm = np.linalg.norm(vector)
+        if norm == 0:
+            return None, guard
+        return vector / norm, guard
+    
+    def lookup(self, scope, message_text, today=None):
+        """Resposta de uma mensagem parecida no mesmo escopo (cópia), ou None"""
+        vector, guard = self.vectorize(message_text)
+        response = None
+        if vector is not None:
+            with self._lock:
+                self._roll_day(today)
+                partition = self._partitions.get(scope)
+                if partition is not None and len(partition):
+                    entry_id, score = partition.search(vector, self.nprobe)
+                    if entry_id is not None and score >= self.threshold:
+                        entry_guard, entry_response = partition.entries[entry_id]
+                        if entry_guard == guard:
+                            response = entry_response
+        
+        with self._lock:
+            if response is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return copy.deepcopy(response)
+    
+    def add(self, scope, message_text, response, today=None):
+        """Indexa a resposta de uma mensagem; retorna False se ignorada"""
+        vector, guard = self.vectorize(message_text)
+        if vector is None:
+            return False
+        
+        entry = (guard, copy.deepcopy(response))
+        start_rebuild = None
+        with self._lock:
+            self._roll_day(today)
+            partition = self._partitions.get(scope)
+            if partition is None:
+                partition = self._partitions[scope] = _Partition(self.dim)
+            
+            if self._size >= self.max_entries:
+                self.skipped += 1
+                return False
+            
+            # Mensagem quase idêntica já indexada com a mesma guarda: não repete
+            entry_id, score = partition.search(vector, self.nprobe) if len(partition) else (None, 0.0)
+            if entry_id is not None and score >= self.dedup_threshold and partition.entries[entry_id][0] == guard:
+                self.skipped += 1
+                return False
+            
+            if partition.rebuilding:
+                partition.pending.append((vector, entry))
+            else:
+                partition.insert(vector, entry)
+                if len(partition) >= self.flat_limit and len(partition) >= 2 * partition.built_size:
+                    partition.rebuilding = True
+                    start_rebuild = partition
+            self._size += 1
+            self.added += 1
+        
+        if start_rebuild is not None:
+            if self.background_rebuild:
+                threading.Thread(target=self._rebuild, args=(scope, start_rebuild), name='similarity-rebuild', daemon=True).start()
+            else:
+                self._rebuild(scope, start_rebuild)
+        return True
+    
+    def _roll_day(self, today):
+        """Descarta o índice na virada do dia (chamar com o lock)"""
+        today = today or datetime.now().date()
+        if today != self._day:
+            self._partitions = {}
+            self._size = 0
+            self._day = today
+    
+    def _rebuild(self, scope, partition):
+        """Treina o IVF da partição e troca a estrutura ao final.
+        
+        A partição antiga não muda durante o treino (novas entradas ficam em
+        `pending`), então as consultas continuam usando-a normalmente.
+        """
+        try:
+            vectors = partition.all_vectors()
+            num_clusters = max(8, min(1024, int(np.sqrt(len(vectors)))))
+            centroids = train_centroids(vectors, num_clusters)
+            
+            rebuilt = _Partition(self.dim, centroids)
+            labels = np.concatenate([
+                np.argmax(vectors[start:start + 4096] @ centroids.T, axis=1)
+                for start in range(0, len(vectors), 4096)
+            ])
+            for entry_id, (vector, label) in enumerate(zip(vectors, labels)):
+                rebuilt.clusters[label].append(entry_id, vector)
+            rebuilt.entries = list(partition.entries)
+            rebuilt.built_size = len(rebuilt.entries)
+        except Exception as e:
+            print(f"Erro ao reconstruir índice de similaridade: {str(e)}")
+            rebuilt = partition
+            rebuilt.built_size = len(partition)
+        
+        with self._lock:
+            for vector, entry in partition.pending:
+                rebuilt.insert(vector, entry)
+            partition.pending = []
+            rebuilt.rebuilding = False
+            # O índice pode ter sido descartado durante o treino
+            if self._partitions.get(scope) is partition:
+                self._partitions[scope] = rebuilt
+            self.rebuilds += 1
+    
+    def get_stats(self):
+        """Métricas do índice, incluindo a taxa de acerto"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "entries": self._size,
+                "partitions": len(self._partitions),
+                "added": self.added,
+                "skipped": self.skipped,
+                "rebuilds": self.rebuilds
+            }
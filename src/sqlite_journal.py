@@ -0,0 +1,192 @@
+import os
+import sqlite3
+import threading
+import time
+
+def connect_journal(db_path):
+    """Abre um arquivo SQLite local para uso como journal durável.
+    
+    Usa WAL com synchronous=FULL: cada commit sobrevive a uma queda do
+    processo. A conexão é compartilhada entre threads e deve ser protegida
+    por um lock de quem a utiliza.
+    """
+    directory = os.path.dirname(db_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    
+    conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=FULL')
+    return conn
+
+class JournalQueue:
+    """Base das filas locais persistentes (spool do webhook e outbox).
+    
+    A subclasse define a tabela (`table`, criada em `create_schema`), os
+    status contados em get_stats, o SQL que devolve à fila o que estava em
+    andamento quando o processo caiu (`recover_sql`) e o que remove as
+    mensagens finalizadas há mais de `retention_seconds` (`purge_sql`, com
+    o limite de tempo como parâmetro). A base cuida da conexão, da limpeza
+    e da espera por novas mensagens.
+    """
+    
+    name = 'journal'
+    table = None
+    statuses = ()
+    recover_sql = None
+    purge_sql = None
+    
+    def __init__(self, db_path, retention_seconds=86400):
+        self.db_path = db_path
+        self.retention_seconds = retention_seconds
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)
+        # Incrementado a cada novidade na fila; permite esperar sem perder avisos
+        self._generation = 0
+        
+        # Uma conexão compartilhada, serializada pelo lock
+        self._conn = connect_journal(db_path)
+        self.create_schema()
+        
+        recovered = self.recover()
+        if recovered:
+            print(f"{recovered} mensagens recuperadas do {self.name} após reinício")
+    
+    def create_schema(self):
+        raise NotImplementedError
+    
+    def recover(self):
+        """Volta para 'pending' as mensagens que estavam em andamento"""
+        with self._lock:
+            cursor = self._conn.execute(self.recover_sql)
+            return cursor.rowcount
+    
+    def purge(self, older_than=None):
+        """Remove as mensagens finalizadas há mais de `retention_seconds`; retorna quantas"""
+        cutoff = time.time() - (self.retention_seconds if older_than is None else older_than)
+        with self._lock:
+            cursor = self._conn.execute(self.purge_sql, (cutoff,))
+            return cursor.rowcount
+    
+    def generation(self):
+        """Contador de novidades da fila, para usar com wait_for_messages"""
+        with self._lock:
+            return self._generation
+    
+    def wait_for_messages(self, timeout, since=None):
+        """Bloqueia até haver novidade desde `since` ou o timeout expirar.
+        
+        `since` é um valor lido antes com generation(): um aviso que chegou
+        entre a leitura e a espera não se perde. Sem `since`, espera a
+        próxima novidade. Retorna False se o timeout expirou.
+        """
+        with self._available:
+            if since is None:
+                since = self._generation
+            return self._available.wait_for(lambda: self._generation != since, timeout)
+    
+    def notify(self):
+        """Acorda quem estiver esperando em wait_for_messages"""
+        with self._available:
+            self._signal()
+    
+    def _signal(self):
+        # Chamado com o lock: registra a novidade e acorda quem espera
+        self._generation += 1
+        self._available.notify_all()
+    
+    def get_stats(self):
+        """Quantidade de mensagens por status"""
+        with self._lock:
+            rows = self._conn.execute(f'SELECT status, COUNT(*) FROM {self.table} GROUP BY status').fetchall()
+        stats = dict.fromkeys(self.statuses, 0)
+        stats.update(dict(rows))
+        return stats
+    
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+class JournalDrainer:
+    """Base dos consumidores de um JournalQueue.
+    
+    Uma thread reserva (`queue.claim`) o que cabe nas vagas livres e entrega
+    cada item a `dispatch`; a subclasse chama `release_slot` quando o item
+    termina, o que libera a vaga e acorda a thread. A cada `purge_interval`
+    a mesma thread remove da fila as mensagens finalizadas antigas.
+    """
+    
+    def __init__(self, queue, max_in_flight, poll_interval=1.0, purge_interval=600):
+        self.queue = queue
+        self.max_in_flight = max_in_flight
+        self.poll_interval = poll_interval
+        self.purge_interval = purge_interval
+        self._last_purge = time.monotonic()
+        
+        self._executor = None
+        self._in_flight = 0
+        self._in_flight_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+    
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name=f'{self.queue.name}-drainer', daemon=True)
+        self._thread.start()
+        print(f"Worker do {self.queue.name} de mensagens iniciado")
+    
+    def stop(self, timeout=5):
+        self._stop_event.set()
+        self.queue.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+    
+    def drain_once(self):
+        """Reserva o que couber nas vagas livres e despacha; retorna quantos itens foram reservados"""
+        with self._in_flight_lock:
+            free_slots = self.max_in_flight - self._in_flight
+        
+        batch = self.queue.claim(free_slots) if free_slots > 0 else []
+        for entry in batch:
+            with self._in_flight_lock:
+                self._in_flight += 1
+            self.dispatch(entry)
+        return len(batch)
+    
+    def dispatch(self, entry):
+        raise NotImplementedError
+    
+    def maintenance(self):
+        """Chamado a cada volta do loop, antes de reservar novos itens"""
+        if time.monotonic() - self._last_purge >= self.purge_interval:
+            self._last_purge = time.monotonic()
+            try:
+                purged = self.queue.purge()
+            except Exception as e:
+                print(f"Erro na limpeza do {self.queue.name}: {str(e)}")
+                return
+            if purged:
+                print(f"{purged} mensagens antigas removidas do {self.queue.name}")
+    
+    def idle_timeout(self):
+        """Espera máxima quando não há itens prontos (a subclasse pode encurtar)"""
+        return self.poll_interval
+    
+    def release_slot(self):
+        with self._in_flight_lock:
+            self._in_flight -= 1
+        # Acorda o drainer para ocupar a vaga liberada
+        self.queue.notify()
+    
+    def _run(self):
+        while not self._stop_event.is_set():
+            # Lido antes de reservar: o que mudar durante drain_once não espera o poll_interval
+            seen = self.queue.generation()
+            self.maintenance()
+            if not self.drain_once():
+                # Também acorda a cada poll_interval (novas tentativas agendadas)
+                self.queue.wait_for_messages(self.idle_timeout(), since=seen)
@@ -0,0 +1,114 @@
+import threading
+import time
+from metrics import RollingStats
+
+class TurnPrefetch:
+    """Leituras independentes de um turno, disparadas em paralelo.
+    
+    Cada leitura é submetida ao pool com um nome (e opcionalmente uma chave,
+    como o serviço e a data de uma consulta de disponibilidade) e consumida
+    depois com `result`. Leituras que terminam com exceção devolvem o valor
+    padrão, para o chamador cair na leitura direta.
+    """
+    
+    def __init__(self, executor):
+        self.executor = executor
+        self.started_at = time.perf_counter()
+        self._futures = {}
+        self._keys = {}
+        self._finished = {}
+        self._used = set()
+    
+    def submit(self, name, key, function, *args):
+        def run():
+            try:
+                return function(*args)
+            finally:
+                self._finished[name] = time.perf_counter() - self.started_at
+        self._futures[name] = self.executor.submit(run)
+        self._keys[name] = key
+    
+    def has(self, name, key=None):
+        """Se a leitura foi disparada (com a mesma chave, se informada)"""
+        return name in self._futures and (key is None or self._keys[name] == key)
+    
+    def result(self, name, default=None):
+        future = self._futures.get(name)
+        if future is None:
+            return default
+        self._used.add(name)
+        try:
+            return future.result()
+        except Exception as e:
+            print(f"Erro na leitura antecipada {name}: {str(e)}")
+            return default
+    
+    def durations(self):
+        """Tempo (s) de cada leitura já concluída, desde o início do turno"""
+        return dict(self._finished)
+    
+    def unused(self):
+        return [name for name in self._futures if name not in self._used]
+
+class TurnTimer:
+    """Divide o turno em etapas sequenciais (leituras, LLM, ação, gravação)"""
+    
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self._last = self.started_at
+        self.segments = {}
+    
+    def mark(self, name):
+        now = time.perf_counter()
+        self.segments[name] = self.segments.get(name, 0.0) + (now - self._last)
+        self._last = now
+    
+    def total(self):
+        return self._last - self.started_at
+
+class TurnStats:
+    """Tempos por etapa do turno e qual leitura segurou o início do processamento"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.turns = 0
+        self.critical_reads = {}
+        self.speculative = {"used": 0, "wasted": 0}
+        self.turn_ms = RollingStats()
+        self.segment_ms = {}
+        self.read_ms = {}
+    
+    def record(self, timer, prefetch, blocking_reads, speculative_reads=()):
+        """Registra um turno; `blocking_reads` são as leituras aguardadas antes do LLM"""
+        durations = prefetch.durations()
+        waited = {name: durations[name] for name in blocking_reads if name in durations}
+        critical = max(waited, key=waited.get) if waited else None
+        unused = set(prefetch.unused())
+        
+        with self._lock:
+            self.turns += 1
+            if critical:
+                self.critical_reads[critical] = self.critical_reads.get(critical, 0) + 1
+            for name in speculative_reads:
+                if prefetch.has(name):
+                    self.speculative["wasted" if name in unused else "used"] += 1
+            for name, seconds in timer.segments.items():
+                self.segment_ms.setdefault(name, RollingStats()).add(seconds)
+            for name, seconds in durations.items():
+                self.read_ms.setdefault(name, RollingStats()).add(seconds)
+        self.turn_ms.add(timer.total())
+    
+    def get_stats(self):
+        """Tempos (ms) do turno, de cada etapa e de cada leitura paralela"""
+        with self._lock:
+            stats = {
+                "turns": self.turns,
+                "critical_reads": dict(self.critical_reads),
+                "speculative_availability": dict(self.speculative)
+            }
+            segments = dict(self.segment_ms)
+            reads = dict(self.read_ms)
+        stats["turn_ms"] = self.turn_ms.summary(scale=1000)
+        stats["segments_ms"] = {name: rolling.summary(scale=1000) for name, rolling in segments.items()}
+        stats["reads_ms"] = {name: rolling.summary(scale=1000) for name, rolling in reads.items()}
+        return stats
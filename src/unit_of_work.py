@@ -0,0 +1,175 @@
+import json
+import math
+import threading
+from metrics import RollingStats
+
+def read_units(size):
+    """RCUs de uma leitura eventualmente consistente de `size` bytes (0,5 por 4 KB)"""
+    return max(1, math.ceil(size / 4096)) * 0.5
+
+def write_units(size):
+    """WCUs de uma escrita de `size` bytes (1 por KB)"""
+    return max(1, math.ceil(size / 1024))
+
+def item_size(item):
+    """Tamanho aproximado do item no DynamoDB (JSON em UTF-8)"""
+    return len(json.dumps(item, ensure_ascii=False, default=str).encode('utf-8'))
+
+class TurnLimitExceeded(Exception):
+    """Leitura recusada pelo limite do turno, em métodos que não retornam (success, valor)"""
+
+class TurnUnitOfWork:
+    """Acesso ao DynamoDB durante um único turno (uma mensagem do cliente).
+    
+    Cada get_item (contexto, cliente) é feito no máximo uma vez por
+    chave: leituras repetidas no mesmo turno devolvem o resultado guardado.
+    A gravação do contexto fica pendente até flush(), no fim do turno, e
+    leituras seguintes do mesmo contexto já veem a versão pendente.
+    Leituras e escritas imediatas acima de `max_reads`/`max_writes` são
+    recusadas no formato (False, mensagem) do DynamoDBService (os iteradores
+    levantam TurnLimitExceeded); a gravação
+    do contexto no flush nunca é recusada, para não perder o estado da
+    conversa. As chamadas e as unidades de capacidade estimadas (RCU/WCU)
+    ficam nos contadores do turno.
+    """
+    
+    def __init__(self, db_service, max_reads=20, max_writes=5):
+        self.db_service = db_service
+        self.max_reads = max_reads
+        self.max_writes = max_writes
+        self._lock = threading.Lock()
+        self._memo = {}
+        self._staged = {}
+        
+        self.reads = 0
+        self.writes = 0
+        self.memo_hits = 0
+        self.capped = 0
+        self.read_units = 0.0
+        self.write_units = 0
+    
+    def get_conversation_context(self, phone_number):
+        with self._lock:
+            if ('context', phone_number) in self._staged:
+                self.memo_hits += 1
+                return True, self._staged[('context', phone_number)]
+        return self._get(('context', phone_number), self.db_service.get_conversation_context, phone_number)
+    
+    def get_client(self, phone_number):
+        return self._get(('client', phone_number), self.db_service.get_client, phone_number)
+    
+    def iter_appointments_by_phone(self, phone_number, **kwargs):
+        """Como DynamoDBService.iter_appointments_by_phone, contando a leitura e os itens lidos.
+        
+        Acima do limite de leituras levanta TurnLimitExceeded: um iterador
+        vazio seria confundido com um cliente sem agendamentos.
+        """
+        if not self._reserve('read'):
+            raise TurnLimitExceeded("Limite de leituras do turno atingido")
+        return self._count_items(self.db_service.iter_appointments_by_phone(phone_number, **kwargs))
+    
+    def create_appointment(self, **kwargs):
+        """Gravado na hora: o cliente só recebe a confirmação depois da gravação"""
+        if not self._reserve('write'):
+            return False, "Limite de gravações do turno atingido"
+        result = self.db_service.create_appointment(**kwargs)
+        with self._lock:
+            self.write_units += write_units(item_size(kwargs))
+        return result
+    
+    def save_conversation_context(self, phone_number, context):
+        """Guarda o contexto para gravar no flush (só a última versão é gravada)"""
+        with self._lock:
+            self._staged[('context', phone_number)] = context
+        return True, "Gravação pendente"
+    
+    def flush(self):
+        """Grava as escritas pendentes; retorna False se alguma falhar"""
+        with self._lock:
+            staged = list(self._staged.items())
+            self._staged = {}
+        
+        ok = True
+        for (_, phone_number), context in staged:
+            try:
+                success, message = self.db_service.save_conversation_context(phone_number, context)
+            except Exception as e:
+                success, message = False, str(e)
+            if not success:
+                print(f"Erro ao gravar contexto de {phone_number}: {message}")
+                ok = False
+            with self._lock:
+                self.writes += 1
+                self.write_units += write_units(item_size(context))
+        return ok
+    
+    def _get(self, key, read, *args):
+        with self._lock:
+            if key in self._memo:
+                self.memo_hits += 1
+                return self._memo[key]
+        if not self._reserve('read'):
+            return False, "Limite de leituras do turno atingido"
+        
+        result = read(*args)
+        with self._lock:
+            self._memo[key] = result
+            success, value = result
+            self.read_units += read_units(item_size(value) if success else 0)
+        return result
+    
+    def _reserve(self, kind):
+        with self._lock:
+            if kind == 'read':
+                if self.max_reads is not None and self.reads >= self.max_reads:
+                    self.capped += 1
+                    return False
+                self.reads += 1
+            else:
+                if self.max_writes is not None and self.writes >= self.max_writes:
+                    self.capped += 1
+                    return False
+                self.writes += 1
+            return True
+    
+    def _count_items(self, items):
+        size = 0
+        try:
+            for item in items:
+                size += item_size(item)
+                yield item
+        finally:
+            with self._lock:
+                self.read_units += read_units(size)
+
+class UnitOfWorkStats:
+    """Chamadas e capacidade (RCU/WCU estimadas) do DynamoDB por turno"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.turns = 0
+        self.memo_hits = 0
+        self.capped_turns = 0
+        self.reads = RollingStats()
+        self.writes = RollingStats()
+        self.read_units = RollingStats()
+        self.write_units = RollingStats()
+    
+    def record(self, uow):
+        with self._lock:
+            self.turns += 1
+            self.memo_hits += uow.memo_hits
+            self.capped_turns += bool(uow.capped)
+        self.reads.add(uow.reads)
+        self.writes.add(uow.writes)
+        self.read_units.add(uow.read_units)
+        self.write_units.add(uow.write_units)
+    
+    def get_stats(self):
+        with self._lock:
+            stats = {"turns": self.turns, "memo_hits": self.memo_hits, "capped_turns": self.capped_turns}
+        stats["reads_per_turn"] = self.reads.summary()
+        stats["writes_per_turn"] = self.writes.summary()
+        stats["rcu_per_turn"] = self.read_units.summary()
+        stats["wcu_per_turn"] = self.write_units.summary()
+        return stats
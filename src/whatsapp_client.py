@@ -0,0 +1,193 @@
+import random
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from config.config import WA_BUSINESS_API_TOKEN, WA_BUSINESS_API_PHONE_ID
+from config.config import WA_GRAPH_API_BASE_URL, WA_GRAPH_API_VERSION
+from config.config import WA_HTTP_CONNECT_TIMEOUT, WA_HTTP_READ_TIMEOUT, WA_HTTP_MAX_RETRIES, WA_HTTP_POOL_SIZE
+from rate_limiter import GLOBAL_RATE_LIMIT_CODES, PAIR_RATE_LIMIT_CODES, RateLimitDeferred
+
+# Respostas que valem nova tentativa
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+class WhatsAppClient:
+    """Cliente da WhatsApp Business API (Graph API) para envio de mensagens.
+    
+    Mantém uma sessão HTTP com pool de conexões keep-alive, cabeçalhos e URL
+    pré-montados, timeouts de conexão/leitura e novas tentativas com backoff
+    exponencial (com jitter) para respostas 429/5xx e falhas de conexão.
+    """
+    
+    def __init__(self, token=WA_BUSINESS_API_TOKEN, phone_id=WA_BUSINESS_API_PHONE_ID,
+                 base_url=WA_GRAPH_API_BASE_URL, api_version=WA_GRAPH_API_VERSION,
+                 connect_timeout=WA_HTTP_CONNECT_TIMEOUT, read_timeout=WA_HTTP_READ_TIMEOUT,
+                 max_retries=WA_HTTP_MAX_RETRIES, pool_size=WA_HTTP_POOL_SIZE,
+                 backoff_base=0.5, backoff_max=8.0, rate_limiter=None):
+        self.messages_url = f"{base_url.rstrip('/')}/{api_version}/{phone_id}/messages"
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.rate_limiter = rate_limiter
+        
+        self.session = requests.Session()
+        self.session.headers.update({
+            "Authorization": f"Bearer {token}",
+            "Content-Type": "application/json"
+        })
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+    
+    def send_text(self, phone_number, message_text):
+        """Envia mensagem de texto"""
+        return self.send(self.build_text_payload(phone_number, message_text))
+    
+    def send_buttons(self, phone_number, body_text, buttons):
+        """Envia mensagem com botões interativos (máximo 3)"""
+        return self.send(self.build_buttons_payload(phone_number, body_text, buttons))
+    
+    def send_list(self, phone_number, body_text, button_text, sections, header_text=None, footer_text=None):
+        """Envia mensagem com lista de opções (até 10 linhas no total)"""
+        interactive = {
+            "type": "list",
+            "body": {
+                "text": body_text
+            },
+            "action": {
+                "button": button_text,
+                "sections": sections
+            }
+        }
+        if header_text:
+            interactive["header"] = {"type": "text", "text": header_text}
+        if footer_text:
+            interactive["footer"] = {"text": footer_text}
+        
+        return self.send({
+            "messaging_product": "whatsapp",
+            "to": phone_number,
+            "type": "interactive",
+            "interactive": interactive
+        })
+    
+    def send_response(self, phone_number, response):
+        """Envia a resposta do agente ({"message", "buttons"}) no formato adequado"""
+        return self.send(self.build_response_payload(phone_number, response))
+    
+    def build_text_payload(self, phone_number, message_text):
+        """Monta o payload de uma mensagem de texto"""
+        return {
+            "messaging_product": "whatsapp",
+            "to": phone_number,
+            "type": "text",
+            "text": {
+                "body": message_text
+            }
+        }
+    
+    def build_buttons_payload(self, phone_number, body_text, buttons):
+        """Monta o payload de uma mensagem com botões interativos"""
+        return {
+            "messaging_product": "whatsapp",
+            "to": phone_number,
+            "type": "interactive",
+            "interactive": {
+                "type": "button",
+                "body": {
+                    "text": body_text
+                },
+                "action": {
+                    "buttons": buttons
+                }
+            }
+        }
+    
+    def build_response_payload(self, phone_number, response):
+        """Monta o payload da resposta do agente ({"message", "buttons"})"""
+        if response.get('buttons'):
+            return self.build_buttons_payload(phone_number, response['message'], response['buttons'])
+        return self.build_text_payload(phone_number, response['message'])
+    
+    def send(self, payload, block=True):
+        """Envia um payload para o endpoint de mensagens.
+        
+        Retorna (True, resposta da API) ou (False, descrição do erro). Um
+        timeout de leitura retorna (None, descrição do erro): a API pode ter
+        recebido a mensagem, então quem chama não deve reenviá-la. Com
+        `block=False`, em vez de esperar a vez no limitador de envio levanta
+        RateLimitDeferred com o tempo de espera (nada foi enviado).
+        """
+        phone_number = payload.get('to')
+        error = None
+        
+        for attempt in range(self.max_retries + 1):
+            retry_after = None
+            if self.rate_limiter is not None:
+                # Espera a vez na fila do limitador em vez de descartar a mensagem
+                wait = self.rate_limiter.acquire(phone_number, block=block)
+                if not block and wait > 0:
+                    raise RateLimitDeferred(wait)
+            
+            try:
+                response = self.session.post(self.messages_url, json=payload, timeout=self.timeout)
+            except (requests.exceptions.ConnectTimeout, requests.exceptions.ConnectionError) as e:
+                # A requisição não chegou à API; é seguro tentar de novo
+                error = f"Erro de conexão: {str(e)}"
+            except requests.exceptions.RequestException as e:
+                # Timeout de leitura: a mensagem pode ter sido entregue, não reenvia
+                print(f"Erro ao enviar mensagem WhatsApp para {phone_number}: {str(e)}")
+                return None, str(e)
+            else:
+                if response.status_code == 200:
+                    if self.rate_limiter is not None:
+                        self.rate_limiter.record_success()
+                    print(f"Mensagem enviada com sucesso para {phone_number}")
+                    return True, _response_json(response)
+                
+                error = f"{response.status_code} - {response.text}"
+                retry_after = response.headers.get('Retry-After')
+                error_code = _error_code(response)
+                rate_limited = response.status_code == 429 or error_code in GLOBAL_RATE_LIMIT_CODES | PAIR_RATE_LIMIT_CODES
+                
+                if rate_limited and self.rate_limiter is not None:
+                    # O limitador suspende o envio; a próxima tentativa espera no acquire
+                    delay = self.rate_limiter.penalize(phone_number, error_code, retry_after)
+                    print(f"Limite de envio atingido (código {error_code}), aguardando {delay:.1f}s")
+                    continue
+                
+                if response.status_code not in RETRYABLE_STATUS_CODES and not rate_limited:
+                    print(f"Erro ao enviar mensagem: {error}")
+                    return False, error
+            
+            if attempt < self.max_retries:
+                time.sleep(self._backoff_delay(attempt, retry_after))
+        
+        print(f"Erro ao enviar mensagem após {self.max_retries + 1} tentativas: {error}")
+        return False, error
+    
+    def _backoff_delay(self, attempt, retry_after=None):
+        """Backoff exponencial com jitter completo, respeitando Retry-After"""
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+        if retry_after:
+            try:
+                delay = max(delay, float(retry_after))
+            except ValueError:
+                pass
+        return delay
+    
+    def close(self):
+        self.session.close()
+
+def _error_code(response):
+    """Extrai o código de erro da Graph API ({"error": {"code": ...}})"""
+    error = _response_json(response).get('error')
+    if isinstance(error, dict):
+        return error.get('code')
+    return None
+
+def _response_json(response):
+    try:
+        return response.json()
+    except ValueError:
+        return {}
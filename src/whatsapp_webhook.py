@@ -1,11 +1,84 @@
 from flask import Flask, request, jsonify
-import requests
 import json
 import os
-from config.config import WA_BUSINESS_API_TOKEN, WA_BUSINESS_API_PHONE_ID, WA_BUSINESS_API_VERIFY_TOKEN
+import re
+import threading
+from config.config import WA_BUSINESS_API_VERIFY_TOKEN, WA_BUSINESS_API_PHONE_ID
+from config.config import WEBHOOK_ASYNC_MODE, MESSAGE_SPOOL_PATH, SPOOL_MAX_ATTEMPTS, SPOOL_RETENTION_HOURS
+from config.config import DISPATCHER_SHARDS, DISPATCHER_WORKERS
+from config.config import DEDUP_TTL_SECONDS, DEDUP_MAX_ENTRIES
+from config.config import COALESCE_WINDOW_MS, COALESCE_MAX_WAIT_MS
+from config.config import OUTBOX_ENABLED, OUTBOX_PATH, OUTBOX_WORKERS, OUTBOX_MAX_ATTEMPTS, OUTBOX_RETENTION_HOURS
+from message_spool import MessageSpool, SpoolDrainer
+from conversation_dispatcher import ConversationDispatcher
+from message_deduplicator import MessageDeduplicator
+from message_coalescer import MessageCoalescer
+from whatsapp_client import WhatsAppClient
+from rate_limiter import OutboundRateLimiter
+from outbox import Outbox, OutboxDrainer
 
 app = Flask(__name__)
 
+# Cliente único (pool de conexões e limites de envio compartilhados) para envio de mensagens
+whatsapp_client = WhatsAppClient(rate_limiter=OutboundRateLimiter(phone_id=WA_BUSINESS_API_PHONE_ID))
+
+# Mensagens do mesmo telefone são processadas em ordem; telefones diferentes em paralelo
+dispatcher = ConversationDispatcher(num_shards=DISPATCHER_SHARDS, max_workers=DISPATCHER_WORKERS)
+
+# Descarta reentregas do webhook (main.py troca pelo modo DynamoDB se configurado)
+deduplicator = MessageDeduplicator(max_entries=DEDUP_MAX_ENTRIES, ttl_seconds=DEDUP_TTL_SECONDS)
+
+# Agrupa textos enviados em rajada pelo mesmo cliente em um único turno do agente
+coalescer = MessageCoalescer(
+    lambda message, value: dispatch_message(message, value),
+    window_ms=COALESCE_WINDOW_MS,
+    max_wait_ms=COALESCE_MAX_WAIT_MS
+)
+
+# No modo assíncrono as mensagens são gravadas no spool e processadas em background
+message_spool = MessageSpool(MESSAGE_SPOOL_PATH, max_attempts=SPOOL_MAX_ATTEMPTS,
+                             retention_seconds=SPOOL_RETENTION_HOURS * 3600) if WEBHOOK_ASYNC_MODE else None
+spool_drainer = None
+
+# Respostas são gravadas no outbox e enviadas em background, com novas tentativas
+# (criado por start_outbox_workers; sem os workers o envio é feito na hora)
+outbox = None
+outbox_drainer = None
+
+# Resposta pré-montada para callbacks que não trazem mensagens
+SUCCESS_BODY = json.dumps({"status": "success"})
+
+# Resposta ao cliente quando a mensagem não pôde ser processada
+ERROR_REPLY = {"message": "Desculpe, ocorreu um erro. Tente novamente em alguns instantes."}
+
+# Contadores do filtro de entrada
+ingress_stats = {"messages": 0, "statuses": 0, "other": 0}
+ingress_stats_lock = threading.Lock()
+
+# Chaves procuradas nos bytes do corpo: o nome seguido de ":" (todo callback
+# traz o valor "field": "messages", que não pode contar como mensagem)
+MESSAGES_KEY = re.compile(rb'"messages"\s*:')
+STATUSES_KEY = re.compile(rb'"statuses"\s*:')
+
+def classify_payload(raw_body):
+    """Classifica o corpo do webhook sem fazer parse do JSON.
+    
+    Procura a chave "messages" (seguida de ":"), que só existe quando o
+    payload traz mensagens; o valor "field": "messages" dos callbacks de
+    status não conta. Aspas dentro do texto das mensagens vêm escapadas e
+    não formam a chave.
+    """
+    if MESSAGES_KEY.search(raw_body):
+        return 'messages'
+    if STATUSES_KEY.search(raw_body):
+        return 'statuses'
+    return 'other'
+
+def get_ingress_stats():
+    """Quantidade de requisições do webhook por tipo de payload"""
+    with ingress_stats_lock:
+        return dict(ingress_stats)
+
 # Webhook para verificação do WhatsApp
 @app.route('/webhook', methods=['GET'])
 def verify_webhook():
@@ -24,11 +97,23 @@ def verify_webhook():
 @app.route('/webhook', methods=['POST'])
 def receive_message():
     """Recebe mensagens do WhatsApp Business API"""
+    # Ids registrados no dedup que ainda não foram gravados no spool nem despachados
+    registered = []
     try:
-        data = request.get_json()
-        print(f"Dados recebidos: {json.dumps(data, indent=2)}")
+        raw_body = request.get_data()
+        payload_type = classify_payload(raw_body)
+        with ingress_stats_lock:
+            ingress_stats[payload_type] += 1
+        
+        # Callbacks de status (sent, delivered, read) não precisam de processamento
+        if payload_type != 'messages':
+            return app.response_class(SUCCESS_BODY, status=200, mimetype='application/json')
+        
+        data = json.loads(raw_body)
         
         # Verifica se há mensagens na requisição
+        pending = []
+        futures = []
         if 'entry' in data:
             for entry in data['entry']:
                 if 'changes' in entry:
@@ -36,15 +121,100 @@ def receive_message():
                         if 'value' in change and 'messages' in change['value']:
                             messages = change['value']['messages']
                             for message in messages:
-                                # Processa cada mensagem
-                                process_message(message, change['value'])
+                                if deduplicator.is_duplicate(message.get('id')):
+                                    print(f"Mensagem duplicada ignorada: {message.get('id')}")
+                                    continue
+                                registered.append(message.get('id'))
+                                
+                                if message_spool is not None:
+                                    pending.append((message, change['value']))
+                                else:
+                                    # Processa cada mensagem
+                                    futures.append(route_message(message, change['value']))
+                                    registered.pop()
+        
+        # Modo assíncrono: só persiste as mensagens e responde imediatamente
+        if pending:
+            message_spool.append_many(pending)
+            registered = []
+        
+        # Modo síncrono: aguarda o processamento antes de responder
+        for future in futures:
+            future.result()
         
         return jsonify({"status": "success"}), 200
     
     except Exception as e:
         print(f"Erro ao processar mensagem: {str(e)}")
+        # O WhatsApp reenvia após o 500; a reentrega não pode ser tratada como duplicada
+        for message_id in registered:
+            deduplicator.forget(message_id)
         return jsonify({"status": "error", "message": str(e)}), 500
 
+def start_spool_workers():
+    """Inicia os workers que consomem o spool (apenas no modo assíncrono)"""
+    global spool_drainer
+    
+    if message_spool is None or spool_drainer is not None:
+        return
+    
+    spool_drainer = SpoolDrainer(message_spool, submit=route_message, max_in_flight=DISPATCHER_WORKERS * 4,
+                                 on_dead=report_failure)
+    spool_drainer.start()
+
+def start_outbox_workers():
+    """Abre o outbox e inicia os workers que enviam suas mensagens"""
+    global outbox, outbox_drainer
+    
+    if not OUTBOX_ENABLED or outbox_drainer is not None:
+        return
+    
+    outbox = Outbox(
+        OUTBOX_PATH,
+        max_attempts=OUTBOX_MAX_ATTEMPTS,
+        retention_seconds=OUTBOX_RETENTION_HOURS * 3600
+    )
+    outbox_drainer = OutboxDrainer(outbox, whatsapp_client, num_workers=OUTBOX_WORKERS)
+    outbox_drainer.start()
+
+def send_reply(phone_number, response):
+    """Envia uma resposta do agente ({"message", "buttons"}) ao cliente.
+    
+    Com o outbox ativo a mensagem é apenas gravada localmente e o envio
+    acontece em background; sem ele, o envio é feito na hora.
+    """
+    payload = whatsapp_client.build_response_payload(phone_number, response)
+    if outbox is not None:
+        outbox.enqueue(phone_number, payload)
+        return True
+    
+    success, _ = whatsapp_client.send(payload)
+    return success
+
+def report_failure(message, value=None, error=None):
+    """Avisa o cliente que a mensagem não pôde ser processada"""
+    phone_number = message.get('from')
+    if phone_number:
+        send_reply(phone_number, ERROR_REPLY)
+
+def route_message(message, value):
+    """Agrupa mensagens de texto e despacha as demais, mantendo a ordem"""
+    if message.get('type') == 'text':
+        return coalescer.add(message, value)
+    
+    # Uma mensagem interativa libera antes o texto pendente do mesmo telefone
+    coalescer.flush(message.get('from'))
+    return dispatch_message(message, value)
+
+def dispatch_message(message, value):
+    """Enfileira a mensagem no shard do telefone e retorna um Future"""
+    return dispatcher.submit(message.get('from'), run_message, message, value)
+
+def run_message(message, value):
+    """Processa uma mensagem já despachada"""
+    # Busca process_message em tempo de execução, pois main.py a substitui
+    process_message(message, value)
+
 def process_message(message, value):
     """Processa uma mensagem individual do WhatsApp"""
     try:
@@ -60,7 +230,7 @@ def process_message(message, value):
             response_text = generate_ai_response(text_content, phone_number)
             
             # Envia resposta
-            send_whatsapp_message(phone_number, response_text)
+            send_reply(phone_number, {"message": response_text})
         
         elif message_type == 'interactive':
             # Processa mensagens interativas (botões, listas)
@@ -69,11 +239,66 @@ def process_message(message, value):
             
             # Processa a resposta interativa
             response_text = process_interactive_response(interactive_data, phone_number)
-            send_whatsapp_message(phone_number, response_text)
+            send_reply(phone_number, {"message": response_text})
     
     except Exception as e:
         print(f"Erro ao processar mensagem individual: {str(e)}")
 
+def make_agent_handler(agent):
+    """process_message que responde com o SalonAIAgent (instalado por main.py).
+    
+    No modo assíncrono, uma falha antes de a resposta ser gravada/enviada é
+    levantada para o SpoolDrainer, que tenta de novo até SPOOL_MAX_ATTEMPTS
+    e só então avisa o cliente (report_failure). Sem o spool não há nova
+    tentativa e o aviso de erro é enviado na hora.
+    """
+    def process_message_with_ai(message, value):
+        """Processa uma mensagem individual do WhatsApp usando IA"""
+        replied = False
+        try:
+            # Extrai informações da mensagem
+            phone_number = message['from']
+            message_type = message['type']
+            
+            if message_type == 'text':
+                text_content = message['text']['body']
+                print(f"Mensagem de texto de {phone_number}: {text_content}")
+                
+                # Usa o agente de IA para gerar resposta
+                ai_response = agent.process_message(phone_number, text_content)
+                
+                # Envia resposta
+                send_reply(phone_number, ai_response)
+                replied = True
+            
+            elif message_type == 'interactive':
+                # Processa mensagens interativas (botões, listas)
+                interactive_data = message['interactive']
+                print(f"Mensagem interativa de {phone_number}: {interactive_data}")
+                
+                # Extrai a seleção do usuário (botão ou item de lista)
+                reply_type = interactive_data['type']
+                if reply_type in ('button_reply', 'list_reply'):
+                    reply_id = interactive_data[reply_type]['id']
+                    reply_title = interactive_data[reply_type]['title']
+                    
+                    # Ids gerados pelo agente avançam a conversa sem passar pelo LLM
+                    ai_response = agent.process_reply(phone_number, reply_id, reply_title)
+                    
+                    # Envia resposta
+                    send_reply(phone_number, ai_response)
+                    replied = True
+        
+        except Exception as e:
+            print(f"Erro ao processar mensagem individual: {str(e)}")
+            if message_spool is not None and not replied:
+                # O spool tenta de novo; o cliente é avisado se a mensagem for descartada
+                raise
+            # Envia mensagem de erro para o usuário
+            report_failure(message)
+    
+    return process_message_with_ai
+
 def generate_ai_response(user_message, phone_number):
     """Gera resposta usando IA (placeholder - será implementado na próxima fase)"""
     # Por enquanto, uma resposta simples
@@ -84,70 +309,6 @@ def process_interactive_response(interactive_data, phone_number):
     # Implementar lógica para botões e listas
     return "Obrigado pela sua seleção! Em breve processaremos sua escolha."
 
-def send_whatsapp_message(phone_number, message_text):
-    """Envia mensagem via WhatsApp Business API"""
-    try:
-        url = f"https://graph.facebook.com/v18.0/{WA_BUSINESS_API_PHONE_ID}/messages"
-        
-        headers = {
-            "Authorization": f"Bearer {WA_BUSINESS_API_TOKEN}",
-            "Content-Type": "application/json"
-        }
-        
-        payload = {
-            "messaging_product": "whatsapp",
-            "to": phone_number,
-            "type": "text",
-            "text": {
-                "body": message_text
-            }
-        }
-        
-        response = requests.post(url, headers=headers, json=payload)
-        
-        if response.status_code == 200:
-            print(f"Mensagem enviada com sucesso para {phone_number}")
-        else:
-            print(f"Erro ao enviar mensagem: {response.status_code} - {response.text}")
-    
-    except Exception as e:
-        print(f"Erro ao enviar mensagem WhatsApp: {str(e)}")
-
-def send_whatsapp_buttons(phone_number, body_text, buttons):
-    """Envia mensagem com botões interativos"""
-    try:
-        url = f"https://graph.facebook.com/v18.0/{WA_BUSINESS_API_PHONE_ID}/messages"
-        
-        headers = {
-            "Authorization": f"Bearer {WA_BUSINESS_API_TOKEN}",
-            "Content-Type": "application/json"
-        }
-        
-        payload = {
-            "messaging_product": "whatsapp",
-            "to": phone_number,
-            "type": "interactive",
-            "interactive": {
-                "type": "button",
-                "body": {
-                    "text": body_text
-                },
-                "action": {
-                    "buttons": buttons
-                }
-            }
-        }
-        
-        response = requests.post(url, headers=headers, json=payload)
-        
-        if response.status_code == 200:
-            print(f"Mensagem com botões enviada com sucesso para {phone_number}")
-        else:
-            print(f"Erro ao enviar mensagem com botões: {response.status_code} - {response.text}")
-    
-    except Exception as e:
-        print(f"Erro ao enviar mensagem com botões: {str(e)}")
-
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=True)
 
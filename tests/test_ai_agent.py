@@ -1,13 +1,15 @@
 import unittest
 import sys
 import os
+import threading
 from unittest.mock import Mock, patch, MagicMock
 from datetime import datetime, timedelta
 
 # Adiciona o diretório src ao path
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
 
-from ai_agent import SalonAIAgent
+from ai_agent import SalonAIAgent, IntentEngine
+from service_catalog import ServiceCatalog
 
 class TestSalonAIAgent(unittest.TestCase):
     def setUp(self):
@@ -15,16 +17,17 @@ class TestSalonAIAgent(unittest.TestCase):
         # Mock dos serviços externos
         with patch('ai_agent.DynamoDBService'), \
              patch('ai_agent.GoogleCalendarService'), \
-             patch('ai_agent.genai.configure'):
+             patch('ai_agent.create_backend'):
             
             self.agent = SalonAIAgent()
             
-            # Mock do modelo Gemini
-            self.agent.model = Mock()
+            # Mock do LLM
+            self.agent.llm = Mock()
             
             # Mock dos serviços
             self.agent.db_service = Mock()
             self.agent.calendar_service = Mock()
+            self.agent.service_catalog = ServiceCatalog(self.agent.db_service)
     
     def test_process_message_greeting(self):
         """Testa o processamento de mensagem de saudação"""
@@ -33,16 +36,15 @@ class TestSalonAIAgent(unittest.TestCase):
         self.agent.db_service.get_client.return_value = (False, {})
         self.agent.db_service.save_conversation_context.return_value = (True, "")
         
-        # Mock da resposta do Gemini
-        mock_response = Mock()
-        mock_response.text = '''
+        # Mock da resposta do LLM
+        mock_response = '''
         {
             "message": "Olá! Bem-vindo ao nosso salão! Como posso ajudá-lo hoje?",
             "action": "show_services",
             "data": {}
         }
         '''
-        self.agent.model.generate_content.return_value = mock_response
+        self.agent.llm.generate.return_value = mock_response
         
         # Mock dos serviços disponíveis
         self.agent.db_service.get_all_services.return_value = (True, [
@@ -77,6 +79,21 @@ class TestSalonAIAgent(unittest.TestCase):
         self.assertIsNotNone(result["buttons"])
         self.assertEqual(len(result["buttons"]), 3)  # Máximo 3 botões
     
+    def test_show_services_button_titles_fit_whatsapp_limit(self):
+        """Testa que os títulos dos botões cabem em 20 caracteres e os preços vão no texto"""
+        self.agent.db_service.get_all_services.return_value = (True, [
+            {"service_id": "corte_masculino", "name": "Corte Masculino", "price": 25.0},
+            {"service_id": "hidratacao", "name": "Hidratação Profunda com Ozônio", "price": 40.0}
+        ])
+        
+        result = self.agent.show_services("Nossos serviços:")
+        
+        titles = [button["reply"]["title"] for button in result["buttons"]]
+        self.assertEqual(titles[0], "Corte Masculino")
+        self.assertTrue(all(len(title) <= 20 for title in titles))
+        self.assertIn("Corte Masculino - R$ 25.00", result["message"])
+        self.assertIn("Hidratação Profunda com Ozônio - R$ 40.00", result["message"])
+    
     def test_check_availability_success(self):
         """Testa verificação de disponibilidade com sucesso"""
         # Mock do serviço
@@ -225,7 +242,7 @@ class TestSalonAIAgent(unittest.TestCase):
                 "status": "scheduled"
             }
         ]
-        self.agent.db_service.get_appointments_by_phone.return_value = (True, mock_appointments)
+        self.agent.db_service.iter_appointments_by_phone.return_value = iter(mock_appointments)
         
         # Testa a função
         result = self.agent.show_appointments("5511999999999", "Seus agendamentos:")
@@ -235,11 +252,14 @@ class TestSalonAIAgent(unittest.TestCase):
         self.assertIn("agendamentos", result["message"])
         self.assertIn(future_date, result["message"])
         self.assertIn("Corte Feminino", result["message"])
+        kwargs = self.agent.db_service.iter_appointments_by_phone.call_args.kwargs
+        self.assertEqual(kwargs["from_date"], datetime.now().strftime('%Y-%m-%d'))
+        self.assertEqual(kwargs["status"], "scheduled")
     
     def test_show_appointments_no_appointments(self):
         """Testa exibição quando não há agendamentos"""
         # Mock sem agendamentos
-        self.agent.db_service.get_appointments_by_phone.return_value = (True, [])
+        self.agent.db_service.iter_appointments_by_phone.return_value = iter([])
         
         # Testa a função
         result = self.agent.show_appointments("5511999999999", "Seus agendamentos:")
@@ -247,6 +267,382 @@ class TestSalonAIAgent(unittest.TestCase):
         # Verifica o resultado
         self.assertIn("message", result)
         self.assertIn("não possui agendamentos", result["message"])
+    
+    def test_show_appointments_read_refused(self):
+        """Testa que uma leitura recusada pelo limite do turno não aparece como lista vazia"""
+        from unit_of_work import TurnUnitOfWork
+        uow = TurnUnitOfWork(self.agent.db_service, max_reads=0)
+        
+        result = self.agent.show_appointments("5511999999999", "Seus agendamentos:", uow=uow)
+        
+        self.assertIn("Não consegui consultar seus agendamentos", result["message"])
+        self.assertNotIn("não possui agendamentos", result["message"])
+        self.agent.db_service.iter_appointments_by_phone.assert_not_called()
+    
+    def test_service_reply_skips_llm(self):
+        """Testa que o botão de serviço avança a conversa sem chamar o LLM"""
+        self.agent.db_service.get_conversation_context.return_value = (True, {"state": "service_selection", "data": {}})
+        self.agent.db_service.get_service.return_value = (True, {"name": "Manicure", "duration_minutes": 45})
+        
+        result = self.agent.process_reply("5511999999999", "service_manicure", "Manicure - R$ 20.00")
+        
+        self.assertIn("Para qual data", result["message"])
+        self.agent.llm.generate.assert_not_called()
+        saved_context = self.agent.db_service.save_conversation_context.call_args[0][1]
+        self.assertEqual(saved_context["state"], "date_selection")
+        self.assertEqual(saved_context["data"]["service_id"], "manicure")
+        self.assertEqual(self.agent.get_reply_stats()["handled"], 1)
+    
+    def test_service_reply_with_known_date_checks_availability(self):
+        """Testa que o botão de serviço mostra horários quando a data já é conhecida"""
+        context = {"state": "service_selection", "data": {"date": "2026-12-25"}}
+        self.agent.db_service.get_conversation_context.return_value = (True, context)
+        self.agent.db_service.get_service.return_value = (True, {"name": "Manicure", "duration_minutes": 45})
+        self.agent.calendar_service.get_available_slots.return_value = [
+            {"start": datetime(2026, 12, 25, 14, 0), "formatted": "14:00"}
+        ]
+        
+        result = self.agent.process_reply("5511999999999", "service_manicure", "Manicure - R$ 20.00")
+        
+        self.assertEqual(result["buttons"][0]["reply"]["id"], "time_14:00")
+        self.assertEqual(context["state"], "time_selection")
+        self.agent.llm.generate.assert_not_called()
+    
+    def test_response_cache_is_shared_across_clients(self):
+        """Testa que clientes com a mesma conversa até aqui compartilham a resposta do cache"""
+        self.agent.llm.generate.return_value = '{"message": "Perfeito!", "action": "continue_conversation", "data": {}}'
+        history = [{"role": "client", "text": "Quero manicure"}, {"role": "agent", "text": "Posso confirmar às 14:00?"}]
+        first = {"state": "confirmation", "data": {"service_id": "manicure", "client_name": "Maria"},
+                 "last_action": "check_availability", "history": list(history)}
+        second = {"state": "confirmation", "data": {"service_id": "manicure", "client_name": "João"},
+                  "last_action": "check_availability", "history": list(history)}
+        
+        self.agent.generate_ai_response("sim", first)
+        result = self.agent.generate_ai_response("sim", second)
+        
+        self.assertEqual(result["message"], "Perfeito!")
+        self.assertEqual(self.agent.llm.generate.call_count, 1)
+        
+        # Outra pergunta no turno anterior: "sim" tem outro sentido
+        self.agent.generate_ai_response("sim", dict(second, last_action="show_services"))
+        self.assertEqual(self.agent.llm.generate.call_count, 2)
+    
+    def test_response_cache_is_not_shared_across_histories(self):
+        """Testa que a mesma mensagem com históricos diferentes não reaproveita a resposta"""
+        self.agent.llm.generate.side_effect = [
+            '{"message": "Temos corte feminino e masculino.", "action": "continue_conversation", "data": {}}',
+            '{"message": "A hidratação custa R$ 80,00.", "action": "continue_conversation", "data": {}}'
+        ]
+        first = {"state": "greeting", "data": {},
+                 "history": [{"role": "client", "text": "Vocês fazem corte?"}, {"role": "agent", "text": "Fazemos sim!"}]}
+        second = {"state": "greeting", "data": {},
+                  "history": [{"role": "client", "text": "E hidratação?"}, {"role": "agent", "text": "Fazemos sim!"}]}
+        
+        self.agent.generate_ai_response("quanto custa?", first)
+        result = self.agent.generate_ai_response("quanto custa?", second)
+        
+        self.assertEqual(result["message"], "A hidratação custa R$ 80,00.")
+        self.assertEqual(self.agent.llm.generate.call_count, 2)
+        self.assertEqual(self.agent.response_cache.get_stats()["hits"], 0)
+    
+    def test_service_reply_without_slots_stays_in_date_selection(self):
+        """Testa que sem horários na data conhecida a conversa não fica em time_selection"""
+        context = {"state": "service_selection", "data": {"date": "2026-12-25"}}
+        self.agent.db_service.get_conversation_context.return_value = (True, context)
+        self.agent.db_service.get_service.return_value = (True, {"name": "Manicure", "duration_minutes": 45})
+        self.agent.calendar_service.get_available_slots.return_value = []
+        
+        result = self.agent.process_reply("5511999999999", "service_manicure", "Manicure")
+        
+        self.assertIsNone(result["buttons"])
+        self.assertIn("outra data", result["message"])
+        self.assertEqual(context["state"], "date_selection")
+    
+    def test_time_reply_does_not_fall_back_after_booking(self):
+        """Testa que um erro depois da gravação não leva a seleção ao LLM"""
+        context = {"state": "time_selection", "data": {"service_id": "manicure", "date": "2026-12-25",
+                                                       "client_name": "Maria"}}
+        self.agent.db_service.get_conversation_context.return_value = (True, context)
+        self.agent.db_service.create_appointment.return_value = (True, "apt-1")
+        self.agent.db_service.get_service.return_value = (True, {"name": "Manicure", "duration_minutes": 45, "price": 20.0})
+        self.agent.calendar_service.create_appointment.side_effect = Exception("Calendar fora do ar")
+        
+        result = self.agent.process_reply("5511999999999", "time_14:00", "14:00")
+        
+        self.assertIn("Agendamento confirmado", result["message"])
+        self.agent.db_service.create_appointment.assert_called_once()
+        self.agent.llm.generate.assert_not_called()
+        self.assertEqual(self.agent.get_reply_stats()["fallback"], 0)
+    
+    def test_time_reply_creates_appointment(self):
+        """Testa que o botão de horário conclui o agendamento com os dados do contexto"""
+        context = {"state": "time_selection", "data": {"service_id": "manicure", "date": "2026-12-25"}}
+        self.agent.db_service.get_conversation_context.return_value = (True, context)
+        self.agent.db_service.get_client.return_value = (True, {"name": "Maria"})
+        self.agent.db_service.create_appointment.return_value = (True, "apt-1")
+        self.agent.db_service.get_service.return_value = (True, {"name": "Manicure", "duration_minutes": 45, "price": 20.0})
+        self.agent.calendar_service.create_appointment.return_value = (True, {})
+        
+        result = self.agent.process_reply("5511999999999", "time_14:00", "14:00")
+        
+        self.assertIn("Agendamento confirmado", result["message"])
+        self.agent.db_service.create_appointment.assert_called_once_with(
+            phone_number="5511999999999",
+            service_id="manicure",
+            appointment_date="2026-12-25",
+            appointment_time="14:00",
+            client_name="Maria",
+            service={"name": "Manicure", "duration_minutes": 45, "price": 20.0}
+        )
+        self.assertEqual(context["state"], "completed")
+        self.agent.llm.generate.assert_not_called()
+    
+    def test_unknown_reply_falls_back_to_llm(self):
+        """Testa que ids desconhecidos ou sem contexto seguem para o LLM"""
+        self.agent.db_service.get_conversation_context.return_value = (True, {"state": "greeting", "data": {}})
+        self.agent.db_service.get_client.return_value = (False, {})
+        mock_response = '{"message": "Certo!", "action": "continue_conversation", "data": {}}'
+        self.agent.llm.generate.return_value = mock_response
+        
+        result = self.agent.process_reply("5511999999999", "time_14:00", "14:00")
+        
+        self.assertEqual(result["message"], "Certo!")
+        self.assertIn("Selecionei: 14:00", self.agent.llm.generate.call_args[0][0])
+        self.assertEqual(self.agent.get_reply_stats()["fallback"], 1)
+    
+    def test_intent_engine_classifies_common_messages(self):
+        """Testa o classificador local com saudações, pedidos e datas"""
+        engine = IntentEngine(threshold=0.75)
+        today = datetime(2026, 10, 18).date()  # domingo
+        
+        self.assertEqual(engine.classify("Oi, tudo bem?", today)["intent"], "greeting")
+        self.assertEqual(engine.classify("Bom dia! Quais serviços?", today)["intent"], "show_services")
+        self.assertEqual(engine.classify("meus agendamentos", today)["intent"], "show_appointments")
+        self.assertEqual(engine.classify("Quero cancelar", today)["intent"], "cancel_appointment")
+        self.assertEqual(engine.classify("amanhã", today)["date"], "2026-10-19")
+        self.assertEqual(engine.classify("dia 5", today)["date"], "2026-11-05")
+        
+        match = engine.classify("sexta-feira às 14h", today)
+        self.assertEqual((match["date"], match["time"]), ("2026-10-23", "14:00"))
+    
+    def test_intent_engine_leaves_ambiguous_messages_to_llm(self):
+        """Testa que mensagens com partes não reconhecidas ficam para o LLM"""
+        engine = IntentEngine(threshold=0.75)
+        
+        self.assertIsNone(engine.classify("quero agendar manicure amanhã"))
+        self.assertIsNone(engine.classify("cancelar e ver meus agendamentos"))
+        self.assertIsNone(engine.classify("31/02"))
+    
+    def test_date_message_checks_availability_without_llm(self):
+        """Testa que uma data solta com serviço no contexto verifica disponibilidade direto"""
+        context = {"state": "date_selection", "data": {"service_id": "manicure"}}
+        self.agent.db_service.get_conversation_context.return_value = (True, context)
+        self.agent.db_service.get_client.return_value = (False, {})
+        self.agent.db_service.get_service.return_value = (True, {"name": "Manicure", "duration_minutes": 45})
+        self.agent.calendar_service.get_available_slots.return_value = [
+            {"start": datetime(2026, 12, 25, 10, 0), "formatted": "10:00"}
+        ]
+        
+        result = self.agent.process_message("5511999999999", "25/12")
+        
+        self.assertEqual(result["buttons"][0]["reply"]["id"], "time_10:00")
+        self.assertTrue(context["data"]["date"].endswith("-12-25"))
+        self.agent.llm.generate.assert_not_called()
+        self.assertEqual(self.agent.get_intent_stats()["absorbed"], 1)
+    
+    def test_repeated_prompt_is_served_from_cache(self):
+        """Testa que a mesma mensagem no mesmo estado não chama o LLM de novo"""
+        self.agent.db_service.get_conversation_context.side_effect = lambda phone: (True, {"state": "greeting", "data": {}})
+        self.agent.db_service.get_client.return_value = (False, {})
+        mock_response = '{"message": "Posso ajudar com agendamentos!", "action": "continue_conversation", "data": {}}'
+        self.agent.llm.generate.return_value = mock_response
+        
+        first = self.agent.process_message("5511999999999", "vocês abrem no feriado?")
+        second = self.agent.process_message("5511888888888", "Vocês abrem no feriado")
+        
+        self.assertEqual(first, second)
+        self.assertEqual(self.agent.llm.generate.call_count, 1)
+        self.assertEqual(self.agent.response_cache.get_stats()["hits"], 1)
+    
+    def test_paraphrase_is_served_from_similarity_index(self):
+        """Testa que uma paráfrase no mesmo estado reaproveita a resposta do LLM"""
+        self.agent.db_service.get_conversation_context.side_effect = lambda phone: (True, {"state": "greeting", "data": {}})
+        self.agent.db_service.get_client.return_value = (False, {})
+        mock_response = '{"message": "Posso ajudar com agendamentos!", "action": "continue_conversation", "data": {}}'
+        self.agent.llm.generate.return_value = mock_response
+        
+        first = self.agent.process_message("5511999999999", "vocês abrem no feriado?")
+        second = self.agent.process_message("5511888888888", "voces abrem em feriados")
+        
+        self.assertEqual(first, second)
+        self.assertEqual(self.agent.llm.generate.call_count, 1)
+        self.assertEqual(self.agent.similarity_index.get_stats()["hits"], 1)
+    
+    def test_previous_turns_are_sent_to_llm(self):
+        """Testa que as mensagens anteriores entram no prompt do turno seguinte"""
+        saved = {}
+        self.agent.db_service.get_conversation_context.side_effect = lambda phone: (True, saved.get(phone, {"state": "greeting", "data": {}}))
+        self.agent.db_service.save_conversation_context.side_effect = lambda phone, context: saved.update({phone: context})
+        self.agent.db_service.get_client.return_value = (False, {})
+        mock_response = '{"message": "Claro! Vocês podem vir juntas.", "action": "continue_conversation", "data": {}}'
+        self.agent.llm.generate.return_value = mock_response
+        
+        self.agent.process_message("5511999999999", "posso levar minha filha?")
+        self.agent.process_message("5511999999999", "ela tem 8 anos")
+        
+        prompt = self.agent.llm.generate.call_args[0][0]
+        self.assertIn("Cliente: posso levar minha filha?", prompt)
+        self.assertIn("Atendente: Claro! Vocês podem vir juntas.", prompt)
+        self.assertEqual(len(saved["5511999999999"]["history"]), 4)
+        self.assertEqual(self.agent.get_llm_stats()["queue_wait_ms"]["greeting"]["count"], 2)
+    
+    def test_malformed_llm_json_is_repaired(self):
+        """Testa que JSON com aspas simples e texto extra ainda executa a ação"""
+        self.agent.db_service.get_conversation_context.return_value = (True, {"state": "greeting", "data": {}})
+        self.agent.db_service.get_client.return_value = (False, {})
+        self.agent.db_service.get_all_services.return_value = (True, [
+            {"service_id": "manicure", "name": "Manicure", "price": 20.0}
+        ])
+        self.agent.llm.generate.return_value = "Claro! {'message': 'Veja nossos serviços', 'action': 'show_services', 'data': {},} Até logo!"
+        
+        result = self.agent.process_message("5511999999999", "o que vocês fazem de unha")
+        
+        self.assertTrue(result["message"].startswith("Veja nossos serviços\n\n"))
+        self.assertEqual(result["buttons"][0]["reply"]["id"], "service_manicure")
+        self.assertEqual(self.agent.response_parser.get_stats()["repaired"], 1)
+    
+    def test_llm_failure_falls_back_to_local_flow(self):
+        """Testa a resposta alternativa quando o LLM falha"""
+        self.agent.db_service.get_conversation_context.return_value = (True, {"state": "greeting", "data": {}})
+        self.agent.db_service.get_client.return_value = (False, {})
+        self.agent.db_service.get_all_services.return_value = (True, [
+            {"service_id": "escova", "name": "Escova", "price": 30.0}
+        ])
+        self.agent.llm.generate.side_effect = RuntimeError("503 Service Unavailable")
+        
+        # Reconhecida pelo classificador com o limite menor: segue o fluxo de serviços
+        result = self.agent.process_message("5511999999999", "quero ver os preços do salão")
+        self.assertEqual(result["buttons"][0]["reply"]["id"], "service_escova")
+        
+        # Não reconhecida: aviso de que a resposta vem em seguida
+        result = self.agent.process_message("5511999999999", "posso levar meu cachorro?")
+        self.assertIn("Recebemos sua mensagem", result["message"])
+        
+        stats = self.agent.get_llm_stats()
+        self.assertEqual(stats["fallbacks"], {"intent": 1, "canned": 1})
+        self.assertEqual(stats["errors"], 2)
+    
+    def test_turn_reads_run_in_parallel(self):
+        """Testa que contexto e cliente são lidos ao mesmo tempo"""
+        barrier = threading.Barrier(2, timeout=2)
+        
+        def get_context(phone):
+            barrier.wait()
+            return True, {"state": "greeting", "data": {}}
+        
+        def get_client(phone):
+            barrier.wait()
+            return True, {"name": "Ana"}
+        
+        self.agent.db_service.get_conversation_context.side_effect = get_context
+        self.agent.db_service.get_client.side_effect = get_client
+        self.agent.llm.generate.return_value = '{"message": "Oi, Ana!", "action": "continue_conversation", "data": {}}'
+        
+        result = self.agent.process_message("5511999999999", "vocês abrem no feriado?")
+        
+        self.assertEqual(result["message"], "Oi, Ana!")
+        stats = self.agent.get_turn_stats()
+        self.assertEqual(stats["turns"], 1)
+        self.assertEqual(sum(stats["critical_reads"].values()), 1)
+        self.assertEqual(set(stats["segments_ms"]), {"reads", "llm", "action", "save"})
+    
+    def test_speculative_availability_is_reused(self):
+        """Testa que a agenda consultada antes do LLM é usada pela ação check_availability"""
+        context = {"state": "time_selection", "data": {"service_id": "manicure", "date": "2026-12-24"}}
+        self.agent.db_service.get_conversation_context.return_value = (True, context)
+        self.agent.db_service.get_client.return_value = (False, {})
+        self.agent.db_service.get_service.return_value = (True, {"name": "Manicure", "duration_minutes": 45})
+        self.agent.calendar_service.get_available_slots.return_value = [
+            {"start": datetime(2026, 12, 25, 15, 0), "formatted": "15:00"}
+        ]
+        self.agent.llm.generate.return_value = ('{"message": "Vamos ver o dia 25!", "action": "check_availability", '
+                                                '"data": {"service_id": "manicure", "date": "2026-12-25"}}')
+        
+        result = self.agent.process_message("5511999999999", "tem algo mais tarde no 25/12/2026?")
+        
+        self.assertEqual(result["buttons"][0]["reply"]["id"], "time_15:00")
+        self.agent.db_service.get_service.assert_called_once_with("manicure")
+        self.agent.calendar_service.get_available_slots.assert_called_once()
+        self.assertEqual(self.agent.get_turn_stats()["speculative_availability"], {"used": 1, "wasted": 0})
+        
+        # Outra data pedida pelo LLM: a consulta antecipada é descartada
+        self.agent.llm.generate.return_value = ('{"message": "E no dia 26?", "action": "check_availability", '
+                                                '"data": {"service_id": "manicure", "date": "2026-12-26"}}')
+        self.agent.process_message("5511999999999", "e depois do natal, 25/12/2026 não dá")
+        self.assertEqual(self.agent.calendar_service.get_available_slots.call_count, 3)
+        self.assertEqual(self.agent.get_turn_stats()["speculative_availability"], {"used": 1, "wasted": 1})
+    
+    def test_show_appointments_stops_reading_after_limit(self):
+        """Testa que a listagem para de consumir o resultado depois dos primeiros agendamentos"""
+        consumed = []
+        
+        def appointments():
+            for day in range(1, 100):
+                consumed.append(day)
+                yield {"appointment_date": f"2099-01-{day:02d}", "appointment_time": "10:00",
+                       "service_name": "Manicure", "price": 20.0}
+        
+        self.agent.db_service.iter_appointments_by_phone.return_value = appointments()
+        
+        result = self.agent.show_appointments("5511999999999", "Seus agendamentos:")
+        
+        self.assertEqual(result["message"].count("📅"), 5)
+        self.assertIn("E outros agendamentos", result["message"])
+        self.assertEqual(len(consumed), 6)
+    
+    def test_booking_reads_services_from_catalog(self):
+        """Testa que, com o catálogo carregado, a reserva não lê o serviço do DynamoDB"""
+        manicure = {"service_id": "manicure", "name": "Manicure", "duration_minutes": 45, "price": 20.0}
+        self.agent.db_service.get_all_services.return_value = (True, [manicure])
+        self.agent.db_service.create_appointment.return_value = (True, "apt-1")
+        self.agent.calendar_service.get_available_slots.return_value = [
+            {"start": datetime(2026, 12, 25, 14, 0), "formatted": "14:00"}
+        ]
+        self.agent.calendar_service.create_appointment.return_value = (True, {})
+        context = {"state": "date_selection", "data": {"service_id": "manicure"}}
+        
+        self.agent.check_availability("Vamos ver!", {"service_id": "manicure", "date": "2026-12-25"})
+        result = self.agent.create_appointment("5511999999999", "Perfeito!",
+                                               {"service_id": "manicure", "date": "2026-12-25", "time": "14:00"}, context)
+        
+        self.assertIn("Agendamento confirmado", result["message"])
+        self.agent.db_service.get_service.assert_not_called()
+        self.assertEqual(self.agent.db_service.create_appointment.call_args.kwargs["service"], manicure)
+        self.assertEqual(self.agent.db_service.get_all_services.call_count, 1)
+        
+        # Preço alterado: invalidate recarrega o catálogo na próxima leitura
+        self.agent.db_service.get_all_services.return_value = (True, [dict(manicure, price=25.0)])
+        self.agent.service_catalog.invalidate()
+        self.assertEqual(self.agent.service_catalog.get_service("manicure")[1]["price"], 25.0)
+        self.assertEqual(self.agent.service_catalog.get_stats()["loads"], 2)
+    
+    def test_reply_fallback_reuses_turn_reads(self):
+        """Testa que a seleção enviada ao LLM não relê o contexto e grava uma única vez"""
+        self.agent.db_service.get_conversation_context.return_value = (True, {"state": "greeting", "data": {}})
+        self.agent.db_service.get_client.return_value = (False, "Cliente não encontrado")
+        self.agent.db_service.save_conversation_context.return_value = (True, "")
+        self.agent.llm.generate.return_value = '{"message": "Certo!", "action": "continue_conversation", "data": {}}'
+        
+        result = self.agent.process_reply("5511999999999", "opcao_desconhecida", "Outra opção")
+        
+        self.assertEqual(result["message"], "Certo!")
+        self.agent.db_service.get_conversation_context.assert_called_once()
+        self.agent.db_service.save_conversation_context.assert_called_once()
+        stats = self.agent.get_db_stats()
+        self.assertEqual(stats["turns"], 1)
+        self.assertEqual(stats["memo_hits"], 1)
+        self.assertEqual(stats["reads_per_turn"]["max"], 2)
+        self.assertEqual(stats["writes_per_turn"]["max"], 1)
 
 if __name__ == '__main__':
     unittest.main()
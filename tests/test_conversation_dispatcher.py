@@ -0,0 +1,78 @@
+import unittest
+import sys
+import os
+import threading
+import time
+
+# Adiciona o diretório src ao path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from conversation_dispatcher import ConversationDispatcher
+
+class TestConversationDispatcher(unittest.TestCase):
+    def setUp(self):
+        """Configura o dispatcher de teste"""
+        self.dispatcher = ConversationDispatcher(num_shards=8, max_workers=4)
+    
+    def tearDown(self):
+        self.dispatcher.shutdown()
+    
+    def test_same_phone_runs_in_order(self):
+        """Testa que mensagens do mesmo telefone são executadas em ordem"""
+        executed = []
+        
+        def task(index):
+            time.sleep(0.001 * (5 - index))
+            executed.append(index)
+        
+        futures = [self.dispatcher.submit("5511999999999", task, i) for i in range(5)]
+        for future in futures:
+            future.result(timeout=5)
+        
+        self.assertEqual(executed, [0, 1, 2, 3, 4])
+    
+    def test_different_phones_run_in_parallel(self):
+        """Testa que uma conversa lenta não bloqueia outra em outro shard"""
+        release = threading.Event()
+        phone_a, phone_b = "5511000000001", "5511000000002"
+        while self.dispatcher.shard_for(phone_a) == self.dispatcher.shard_for(phone_b):
+            phone_b = str(int(phone_b) + 1)
+        
+        slow = self.dispatcher.submit(phone_a, release.wait, 5)
+        fast = self.dispatcher.submit(phone_b, lambda: "ok")
+        
+        self.assertEqual(fast.result(timeout=2), "ok")
+        self.assertFalse(slow.done())
+        release.set()
+        self.assertTrue(slow.result(timeout=2))
+    
+    def test_queue_depths(self):
+        """Testa que a profundidade da fila de cada shard é exposta"""
+        release = threading.Event()
+        phone = "5511999999999"
+        
+        futures = [self.dispatcher.submit(phone, release.wait, 5) for _ in range(3)]
+        
+        depths = self.dispatcher.get_queue_depths()
+        self.assertEqual(depths[self.dispatcher.shard_for(phone)], 3)
+        self.assertEqual(self.dispatcher.get_stats()["max_queue_depth"], 3)
+        
+        release.set()
+        for future in futures:
+            future.result(timeout=5)
+        self.assertEqual(self.dispatcher.get_stats()["queued"], 0)
+    
+    def test_exception_is_propagated(self):
+        """Testa que erros da tarefa chegam ao Future sem travar o shard"""
+        def failing():
+            raise ValueError("falha")
+        
+        failed = self.dispatcher.submit("5511999999999", failing)
+        ok = self.dispatcher.submit("5511999999999", lambda: 42)
+        
+        with self.assertRaises(ValueError):
+            failed.result(timeout=2)
+        self.assertEqual(ok.result(timeout=2), 42)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import unittest
+import sys
+import os
+import json
+
+# Adiciona o diretório src ao path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from conversation_history import ConversationHistory
+
+class TestConversationHistory(unittest.TestCase):
+    def setUp(self):
+        """Cria um histórico pequeno para forçar a compactação"""
+        self.history = ConversationHistory(max_turns=4, max_tokens=100, summary_max_tokens=40)
+    
+    def test_record_keeps_recent_turns(self):
+        """Testa que as mensagens do turno são guardadas em ordem"""
+        context = {'state': 'greeting', 'data': {}}
+        self.history.record(context, "Oi", "Olá! Qual serviço você gostaria?")
+        
+        self.assertEqual(context['history'], [
+            {'role': 'client', 'text': "Oi"},
+            {'role': 'agent', 'text': "Olá! Qual serviço você gostaria?"}
+        ])
+    
+    def test_digest_follows_history(self):
+        """Testa que o digest é vazio sem histórico e muda com o histórico"""
+        context = {'state': 'greeting', 'data': {}}
+        self.assertEqual(ConversationHistory.digest(context), '')
+        
+        self.history.record(context, "Oi", "Olá!")
+        same = {'history': [{'role': 'client', 'text': "Oi"}, {'role': 'agent', 'text': "Olá!"}]}
+        self.assertEqual(ConversationHistory.digest(context), ConversationHistory.digest(same))
+        
+        self.history.record(context, "Quero corte", "Para quando?")
+        self.assertNotEqual(ConversationHistory.digest(context), ConversationHistory.digest(same))
+    
+    def test_old_turns_are_summarized(self):
+        """Testa que as mensagens mais antigas vão para o resumo"""
+        context = {'state': 'greeting', 'data': {}}
+        self.history.record(context, "Quero fazer hidratação", "Para qual data?")
+        self.history.record(context, "Sexta", "Temos 10:00 e 14:00")
+        self.history.record(context, "14:00", "Agendado!")
+        
+        self.assertEqual(len(context['history']), 4)
+        self.assertEqual(context['history'][0]['text'], "Sexta")
+        self.assertEqual(context['summary'], "Cliente: Quero fazer hidratação\nAtendente: Para qual data?")
+        self.assertEqual(self.history.get_stats()['compacted'], 2)
+    
+    def test_size_stays_bounded(self):
+        """Testa que o histórico não cresce com a duração da conversa"""
+        context = {'state': 'greeting', 'data': {}}
+        for i in range(200):
+            self.history.record(context, f"mensagem {i} " + "x" * 300, f"resposta {i} " + "y" * 300)
+        
+        self.assertLessEqual(len(context['history']), 4)
+        self.assertLessEqual(ConversationHistory.history_tokens(context['history']), 100)
+        self.assertLessEqual(len(context['summary']), 40 * 4)
+        self.assertLess(len(json.dumps(context)), 2000)
+        self.assertIn("resposta 199", context['history'][-1]['text'])
+
+if __name__ == '__main__':
+    unittest.main()
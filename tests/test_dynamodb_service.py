@@ -1,8 +1,11 @@
 import unittest
+import json
 import sys
 import os
+import threading
 from unittest.mock import Mock, patch, MagicMock
 from datetime import datetime
+from botocore.exceptions import ClientError
 
 # Adiciona o diretório src ao path
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
@@ -21,6 +24,8 @@ class TestDynamoDBService(unittest.TestCase):
             self.service.clients_table = Mock()
             self.service.services_table = Mock()
             self.service.conversations_table = Mock()
+            self.service.processed_messages_table = Mock()
+            self.service.response_cache_table = Mock()
     
     def test_save_client_success(self):
         """Testa salvamento de cliente com sucesso"""
@@ -256,6 +261,206 @@ class TestDynamoDBService(unittest.TestCase):
         self.assertFalse(success)
         self.assertEqual(context, {})
 
+    def test_register_message_id_new(self):
+        """Testa registro de id de mensagem nova"""
+        self.service.processed_messages_table.put_item.return_value = {}
+        
+        success, is_new = self.service.register_message_id("wamid.1", 1700000000)
+        
+        self.assertTrue(success)
+        self.assertTrue(is_new)
+        kwargs = self.service.processed_messages_table.put_item.call_args.kwargs
+        self.assertEqual(kwargs["ConditionExpression"], "attribute_not_exists(message_id)")
+    
+    def test_register_message_id_duplicate(self):
+        """Testa registro de id já existente (put condicional falha)"""
+        self.service.processed_messages_table.put_item.side_effect = ClientError(
+            {"Error": {"Code": "ConditionalCheckFailedException", "Message": "exists"}},
+            "PutItem"
+        )
+        
+        success, is_new = self.service.register_message_id("wamid.1", 1700000000)
+        
+        self.assertTrue(success)
+        self.assertFalse(is_new)
+    
+    def test_get_cached_response_ignores_expired_items(self):
+        """Testa que itens expirados (ainda não removidos pelo TTL) são ignorados"""
+        self.service.response_cache_table.get_item.return_value = {
+            "Item": {"cache_key": "k", "response": '{"message": "Olá"}', "expires_at": 1}
+        }
+        
+        success, value = self.service.get_cached_response("k")
+        
+        self.assertTrue(success)
+        self.assertIsNone(value)
+    
+    def test_put_and_get_cached_response(self):
+        """Testa gravação e leitura de resposta em cache"""
+        success, _ = self.service.put_cached_response("k", {"message": "Olá"}, 4102444800)
+        item = self.service.response_cache_table.put_item.call_args.kwargs["Item"]
+        self.service.response_cache_table.get_item.return_value = {"Item": item}
+        
+        self.assertTrue(success)
+        self.assertEqual(self.service.get_cached_response("k"), (True, {"message": "Olá"}))
+    
+    def test_save_conversation_context_bounds_item_size(self):
+        """Testa que o histórico mais antigo é descartado acima do limite do item"""
+        self.service.conversations_table.put_item.return_value = {}
+        history = [{"role": "client", "text": f"mensagem {i} " + "x" * 500} for i in range(100)]
+        context = {"state": "greeting", "data": {}, "history": history, "summary": "Cliente: Oi"}
+        
+        serialized = self.service.serialize_context(context, max_bytes=4096)
+        
+        self.assertLessEqual(len(serialized.encode('utf-8')), 4096)
+        saved = json.loads(serialized)
+        self.assertIn("mensagem 99", saved["history"][-1]["text"])
+        self.assertEqual(saved["summary"], "Cliente: Oi")
+        self.assertEqual(len(context["history"]), 100)
+    
+    def test_constructor_makes_no_aws_calls(self):
+        """Testa que as tabelas são ligadas só no primeiro uso e sem DescribeTable"""
+        from dynamodb_service import DynamoDBService
+        with patch('dynamodb_service.boto3') as boto3:
+            service = DynamoDBService()
+            boto3.resource.assert_not_called()
+            
+            table = service.clients_table
+            self.assertIs(service.clients_table, table)
+            boto3.resource.assert_called_once()
+            boto3.resource.return_value.Table.assert_called_once_with('salon_clients')
+            table.load.assert_not_called()
+    
+    def test_each_thread_gets_its_own_resource(self):
+        """Testa que threads diferentes não compartilham o resource nem as tabelas do boto3"""
+        from dynamodb_service import DynamoDBService
+        with patch('dynamodb_service.boto3') as boto3:
+            boto3.resource.side_effect = lambda *args, **kwargs: Mock()
+            service = DynamoDBService()
+            tables = {}
+            
+            def read():
+                tables[threading.get_ident()] = (service.dynamodb, service.clients_table, service.clients_table)
+            
+            read()
+            worker = threading.Thread(target=read)
+            worker.start()
+            worker.join()
+        
+        (main_resource, main_table, main_again), (other_resource, other_table, _) = tables.values()
+        self.assertIsNot(main_resource, other_resource)
+        self.assertIsNot(main_table, other_table)
+        self.assertIs(main_table, main_again)
+        self.assertEqual(boto3.resource.call_count, 2)
+    
+    def test_verify_tables_runs_once_per_process(self):
+        """Testa que a verificação do esquema é feita uma vez e reaproveitada"""
+        from dynamodb_service import DynamoDBService, TABLE_SCHEMAS
+        
+        def describe_table(TableName):
+            schema = TABLE_SCHEMAS[TableName]
+            return {"Table": {
+                "TableStatus": "ACTIVE",
+                "KeySchema": [{"AttributeName": schema['key'], "KeyType": "HASH"}],
+                "GlobalSecondaryIndexes": []
+            }}
+        
+        self.service._local.dynamodb = Mock()
+        self.service._local.dynamodb.meta.client.describe_table.side_effect = describe_table
+        try:
+            ok, problems = self.service.verify_tables(refresh=True)
+            other = DynamoDBService()
+            other._local.dynamodb = Mock()
+            
+            self.assertFalse(ok)
+            self.assertEqual(problems, ["salon_appointments: índice phone-date-index não encontrado",
+                                        "salon_appointments: índice date-time-index não encontrado"])
+            self.assertEqual(other.verify_tables(), (ok, problems))
+            self.assertEqual(self.service._local.dynamodb.meta.client.describe_table.call_count, len(TABLE_SCHEMAS))
+            other._local.dynamodb.meta.client.describe_table.assert_not_called()
+        finally:
+            DynamoDBService._schema_status = None
+
+    def test_verify_tables_retries_failed_check(self):
+        """Testa que um esquema com problemas é conferido de novo após o intervalo e um ok é mantido"""
+        from dynamodb_service import DynamoDBService, TABLE_SCHEMAS
+        
+        def describe_table(TableName):
+            schema = TABLE_SCHEMAS[TableName]
+            return {"Table": {
+                "TableStatus": "ACTIVE",
+                "KeySchema": [{"AttributeName": schema['key'], "KeyType": "HASH"}],
+                "GlobalSecondaryIndexes": [{"IndexName": name, "IndexStatus": "ACTIVE"} for name in schema['indexes']]
+            }}
+        
+        client = Mock()
+        client.describe_table.side_effect = [ClientError({"Error": {"Code": "ResourceNotFoundException"}}, "DescribeTable")] + \
+            [describe_table(name) for name in list(TABLE_SCHEMAS)[1:]] + [describe_table(name) for name in TABLE_SCHEMAS]
+        self.service._local.dynamodb = Mock()
+        self.service._local.dynamodb.meta.client = client
+        try:
+            with patch('dynamodb_service.time.monotonic', return_value=1000.0):
+                ok, problems = self.service.verify_tables(refresh=True)
+                self.assertEqual(self.service.verify_tables(), (ok, problems))
+            self.assertFalse(ok)
+            self.assertEqual(client.describe_table.call_count, len(TABLE_SCHEMAS))
+            
+            with patch('dynamodb_service.time.monotonic', return_value=1000.0 + 31):
+                self.assertEqual(self.service.verify_tables(), (True, []))
+            with patch('dynamodb_service.time.monotonic', return_value=1000.0 + 3600):
+                self.assertEqual(self.service.verify_tables(), (True, []))
+            self.assertEqual(client.describe_table.call_count, 2 * len(TABLE_SCHEMAS))
+        finally:
+            DynamoDBService._schema_status = None
+    
+    def test_get_appointments_by_date_follows_pages(self):
+        """Testa que a busca por data usa o índice por data e lê todas as páginas"""
+        self.service.appointments_table.query.side_effect = [
+            {"Items": [{"appointment_id": "apt_1", "appointment_time": "09:00"}], "LastEvaluatedKey": {"appointment_id": "apt_1"}},
+            {"Items": [{"appointment_id": "apt_2", "appointment_time": "15:00"}]}
+        ]
+        
+        success, appointments = self.service.get_appointments_by_date("2024-01-15")
+        
+        self.assertTrue(success)
+        self.assertEqual([a["appointment_id"] for a in appointments], ["apt_1", "apt_2"])
+        first, second = self.service.appointments_table.query.call_args_list
+        self.assertEqual(first.kwargs["IndexName"], "date-time-index")
+        self.assertNotIn("ExclusiveStartKey", first.kwargs)
+        self.assertEqual(second.kwargs["ExclusiveStartKey"], {"appointment_id": "apt_1"})
+        self.service.appointments_table.scan.assert_not_called()
+    
+    def test_get_appointments_by_date_range(self):
+        """Testa a busca por período com uma consulta por dia"""
+        self.service.appointments_table.query.side_effect = lambda **kwargs: {
+            "Items": [{"appointment_id": f"apt_{self.service.appointments_table.query.call_count}"}]
+        }
+        
+        success, appointments = self.service.get_appointments_by_date_range("2024-01-30", "2024-02-01")
+        
+        self.assertTrue(success)
+        self.assertEqual(len(appointments), 3)
+        self.assertEqual(self.service.appointments_table.query.call_count, 3)
+    
+    def test_iter_items_reads_pages_lazily(self):
+        """Testa que o gerador só busca a próxima página quando a anterior acaba"""
+        self.service.services_table.scan.side_effect = [
+            {"Items": [{"service_id": "a"}, {"service_id": "b"}], "LastEvaluatedKey": {"service_id": "b"}},
+            {"Items": [{"service_id": "c"}]}
+        ]
+        
+        services = self.service.iter_services(projection=["service_id", "name"], page_size=2)
+        self.assertEqual(next(services), {"service_id": "a"})
+        self.assertEqual(next(services), {"service_id": "b"})
+        self.assertEqual(self.service.services_table.scan.call_count, 1)
+        
+        self.assertEqual(list(services), [{"service_id": "c"}])
+        first, second = self.service.services_table.scan.call_args_list
+        self.assertEqual(first.kwargs["Limit"], 2)
+        self.assertEqual(first.kwargs["ProjectionExpression"], "#p0, #p1")
+        self.assertEqual(first.kwargs["ExpressionAttributeNames"], {"#p0": "service_id", "#p1": "name"})
+        self.assertEqual(second.kwargs["ExclusiveStartKey"], {"service_id": "b"})
+
 if __name__ == '__main__':
     unittest.main()
 
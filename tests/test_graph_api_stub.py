@@ -0,0 +1,81 @@
+import unittest
+import sys
+import os
+
+# Adiciona o diretório src ao path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from graph_api_stub import GraphAPIStub, create_app, validate_payload
+from whatsapp_client import WhatsAppClient
+
+class TestGraphAPIStub(unittest.TestCase):
+    def setUp(self):
+        """Cria o app do stub com o cliente de testes do Flask"""
+        self.stub = GraphAPIStub(seed=1)
+        self.client = create_app(self.stub).test_client()
+        self.text = {"messaging_product": "whatsapp", "to": "5511999999999", "type": "text", "text": {"body": "Olá"}}
+    
+    def test_accepts_and_records_message(self):
+        """Testa que mensagens válidas são aceitas e registradas"""
+        response = self.client.post('/v18.0/123/messages', json=self.text)
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.get_json()["messages"][0]["id"].startswith("wamid.stub."))
+        messages = self.client.get('/_stub/messages?to=5511999999999').get_json()
+        self.assertEqual(messages[0]["payload"], self.text)
+        self.assertEqual(messages[0]["phone_id"], "123")
+    
+    def test_rejects_invalid_payloads(self):
+        """Testa a validação do formato das mensagens"""
+        buttons = [{"type": "reply", "reply": {"id": str(i), "title": "Opção"}} for i in range(4)]
+        interactive = {"type": "button", "body": {"text": "Escolha"}, "action": {"buttons": buttons}}
+        
+        self.assertIn("to", validate_payload({"messaging_product": "whatsapp", "type": "text"}))
+        self.assertIn("botões", validate_payload(dict(self.text, type="interactive", interactive=interactive)))
+        self.assertIsNone(validate_payload(self.text))
+        
+        response = self.client.post('/v18.0/123/messages', json={"to": "1"})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.get_json()["error"]["code"], 100)
+        self.assertEqual(self.stub.get_stats()["invalid"], 1)
+    
+    def test_injects_rate_limit_and_server_errors(self):
+        """Testa a injeção de 429 (com Retry-After) e de 5xx"""
+        self.client.post('/_stub/config', json={"error_rate_429": 1.0, "retry_after": 2})
+        response = self.client.post('/v18.0/123/messages', json=self.text)
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.headers["Retry-After"], "2")
+        self.assertEqual(response.get_json()["error"]["code"], 130429)
+        
+        self.client.post('/_stub/config', json={"error_rate_429": 0.0, "error_rate_5xx": 1.0})
+        self.assertEqual(self.client.post('/v18.0/123/messages', json=self.text).status_code, 503)
+        self.assertEqual(self.stub.get_messages(), [])
+    
+    def test_requires_access_token_when_configured(self):
+        """Testa a verificação do token de acesso"""
+        self.stub.update_config({"access_token": "segredo"})
+        
+        response = self.client.post('/v18.0/123/messages', json=self.text)
+        self.assertEqual(response.status_code, 401)
+        
+        response = self.client.post('/v18.0/123/messages', json=self.text, headers={"Authorization": "Bearer segredo"})
+        self.assertEqual(response.status_code, 200)
+    
+    def test_whatsapp_client_payloads_are_valid(self):
+        """Testa que os payloads montados pelo cliente passam na validação do stub"""
+        client = WhatsAppClient(token="t", phone_id="1")
+        buttons = [{"type": "reply", "reply": {"id": "time_14:00", "title": "14:00"}}]
+        
+        self.assertIsNone(validate_payload(client.build_response_payload("5511999999999", {"message": "Olá"})))
+        self.assertIsNone(validate_payload(client.build_buttons_payload("5511999999999", "Horários:", buttons)))
+    
+    def test_reset_clears_messages(self):
+        """Testa a limpeza das mensagens registradas"""
+        self.client.post('/v18.0/123/messages', json=self.text)
+        self.client.delete('/_stub/messages')
+        
+        self.assertEqual(self.client.get('/_stub/messages').get_json(), [])
+        self.assertEqual(self.client.get('/_stub/stats').get_json()["requests"], 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import unittest
+import sys
+import os
+import json
+import time
+
+# Adiciona o diretório src ao path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from llm_backend import ScriptedBackend, LatencyDistribution, create_backend
+from prompt_builder import PromptBuilder
+
+class TestLLMBackend(unittest.TestCase):
+    def test_scripted_backend_follows_rules(self):
+        """Testa que o backend local responde pela mensagem do cliente no prompt"""
+        backend = create_backend('scripted')
+        builder = PromptBuilder("Sistema: fale de serviços e cancelamentos")
+        
+        prompt, _ = builder.build('greeting', {}, "Quero cancelar meu horário")
+        self.assertEqual(json.loads(backend.generate(prompt))["action"], "cancel_appointment")
+        
+        prompt, _ = builder.build('greeting', {}, "Quanto custa a hidratação?")
+        self.assertEqual(json.loads(backend.generate(prompt))["action"], "show_services")
+        
+        prompt, _ = builder.build('greeting', {}, "Vocês têm wi-fi?")
+        self.assertEqual(json.loads(backend.generate(prompt))["action"], "continue_conversation")
+    
+    def test_custom_rules(self):
+        """Testa regras e resposta padrão informadas"""
+        backend = ScriptedBackend(rules=[(r'\bpix\b', {"message": "Aceitamos PIX", "action": "continue_conversation", "data": {}})],
+                                  default_response={"message": "?", "action": "continue_conversation", "data": {}})
+        
+        self.assertEqual(json.loads(backend.generate('MENSAGEM DO CLIENTE: "aceita pix?"'))["message"], "Aceitamos PIX")
+        self.assertEqual(json.loads(backend.generate('MENSAGEM DO CLIENTE: "oi"'))["message"], "?")
+    
+    def test_latency_distributions(self):
+        """Testa a leitura das distribuições e os valores sorteados"""
+        self.assertEqual(LatencyDistribution.parse("constant:800").sample(), 800)
+        
+        uniform = LatencyDistribution.parse("uniform:100:200", seed=1)
+        self.assertTrue(all(100 <= uniform.sample() <= 200 for _ in range(100)))
+        
+        lognormal = LatencyDistribution.parse("lognormal:800:0.5", seed=1)
+        samples = sorted(lognormal.sample() for _ in range(2001))
+        self.assertAlmostEqual(samples[1000], 800, delta=80)
+        
+        self.assertEqual(str(LatencyDistribution.parse("normal:800:200")), "normal:800:200")
+        with self.assertRaises(ValueError):
+            LatencyDistribution.parse("gamma:1:2")
+        with self.assertRaises(ValueError):
+            LatencyDistribution.parse("uniform:100")
+    
+    def test_scripted_backend_sleeps(self):
+        """Testa que a latência configurada é aplicada"""
+        backend = ScriptedBackend(latency="constant:50")
+        start = time.perf_counter()
+        backend.generate('MENSAGEM DO CLIENTE: "oi"')
+        self.assertGreaterEqual(time.perf_counter() - start, 0.045)
+    
+    def test_unknown_backend(self):
+        """Testa erro para backend desconhecido"""
+        with self.assertRaises(ValueError):
+            create_backend('gpt')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+import unittest
+import sys
+import os
+import threading
+import time
+
+# Adiciona o diretório src ao path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from llm_guard import LLMGuard, AdaptiveLimiter, CircuitBreaker, LLMUnavailable
+
+class TestLLMGuard(unittest.TestCase):
+    def test_limit_grows_on_success_and_halves_on_timeout(self):
+        """Testa o ajuste AIMD do limite de chamadas simultâneas"""
+        guard = LLMGuard(timeout=0.05, limiter=AdaptiveLimiter(initial=2, max_limit=8, latency_target=1.0))
+        
+        for _ in range(4):
+            guard.call(lambda: "ok")
+        self.assertGreater(guard.get_stats()["limit"], 3)
+        
+        with self.assertRaises(LLMUnavailable) as raised:
+            guard.call(time.sleep, 0.2)
+        self.assertEqual(raised.exception.reason, "timeout")
+        
+        stats = guard.get_stats()
+        self.assertLess(stats["limit"], 2)
+        self.assertEqual(stats["timeouts"], 1)
+    
+    def test_stuck_call_keeps_its_slot(self):
+        """Testa que uma chamada abandonada no timeout continua ocupando a vaga até terminar"""
+        release = threading.Event()
+        guard = LLMGuard(timeout=0.05, queue_timeout=0.01, limiter=AdaptiveLimiter(initial=1, max_limit=1))
+        
+        with self.assertRaises(LLMUnavailable):
+            guard.call(release.wait, 5)
+        with self.assertRaises(LLMUnavailable) as raised:
+            guard.call(lambda: "ok")
+        self.assertEqual(raised.exception.reason, "overloaded")
+        self.assertEqual(guard.get_stats()["in_flight"], 1)
+        
+        release.set()
+        time.sleep(0.05)
+        self.assertEqual(guard.call(lambda: "ok"), "ok")
+    
+    def test_breaker_opens_and_recovers(self):
+        """Testa a abertura do circuito após falhas seguidas e o fechamento pela chamada de teste"""
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+        guard = LLMGuard(timeout=1.0, breaker=breaker)
+        
+        def fail():
+            raise RuntimeError("503")
+        
+        for _ in range(2):
+            with self.assertRaises(LLMUnavailable):
+                guard.call(fail)
+        with self.assertRaises(LLMUnavailable) as raised:
+            guard.call(lambda: "ok")
+        self.assertEqual(raised.exception.reason, "circuit_open")
+        self.assertEqual(guard.get_stats()["breaker"]["state"], "open")
+        
+        time.sleep(0.06)
+        self.assertEqual(guard.call(lambda: "ok"), "ok")
+        stats = guard.get_stats()
+        self.assertEqual(stats["breaker"]["state"], "closed")
+        self.assertEqual(stats["rejected"]["circuit_open"], 1)
+        self.assertEqual(stats["errors"], 2)
+    
+    def test_half_open_allows_single_probe(self):
+        """Testa que só uma chamada de teste passa com o circuito meio aberto"""
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.0)
+        breaker.record_failure()
+        
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())
+        breaker.record_failure()
+        self.assertEqual(breaker.state, "open")
+    
+    def test_waiting_calls_are_served_by_priority_with_aging(self):
+        """Testa que a vaga liberada vai para a chamada mais urgente, a menos que outra espere há muito tempo"""
+        def run(aging, first_priority, second_priority, gap):
+            limiter = AdaptiveLimiter(initial=1, max_limit=1, aging=aging)
+            self.assertTrue(limiter.acquire())
+            order = []
+            
+            def wait(name, priority):
+                if limiter.acquire(2.0, priority):
+                    order.append(name)
+                    limiter.release()
+            
+            threads = [threading.Thread(target=wait, args=("first", first_priority))]
+            threads[0].start()
+            time.sleep(gap)
+            threads.append(threading.Thread(target=wait, args=("second", second_priority)))
+            threads[1].start()
+            time.sleep(0.05)
+            self.assertEqual(limiter.get_stats()["queued"], 2)
+            limiter.release()
+            for thread in threads:
+                thread.join()
+            return order
+        
+        # Saudação na fila antes de uma confirmação: a confirmação passa à frente
+        self.assertEqual(run(aging=10.0, first_priority=3, second_priority=0, gap=0.02), ["second", "first"])
+        # A saudação já esperou mais que 3 níveis de envelhecimento: sai primeiro
+        self.assertEqual(run(aging=0.01, first_priority=3, second_priority=0, gap=0.1), ["first", "second"])
+    
+    def test_queue_wait_is_reported_per_class(self):
+        """Testa a espera na fila por classe de prioridade"""
+        guard = LLMGuard(timeout=1.0, queue_timeout=0.05, limiter=AdaptiveLimiter(initial=1, max_limit=1))
+        guard.call(lambda: "ok", priority=0, priority_class="confirmation")
+        
+        self.assertTrue(guard.limiter.acquire())
+        with self.assertRaises(LLMUnavailable):
+            guard.call(lambda: "ok", priority=3, priority_class="greeting")
+        guard.limiter.release()
+        
+        waits = guard.get_stats()["queue_wait_ms"]
+        self.assertEqual(set(waits), {"confirmation", "greeting"})
+        self.assertGreaterEqual(waits["greeting"]["max"], 50)
+        self.assertLess(waits["confirmation"]["max"], 50)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,44 @@
+import unittest
+import sys
+import os
+from datetime import date
+
+# Adiciona o diretório src ao path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from ai_agent import SalonAIAgent
+from llm_backend import ScriptedBackend
+from memory_services import MemoryDynamoDBService, MemoryCalendarService
+
+class TestMemoryServices(unittest.TestCase):
+    def test_booked_slot_is_no_longer_available(self):
+        """Testa que o horário agendado some da grade do calendário em memória"""
+        calendar = MemoryCalendarService()
+        day = date(2030, 1, 10)
+        slots = calendar.get_available_slots(day, duration_minutes=60)
+        
+        calendar.create_appointment("Corte", slots[0]['start'], slots[0]['end'])
+        
+        remaining = calendar.get_available_slots(day, duration_minutes=60)
+        self.assertEqual(len(remaining), len(slots) - 2)
+        self.assertEqual(remaining[0]['formatted'], "10:00 - 11:00")
+    
+    def test_agent_books_appointment_end_to_end(self):
+        """Testa uma conversa inteira do agente sobre os serviços em memória"""
+        db_service = MemoryDynamoDBService()
+        agent = SalonAIAgent(db_service=db_service, calendar_service=MemoryCalendarService(),
+                             llm=ScriptedBackend())
+        phone = "5511999999999"
+        
+        greeting = agent.process_message(phone, "Oi")
+        service_reply = agent.process_reply(phone, greeting["buttons"][0]["reply"]["id"], "Corte Feminino")
+        times = agent.process_message(phone, "amanhã")
+        booking = agent.process_reply(phone, times["buttons"][0]["reply"]["id"], times["buttons"][0]["reply"]["title"])
+        
+        self.assertIn("Para qual data", service_reply["message"])
+        self.assertIn("Agendamento confirmado", booking["message"])
+        self.assertEqual(len(db_service.appointments), 1)
+        self.assertEqual(db_service.conversations[phone]["state"], "completed")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+import unittest
+import sys
+import os
+import time
+from concurrent.futures import Future
+
+# Adiciona o diretório src ao path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from message_coalescer import MessageCoalescer, merge_text_messages
+
+def text_message(phone_number, body, message_id=None):
+    return {"from": phone_number, "id": message_id, "type": "text", "text": {"body": body}}
+
+class TestMessageCoalescer(unittest.TestCase):
+    def setUp(self):
+        """Configura um submit que registra as mensagens despachadas"""
+        self.dispatched = []
+        
+        def submit(message, value):
+            self.dispatched.append((time.monotonic(), message))
+            future = Future()
+            future.set_result(message['text']['body'])
+            return future
+        
+        self.submit = submit
+    
+    def test_burst_is_merged_into_one_turn(self):
+        """Testa que mensagens dentro da janela viram um único turno"""
+        coalescer = MessageCoalescer(self.submit, window_ms=100)
+        
+        futures = [
+            coalescer.add(text_message("5511999999999", body), {})
+            for body in ["oi", "quero marcar", "corte amanhã"]
+        ]
+        
+        self.assertEqual(futures[0].result(timeout=2), "oi\nquero marcar\ncorte amanhã")
+        self.assertIs(futures[0], futures[2])
+        self.assertEqual(len(self.dispatched), 1)
+        self.assertEqual(coalescer.get_stats()["messages_saved"], 2)
+    
+    def test_lone_message_waits_only_the_window(self):
+        """Testa que uma mensagem isolada não espera além da janela"""
+        coalescer = MessageCoalescer(self.submit, window_ms=50)
+        
+        start = time.monotonic()
+        coalescer.add(text_message("5511999999999", "oi"), {}).result(timeout=2)
+        
+        elapsed = self.dispatched[0][0] - start
+        self.assertGreaterEqual(elapsed, 0.04)
+        self.assertLess(elapsed, 0.5)
+    
+    def test_phones_are_not_merged(self):
+        """Testa que mensagens de telefones diferentes não são unidas"""
+        coalescer = MessageCoalescer(self.submit, window_ms=50)
+        
+        first = coalescer.add(text_message("5511000000001", "oi"), {})
+        second = coalescer.add(text_message("5511000000002", "olá"), {})
+        
+        self.assertEqual(first.result(timeout=2), "oi")
+        self.assertEqual(second.result(timeout=2), "olá")
+    
+    def test_flush_dispatches_immediately(self):
+        """Testa que flush libera o grupo pendente sem esperar a janela"""
+        coalescer = MessageCoalescer(self.submit, window_ms=10000)
+        
+        future = coalescer.add(text_message("5511999999999", "oi"), {})
+        coalescer.flush("5511999999999")
+        
+        self.assertEqual(future.result(timeout=1), "oi")
+    
+    def test_disabled_window_submits_directly(self):
+        """Testa que janela zero despacha sem agrupar"""
+        coalescer = MessageCoalescer(self.submit, window_ms=0)
+        
+        coalescer.add(text_message("5511999999999", "oi"), {})
+        
+        self.assertEqual(len(self.dispatched), 1)
+    
+    def test_merge_keeps_last_message_id(self):
+        """Testa que a mensagem unida preserva os ids originais"""
+        merged = merge_text_messages([
+            text_message("5511999999999", "oi", "wamid.1"),
+            text_message("5511999999999", "tudo bem?", "wamid.2")
+        ])
+        
+        self.assertEqual(merged["id"], "wamid.2")
+        self.assertEqual(merged["coalesced_ids"], ["wamid.1", "wamid.2"])
+
+if __name__ == '__main__':
+    unittest.main()
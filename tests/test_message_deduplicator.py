@@ -0,0 +1,85 @@
+import unittest
+import sys
+import os
+import time
+from unittest.mock import Mock
+
+# Adiciona o diretório src ao path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from message_deduplicator import MessageDeduplicator
+
+class TestMessageDeduplicator(unittest.TestCase):
+    def test_duplicate_is_detected(self):
+        """Testa que a segunda entrega do mesmo id é detectada"""
+        dedup = MessageDeduplicator()
+        
+        self.assertFalse(dedup.is_duplicate("wamid.1"))
+        self.assertTrue(dedup.is_duplicate("wamid.1"))
+        self.assertFalse(dedup.is_duplicate("wamid.2"))
+        
+        stats = dedup.get_stats()
+        self.assertEqual(stats["hits"], 1)
+        self.assertEqual(stats["misses"], 2)
+    
+    def test_missing_id_is_never_duplicate(self):
+        """Testa que mensagens sem id sempre são processadas"""
+        dedup = MessageDeduplicator()
+        
+        self.assertFalse(dedup.is_duplicate(None))
+        self.assertFalse(dedup.is_duplicate(None))
+    
+    def test_forget_allows_redelivery(self):
+        """Testa que um id esquecido volta a ser aceito (memória e DynamoDB)"""
+        db_service = Mock()
+        db_service.register_message_id.return_value = (True, True)
+        db_service.unregister_message_id.return_value = (True, "Registro removido")
+        dedup = MessageDeduplicator(db_service=db_service)
+        
+        self.assertFalse(dedup.is_duplicate("wamid.1"))
+        dedup.forget("wamid.1")
+        
+        self.assertFalse(dedup.is_duplicate("wamid.1"))
+        db_service.unregister_message_id.assert_called_once_with("wamid.1")
+    
+    def test_entries_expire_after_ttl(self):
+        """Testa a expiração dos ids após o TTL"""
+        dedup = MessageDeduplicator(ttl_seconds=0.05)
+        
+        dedup.is_duplicate("wamid.1")
+        time.sleep(0.1)
+        
+        self.assertFalse(dedup.is_duplicate("wamid.1"))
+    
+    def test_max_entries_is_respected(self):
+        """Testa que o conjunto em memória é limitado"""
+        dedup = MessageDeduplicator(max_entries=2)
+        
+        for message_id in ["a", "b", "c"]:
+            dedup.is_duplicate(message_id)
+        
+        self.assertEqual(dedup.get_stats()["entries"], 2)
+        self.assertFalse(dedup.is_duplicate("a"))
+    
+    def test_dynamodb_backend_detects_duplicate_from_other_worker(self):
+        """Testa o modo DynamoDB quando outro worker já registrou o id"""
+        db_service = Mock()
+        db_service.register_message_id.return_value = (True, False)
+        dedup = MessageDeduplicator(db_service=db_service)
+        
+        self.assertTrue(dedup.is_duplicate("wamid.1"))
+        # A segunda consulta é respondida pela memória
+        self.assertTrue(dedup.is_duplicate("wamid.1"))
+        db_service.register_message_id.assert_called_once()
+    
+    def test_dynamodb_backend_error_fails_open(self):
+        """Testa que erro no DynamoDB não descarta a mensagem"""
+        db_service = Mock()
+        db_service.register_message_id.return_value = (False, "Erro de conexão")
+        dedup = MessageDeduplicator(db_service=db_service)
+        
+        self.assertFalse(dedup.is_duplicate("wamid.1"))
+        self.assertEqual(dedup.get_stats()["backend_errors"], 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,128 @@
+import unittest
+import sys
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+# Adiciona o diretório src ao path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from message_spool import MessageSpool, SpoolDrainer
+
+class TestMessageSpool(unittest.TestCase):
+    def setUp(self):
+        """Cria um spool em diretório temporário"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.temp_dir, 'spool.db')
+        self.spool = MessageSpool(self.db_path, max_attempts=2)
+        
+        self.message = {"from": "5511999999999", "type": "text", "text": {"body": "Olá"}}
+        self.value = {"messaging_product": "whatsapp"}
+    
+    def tearDown(self):
+        self.spool.close()
+        shutil.rmtree(self.temp_dir)
+    
+    def test_claim_and_ack(self):
+        """Testa que mensagens são entregues em ordem e removidas no ack"""
+        self.spool.append_many([(self.message, self.value), ({"from": "2", "type": "text"}, self.value)])
+        
+        batch = self.spool.claim(10)
+        
+        self.assertEqual(len(batch), 2)
+        self.assertEqual(batch[0][1], self.message)
+        self.assertEqual(self.spool.claim(10), [])
+        
+        for spool_id, _, _ in batch:
+            self.spool.ack(spool_id)
+        self.assertEqual(self.spool.get_stats()['processing'], 0)
+    
+    def test_recover_after_restart(self):
+        """Testa que mensagens em processamento voltam para a fila ao reiniciar"""
+        self.spool.append(self.message, self.value)
+        self.spool.claim(1)
+        self.spool.close()
+        
+        self.spool = MessageSpool(self.db_path)
+        
+        batch = self.spool.claim(1)
+        self.assertEqual(len(batch), 1)
+        self.assertEqual(batch[0][1]["text"]["body"], "Olá")
+    
+    def test_release_moves_to_dead_after_max_attempts(self):
+        """Testa que a mensagem vai para 'dead' após esgotar as tentativas"""
+        spool_id = self.spool.append(self.message, self.value)
+        
+        self.spool.claim(1)
+        self.spool.release(spool_id, "erro")
+        self.assertEqual(self.spool.get_stats()['pending'], 1)
+        
+        self.spool.claim(1)
+        self.spool.release(spool_id, "erro")
+        self.assertEqual(self.spool.get_stats()['dead'], 1)
+    
+    def test_purge_removes_old_dead_messages(self):
+        """Testa que mensagens descartadas saem do spool após a retenção e as pendentes ficam"""
+        self.spool.append_many([(self.message, self.value), (self.message, self.value)])
+        spool_id = self.spool.claim(1)[0][0]
+        for _ in range(self.spool.max_attempts):
+            self.spool.release(spool_id, "erro")
+        
+        self.assertEqual(self.spool.purge(), 0)
+        self.assertEqual(self.spool.purge(older_than=-1), 1)
+        self.assertEqual(self.spool.get_stats(), {'pending': 1, 'processing': 0, 'dead': 0})
+    
+    def test_wait_does_not_miss_earlier_notify(self):
+        """Testa que um aviso anterior à espera (mas posterior à leitura) não se perde"""
+        seen = self.spool.generation()
+        self.spool.append(self.message, self.value)
+        
+        started = time.monotonic()
+        self.assertTrue(self.spool.wait_for_messages(5, since=seen))
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertFalse(self.spool.wait_for_messages(0.01, since=self.spool.generation()))
+    
+    def test_drainer_does_not_wait_poll_interval_between_messages(self):
+        """Testa que mensagens gravadas durante o processamento não esperam o poll_interval"""
+        done = threading.Event()
+        processed = []
+        
+        def handler(message, value):
+            processed.append(message['text']['body'])
+            if len(processed) < 5:
+                self.spool.append({"from": "1", "type": "text", "text": {"body": str(len(processed))}}, self.value)
+            else:
+                done.set()
+        
+        drainer = SpoolDrainer(self.spool, handler=handler, num_workers=1, poll_interval=30)
+        drainer.start()
+        self.spool.append({"from": "1", "type": "text", "text": {"body": "0"}}, self.value)
+        
+        self.assertTrue(done.wait(5))
+        drainer.stop()
+    
+    def test_drainer_processes_messages(self):
+        """Testa que o drainer entrega as mensagens ao handler e faz ack"""
+        processed = []
+        done = threading.Event()
+        
+        def handler(message, value):
+            processed.append(message['text']['body'])
+            if len(processed) == 3:
+                done.set()
+        
+        drainer = SpoolDrainer(self.spool, handler=handler, num_workers=1, poll_interval=0.05)
+        drainer.start()
+        for text in ["a", "b", "c"]:
+            self.spool.append({"from": "1", "type": "text", "text": {"body": text}}, self.value)
+        
+        self.assertTrue(done.wait(5))
+        drainer.stop()
+        
+        self.assertEqual(processed, ["a", "b", "c"])
+        self.assertEqual(self.spool.get_stats(), {'pending': 0, 'processing': 0, 'dead': 0})
+
+if __name__ == '__main__':
+    unittest.main()
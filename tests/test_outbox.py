@@ -0,0 +1,156 @@
+import unittest
+import sys
+import os
+import shutil
+import tempfile
+import time
+from unittest.mock import Mock
+
+# Adiciona o diretório src ao path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from outbox import Outbox, OutboxDrainer
+from rate_limiter import OutboundRateLimiter
+from whatsapp_client import WhatsAppClient
+
+def text_payload(phone_number, text):
+    return {"messaging_product": "whatsapp", "to": phone_number, "type": "text", "text": {"body": text}}
+
+class TestOutbox(unittest.TestCase):
+    def setUp(self):
+        """Cria um outbox em diretório temporário"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.temp_dir, 'outbox.db')
+        self.outbox = Outbox(self.db_path, max_attempts=2, retry_base=0)
+    
+    def tearDown(self):
+        self.outbox.close()
+        shutil.rmtree(self.temp_dir)
+    
+    def test_one_message_in_flight_per_phone(self):
+        """Testa que só a mensagem mais antiga de cada telefone é reservada"""
+        self.outbox.enqueue("1", text_payload("1", "primeira"))
+        self.outbox.enqueue("1", text_payload("1", "segunda"))
+        self.outbox.enqueue("2", text_payload("2", "outra"))
+        
+        batch = self.outbox.claim(10)
+        self.assertEqual([entry[2]["text"]["body"] for entry in batch], ["primeira", "outra"])
+        self.assertEqual(self.outbox.claim(10), [])
+        
+        self.outbox.mark_delivered(batch[0][0], "wamid.1")
+        self.assertEqual(self.outbox.claim(10)[0][2]["text"]["body"], "segunda")
+    
+    def test_failed_message_is_retried_then_dead(self):
+        """Testa nova tentativa após falha e 'dead' ao esgotar as tentativas"""
+        outbox_id = self.outbox.enqueue("1", text_payload("1", "Olá"))
+        
+        self.outbox.claim(1)
+        self.assertEqual(self.outbox.mark_failed(outbox_id, "503"), 'pending')
+        self.outbox.claim(1)
+        self.assertEqual(self.outbox.mark_failed(outbox_id, "503"), 'dead')
+        
+        self.assertEqual(self.outbox.get_stats()['dead'], 1)
+        self.assertEqual(self.outbox.claim(1), [])
+    
+    def test_recover_after_restart(self):
+        """Testa que mensagens em envio voltam para a fila após reinício"""
+        self.outbox.enqueue("1", text_payload("1", "Olá"))
+        self.outbox.claim(1)
+        self.outbox.close()
+        
+        self.outbox = Outbox(self.db_path)
+        
+        self.assertEqual(len(self.outbox.claim(1)), 1)
+    
+    def test_purge_finished_messages(self):
+        """Testa a limpeza das mensagens entregues, desconhecidas e descartadas, mantendo as pendentes"""
+        delivered = self.outbox.enqueue("1", text_payload("1", "Olá"))
+        unknown = self.outbox.enqueue("2", text_payload("2", "Olá"))
+        dead = self.outbox.enqueue("3", text_payload("3", "Olá"))
+        self.outbox.enqueue("4", text_payload("4", "Olá"))
+        self.outbox.claim(3)
+        self.outbox.mark_delivered(delivered)
+        self.outbox.mark_unknown(unknown, "Read timed out")
+        for _ in range(self.outbox.max_attempts):
+            self.outbox.mark_failed(dead, "503")
+        
+        self.assertEqual(self.outbox.purge(), 0)
+        self.assertEqual(self.outbox.purge(older_than=-1), 3)
+        stats = self.outbox.get_stats()
+        self.assertEqual((stats['delivered'], stats['unknown'], stats['dead'], stats['pending']), (0, 0, 0, 1))
+    
+    def test_drainer_delivers_and_retries(self):
+        """Testa que o drainer envia, repete falhas e marca as entregas"""
+        client = Mock()
+        client.send.side_effect = [(False, "503 - indisponível"), (True, {"messages": [{"id": "wamid.1"}]})]
+        drainer = OutboxDrainer(self.outbox, client, num_workers=2, poll_interval=0.01)
+        self.outbox.enqueue("1", text_payload("1", "Olá"))
+        
+        drainer.start()
+        deadline = time.time() + 5
+        while self.outbox.get_stats()['delivered'] < 1 and time.time() < deadline:
+            time.sleep(0.01)
+        drainer.stop()
+        
+        stats = drainer.get_stats()
+        self.assertEqual(stats['delivered'], 1)
+        self.assertEqual(stats['failed_attempts'], 1)
+        self.assertEqual(client.send.call_count, 2)
+
+    def test_drainer_does_not_resend_after_read_timeout(self):
+        """Testa que um envio com resultado desconhecido não é repetido"""
+        client = Mock()
+        client.send.return_value = (None, "Read timed out")
+        drainer = OutboxDrainer(self.outbox, client, num_workers=1, poll_interval=0.01)
+        self.outbox.enqueue("1", text_payload("1", "Olá"))
+        self.outbox.enqueue("1", text_payload("1", "Tudo bem?"))
+        
+        drainer.start()
+        deadline = time.time() + 5
+        while self.outbox.get_stats()['unknown'] < 2 and time.time() < deadline:
+            time.sleep(0.01)
+        drainer.stop()
+        
+        stats = drainer.get_stats()
+        self.assertEqual(stats['unknown'], 2)
+        self.assertEqual(stats['unknown_total'], 2)
+        self.assertEqual(stats['failed_attempts'], 0)
+        # Uma chamada por mensagem; a segunda não fica presa atrás da primeira
+        self.assertEqual(client.send.call_count, 2)
+    
+    def test_rate_limited_recipient_does_not_hold_worker(self):
+        """Testa que um destinatário no limite volta ao outbox e não atrasa os outros"""
+        limiter = OutboundRateLimiter(global_rate=1000, global_burst=1000, pair_rate=4, pair_burst=1)
+        client = WhatsAppClient(token="t", phone_id="1", rate_limiter=limiter)
+        client.session = Mock()
+        sent = []
+        
+        def post(url, json, timeout):
+            sent.append((json["to"], time.monotonic()))
+            response = Mock(status_code=200, headers={})
+            response.json.return_value = {"messages": [{"id": f"wamid.{len(sent)}"}]}
+            return response
+        
+        client.session.post.side_effect = post
+        drainer = OutboxDrainer(self.outbox, client, num_workers=1, poll_interval=5)
+        for text in ("um", "dois", "três"):
+            self.outbox.enqueue("1", text_payload("1", text))
+        self.outbox.enqueue("2", text_payload("2", "outra"))
+        
+        start = time.monotonic()
+        drainer.start()
+        deadline = time.time() + 5
+        while self.outbox.get_stats()['delivered'] < 4 and time.time() < deadline:
+            time.sleep(0.01)
+        drainer.stop()
+        
+        self.assertEqual([phone for phone, _ in sent], ["1", "2", "1", "1"])
+        # O telefone 2 não esperou o limite do telefone 1, que segue o ritmo do limitador (~0,25s)
+        self.assertLess(sent[1][1] - start, 0.1)
+        self.assertGreater(sent[3][1] - start, 0.4)
+        self.assertLess(sent[3][1] - start, 2.0)
+        self.assertGreaterEqual(drainer.get_stats()['deferred_total'], 2)
+        self.assertEqual(drainer.get_stats()['failed_attempts'], 0)
+
+if __name__ == '__main__':
+    unittest.main()
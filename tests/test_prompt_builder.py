@@ -0,0 +1,63 @@
+import unittest
+import sys
+import os
+import json
+
+# Adiciona o diretório src ao path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from prompt_builder import PromptBuilder, fit_data, estimate_tokens
+
+SYSTEM_PROMPT = """
+        Você é um assistente de um salão de beleza.
+        Responda em JSON.
+        """
+
+class TestPromptBuilder(unittest.TestCase):
+    def setUp(self):
+        """Cria um builder com orçamento pequeno"""
+        self.builder = PromptBuilder(SYSTEM_PROMPT, max_tokens=300, data_max_tokens=60, message_max_tokens=80)
+    
+    def test_static_prefix_is_built_once(self):
+        """Testa que o prefixo é o mesmo em todos os turnos, sem indentação"""
+        first, _ = self.builder.build('greeting', {}, "Oi")
+        second, _ = self.builder.build('help', {"service_id": "1"}, "Quero ajuda")
+        
+        self.assertTrue(first.startswith("Você é um assistente de um salão de beleza.\nResponda em JSON."))
+        self.assertEqual(first[:len(self.builder.prefix)], second[:len(self.builder.prefix)])
+        self.assertIn('Dados da conversa: {"service_id":"1"}', second)
+    
+    def test_long_message_is_truncated(self):
+        """Testa que a mensagem do cliente respeita o limite da seção"""
+        prompt, sections = self.builder.build('greeting', {}, "palavra " * 500)
+        
+        self.assertLessEqual(sections["message"], 80)
+        self.assertLessEqual(sections["total"], 300)
+        self.assertIn("[...]", prompt)
+        self.assertEqual(self.builder.get_stats()["truncated"], 1)
+    
+    def test_fit_data_drops_largest_keys(self):
+        """Testa que os dados grandes são encurtados e as chaves maiores removidas"""
+        data = {"service_id": "1", "date": "2024-01-15", "notes": "x" * 2000, "history": ["y" * 150] * 10}
+        
+        fitted = json.loads(fit_data(data, 40))
+        
+        self.assertEqual(fitted["service_id"], "1")
+        self.assertEqual(fitted["date"], "2024-01-15")
+        self.assertIn("history", fitted["_omitted"])
+        self.assertLessEqual(estimate_tokens(fit_data(data, 40)), 40)
+    
+    def test_stats_per_section(self):
+        """Testa o registro do tamanho de cada seção por turno"""
+        self.builder.build('greeting', {"service_id": "1"}, "Oi")
+        self.builder.build('greeting', {}, "Quais serviços vocês têm?")
+        
+        stats = self.builder.get_stats()
+        self.assertEqual(stats["turns"], 2)
+        self.assertEqual(stats["truncated"], 0)
+        self.assertEqual(stats["prompt_tokens"]["count"], 2)
+        self.assertEqual(set(stats["sections"]), {"system", "context", "history", "message"})
+        self.assertEqual(stats["sections"]["system"]["avg"], self.builder.prefix_tokens)
+
+if __name__ == '__main__':
+    unittest.main()
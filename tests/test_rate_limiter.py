@@ -0,0 +1,116 @@
+import unittest
+import sys
+import os
+import time
+from unittest.mock import Mock
+
+# Adiciona o diretório src ao path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from rate_limiter import OutboundRateLimiter, TokenBucket, RateLimitDeferred
+from whatsapp_client import WhatsAppClient
+
+class TestOutboundRateLimiter(unittest.TestCase):
+    def test_token_bucket_reserves_future_tokens(self):
+        """Testa que o bucket agenda os envios acima da rajada"""
+        bucket = TokenBucket(rate=10, capacity=2)
+        now = time.monotonic()
+        
+        waits = [bucket.reserve(now) for _ in range(4)]
+        
+        self.assertEqual(waits[:2], [0.0, 0.0])
+        self.assertAlmostEqual(waits[2], 0.1, places=2)
+        self.assertAlmostEqual(waits[3], 0.2, places=2)
+    
+    def test_pair_limit_queues_instead_of_dropping(self):
+        """Testa que o excesso para o mesmo destinatário espera na fila"""
+        limiter = OutboundRateLimiter(global_rate=1000, global_burst=1000, pair_rate=20, pair_burst=1)
+        
+        limiter.acquire("5511999999999")
+        wait = limiter.acquire("5511999999999")
+        other = limiter.acquire("5511888888888")
+        
+        self.assertGreater(wait, 0.03)
+        self.assertEqual(other, 0.0)
+        self.assertEqual(limiter.get_stats()["sent"], 3)
+    
+    def test_penalize_pair_code_blocks_only_recipient(self):
+        """Testa que o erro de limite de par suspende só aquele destinatário"""
+        limiter = OutboundRateLimiter(global_rate=1000, global_burst=1000, pair_rate=1000, pair_burst=1000)
+        
+        delay = limiter.penalize("5511999999999", error_code=131056, retry_after="0.05")
+        
+        self.assertEqual(delay, 0.05)
+        self.assertEqual(limiter.acquire("5511888888888"), 0.0)
+        self.assertGreater(limiter.acquire("5511999999999"), 0.0)
+    
+    def test_penalize_backs_off_exponentially(self):
+        """Testa o backoff exponencial sem Retry-After"""
+        limiter = OutboundRateLimiter(backoff_base=0.01)
+        
+        delays = [limiter.penalize(error_code=130429) for _ in range(3)]
+        limiter.record_success()
+        
+        self.assertEqual(delays, [0.01, 0.02, 0.04])
+        self.assertEqual(limiter.penalize(error_code=130429), 0.01)
+    
+    def test_wait_times_are_reported(self):
+        """Testa que os tempos de espera aparecem nas métricas"""
+        limiter = OutboundRateLimiter(global_rate=50, global_burst=1)
+        
+        limiter.acquire("5511000000001")
+        limiter.acquire("5511000000002")
+        
+        stats = limiter.get_stats()
+        self.assertEqual(stats["wait_ms"]["count"], 2)
+        self.assertGreater(stats["wait_ms"]["max"], 0)
+    
+    def test_client_retries_after_rate_limit_error(self):
+        """Testa que o cliente reenvia após erro de limite usando o limitador"""
+        limiter = OutboundRateLimiter(global_rate=1000, global_burst=1000, pair_rate=1000, pair_burst=1000)
+        client = WhatsAppClient(token="t", phone_id="1", max_retries=1, backoff_base=0, rate_limiter=limiter)
+        client.session = Mock()
+        
+        limited = Mock(status_code=400, text="limit", headers={"Retry-After": "0.01"})
+        limited.json.return_value = {"error": {"code": 131056}}
+        ok = Mock(status_code=200, headers={})
+        ok.json.return_value = {}
+        client.session.post.side_effect = [limited, ok]
+        
+        success, _ = client.send_text("5511999999999", "Olá")
+        
+        self.assertTrue(success)
+        self.assertEqual(limiter.get_stats()["rate_limited"], 1)
+    
+    def test_non_blocking_acquire_returns_wait_without_reserving(self):
+        """Testa que o acquire sem bloqueio não espera nem consome o token do destinatário"""
+        limiter = OutboundRateLimiter(global_rate=1000, global_burst=1000, pair_rate=10, pair_burst=1)
+        
+        self.assertEqual(limiter.acquire("5511999999999", block=False), 0.0)
+        start = time.monotonic()
+        first = limiter.acquire("5511999999999", block=False)
+        second = limiter.acquire("5511999999999", block=False)
+        
+        self.assertLess(time.monotonic() - start, 0.05)
+        self.assertAlmostEqual(first, 0.1, places=2)
+        self.assertLessEqual(second, first)
+        self.assertEqual(limiter.acquire("5511888888888", block=False), 0.0)
+        stats = limiter.get_stats()
+        self.assertEqual((stats["sent"], stats["deferred"]), (2, 2))
+    
+    def test_client_defers_instead_of_waiting(self):
+        """Testa que o envio sem bloqueio levanta RateLimitDeferred sem chamar a API"""
+        limiter = OutboundRateLimiter(global_rate=1000, global_burst=1000, pair_rate=1, pair_burst=1)
+        client = WhatsAppClient(token="t", phone_id="1", rate_limiter=limiter)
+        client.session = Mock()
+        client.session.post.return_value = Mock(status_code=200, headers={})
+        
+        client.send(client.build_text_payload("5511999999999", "Olá"), block=False)
+        with self.assertRaises(RateLimitDeferred) as deferred:
+            client.send(client.build_text_payload("5511999999999", "Tudo bem?"), block=False)
+        
+        self.assertGreater(deferred.exception.wait, 0.5)
+        self.assertEqual(client.session.post.call_count, 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import unittest
+import sys
+import os
+from datetime import date
+from unittest.mock import Mock
+
+# Adiciona o diretório src ao path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from response_cache import ResponseCache, MemoryCacheBackend, DynamoDBCacheBackend
+
+class TestResponseCache(unittest.TestCase):
+    def setUp(self):
+        """Cria um cache em memória"""
+        self.cache = ResponseCache(MemoryCacheBackend(max_entries=2), ttl_seconds=60)
+        self.response = {"message": "Olá! Como posso ajudar?", "action": "continue_conversation", "data": {}}
+    
+    def test_key_is_canonical(self):
+        """Testa que a chave ignora caixa, acentos, pontuação, ordem e dados do cliente"""
+        today = date(2026, 10, 18)
+        key = self.cache.make_key("greeting", "Olá!", {"service_id": "manicure", "date": "2026-10-20"}, today)
+        
+        self.assertEqual(key, self.cache.make_key(
+            "greeting", "  ola ", {"date": "2026-10-20", "service_id": "manicure", "client_name": "Maria"}, today
+        ))
+        self.assertNotEqual(key, self.cache.make_key("service_selection", "Olá!", {"service_id": "manicure", "date": "2026-10-20"}, today))
+        self.assertNotEqual(key, self.cache.make_key("greeting", "Olá!", {"service_id": "manicure", "date": "2026-10-20"}, date(2026, 10, 19)))
+    
+    def test_hit_returns_copy(self):
+        """Testa acerto no cache e que a resposta devolvida é uma cópia"""
+        key = self.cache.make_key("greeting", "oi", {})
+        self.assertIsNone(self.cache.get(key))
+        self.cache.put(key, self.response)
+        
+        cached = self.cache.get(key)
+        cached["message"] = "alterada"
+        
+        self.assertEqual(self.cache.get(key)["message"], "Olá! Como posso ajudar?")
+        self.assertEqual(self.cache.get_stats()["hit_rate"], round(2 / 3, 4))
+    
+    def test_live_data_actions_are_not_cached(self):
+        """Testa que ações dependentes de dados ao vivo não são guardadas"""
+        key = self.cache.make_key("date_selection", "amanhã", {"service_id": "manicure"})
+        
+        stored = self.cache.put(key, {"message": "Vou verificar", "action": "check_availability", "data": {"date": "2026-10-19"}})
+        
+        self.assertFalse(stored)
+        self.assertIsNone(self.cache.get(key))
+        self.assertEqual(self.cache.get_stats()["skipped"], 1)
+    
+    def test_personalized_responses_are_not_cached(self):
+        """Testa que respostas que citam o cliente não são guardadas"""
+        key = self.cache.make_key("greeting", "oi", {})
+        
+        self.assertFalse(self.cache.put(key, dict(self.response, message="Olá, Ana!"), personal_values=["Ana"]))
+        self.assertTrue(self.cache.put(key, dict(self.response, message="Boa semana!"), personal_values=["Ana"]))
+    
+    def test_lru_eviction(self):
+        """Testa que o cache descarta a entrada usada há mais tempo"""
+        self.cache.put("a", self.response)
+        self.cache.put("b", self.response)
+        self.cache.get("a")
+        self.cache.put("c", self.response)
+        
+        self.assertIsNotNone(self.cache.get("a"))
+        self.assertIsNone(self.cache.get("b"))
+    
+    def test_shared_backend_errors_count_as_miss(self):
+        """Testa que falhas do backend compartilhado não interrompem o fluxo"""
+        db_service = Mock()
+        db_service.get_cached_response.return_value = (False, "timeout")
+        cache = ResponseCache(DynamoDBCacheBackend(db_service))
+        
+        self.assertIsNone(cache.get("k"))
+        self.assertEqual(cache.get_stats()["backend_errors"], 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import unittest
+import sys
+import os
+import json
+from datetime import date
+
+# Adiciona o diretório src ao path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from response_schema import ResponseParser, extract_json, normalize_date, normalize_time
+
+class TestResponseSchema(unittest.TestCase):
+    def setUp(self):
+        """Cria um parser com os estados do agente"""
+        self.parser = ResponseParser(states=['greeting', 'service_selection', 'time_selection'])
+    
+    def test_extract_ignores_fences_and_prose(self):
+        """Testa a extração do objeto entre cercas de markdown e texto extra"""
+        text = 'Claro!\n```json\n{"message": "Oi {nome}", "action": "show_services", "data": {}}\n```\nAté mais!'
+        
+        candidate, repairs = extract_json(text)
+        
+        self.assertEqual(json.loads(candidate)["message"], "Oi {nome}")
+        self.assertEqual(repairs, [])
+    
+    def test_extract_repairs_common_mistakes(self):
+        """Testa a correção de aspas simples, vírgulas sobrando, literais e chaves sem aspas"""
+        candidate, repairs = extract_json("{'message': 'Olá', action: 'show_services', 'data': {'ok': True,},}")
+        
+        self.assertEqual(json.loads(candidate), {"message": "Olá", "action": "show_services", "data": {"ok": True}})
+        self.assertEqual(repairs, ['literals', 'quotes', 'trailing_comma', 'unquoted_keys'])
+    
+    def test_extract_closes_truncated_output(self):
+        """Testa o fechamento de uma resposta cortada no meio"""
+        candidate, repairs = extract_json('{"message": "Temos horários", "action": "check_availability", "data": {"date": "2024-0')
+        
+        self.assertEqual(json.loads(candidate)["data"], {"date": "2024-0"})
+        self.assertIn('truncated', repairs)
+    
+    def test_fields_are_normalized(self):
+        """Testa a conversão de datas, horários e ids para o formato do agente"""
+        response = self.parser.parse(
+            '{"message": "Ok", "action": "create_appointment", '
+            '"data": {"service_id": "Manicure", "date": "25/12/2024", "time": "14h", "state": "time_selection"}}')
+        
+        self.assertEqual(response["data"], {"service_id": "manicure", "date": "2024-12-25", "time": "14:00",
+                                            "state": "time_selection"})
+        self.assertEqual(normalize_date("10/01", today=date(2024, 12, 20)), "2025-01-10")
+        self.assertEqual(normalize_time("9:30"), "09:30")
+        self.assertIsNone(normalize_time("25:00"))
+    
+    def test_invalid_fields_are_dropped_and_counted(self):
+        """Testa que valores inválidos são descartados e a ação desconhecida vira conversa"""
+        response = self.parser.parse(
+            '{"message": "Ok", "action": "book_now", "data": {"date": "amanhã", "state": "voando", "conversation_data": 3}}')
+        
+        self.assertEqual(response, {"message": "Ok", "action": "continue_conversation", "data": {}})
+        stats = self.parser.get_stats()
+        self.assertEqual(stats["invalid_fields"], {"action": 1, "data.date": 1, "data.state": 1, "data.conversation_data": 1})
+    
+    def test_required_fields_filled_from_conversation(self):
+        """Testa que campos obrigatórios ausentes vêm dos dados da conversa"""
+        response = self.parser.parse('{"message": "Vou verificar", "action": "check_availability", "data": {"date": "2024-12-25"}}',
+                                     conversation_data={"service_id": "escova", "date": "2024-12-20"})
+        
+        self.assertEqual(response["data"], {"date": "2024-12-25", "service_id": "escova"})
+        self.assertEqual(self.parser.get_stats()["filled_from_context"], 1)
+    
+    def test_failure_rate(self):
+        """Testa a taxa de falhas quando não há JSON na resposta"""
+        self.assertIsNone(self.parser.parse("Desculpe, não entendi."))
+        self.assertIsNotNone(self.parser.parse('{"message": "Oi"}'))
+        
+        stats = self.parser.get_stats()
+        self.assertEqual((stats["parsed"], stats["failures"], stats["failure_rate"]), (2, 1, 0.5))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+import unittest
+import sys
+import os
+from unittest.mock import Mock, patch
+
+# Adiciona o diretório src ao path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from service_catalog import ServiceCatalog
+
+SERVICES = [
+    {"service_id": "manicure", "name": "Manicure", "duration_minutes": 45, "price": 20.0},
+    {"service_id": "escova", "name": "Escova", "duration_minutes": 45, "price": 30.0}
+]
+
+class TestServiceCatalog(unittest.TestCase):
+    def setUp(self):
+        self.db_service = Mock()
+        self.db_service.get_all_services.return_value = (True, list(SERVICES))
+        self.catalog = ServiceCatalog(self.db_service, ttl_seconds=60)
+    
+    def test_loads_once_and_serves_from_memory(self):
+        """Testa que o catálogo é lido uma vez e atende listas e serviços individuais"""
+        for _ in range(3):
+            self.assertEqual(self.catalog.get_all_services(), (True, SERVICES))
+            self.assertEqual(self.catalog.get_service("escova"), (True, SERVICES[1]))
+        
+        self.assertEqual(self.db_service.get_all_services.call_count, 1)
+        self.db_service.get_service.assert_not_called()
+        self.assertEqual(self.catalog.get_stats()["hits"], 5)
+    
+    def test_reloads_after_ttl_and_keeps_stale_data_on_error(self):
+        """Testa a recarga após o TTL e o uso da carga anterior se o DynamoDB falhar"""
+        with patch('service_catalog.time.monotonic', return_value=1000.0):
+            self.catalog.get_all_services()
+        
+        self.db_service.get_all_services.return_value = (False, "Erro ao buscar serviços: timeout")
+        with patch('service_catalog.time.monotonic', return_value=1061.0):
+            self.assertEqual(self.catalog.get_service("manicure"), (True, SERVICES[0]))
+        
+        self.assertEqual(self.db_service.get_all_services.call_count, 2)
+        self.assertEqual(self.catalog.get_stats()["load_errors"], 1)
+    
+    def test_failed_reload_waits_before_retrying(self):
+        """Testa que, após uma falha na recarga, a carga anterior é usada sem um scan por leitura"""
+        self.catalog.retry_seconds = 30
+        with patch('service_catalog.time.monotonic', return_value=1000.0):
+            self.catalog.get_all_services()
+        
+        self.db_service.get_all_services.return_value = (False, "Erro ao buscar serviços: timeout")
+        for now in (1061.0, 1062.0, 1090.0):
+            with patch('service_catalog.time.monotonic', return_value=now):
+                self.assertEqual(self.catalog.get_all_services(), (True, SERVICES))
+        self.assertEqual(self.db_service.get_all_services.call_count, 2)
+        
+        self.db_service.get_all_services.return_value = (True, SERVICES[:1])
+        with patch('service_catalog.time.monotonic', return_value=1092.0):
+            self.assertEqual(self.catalog.get_all_services(), (True, SERVICES[:1]))
+        with patch('service_catalog.time.monotonic', return_value=1100.0):
+            self.catalog.get_all_services()
+        self.assertEqual(self.db_service.get_all_services.call_count, 3)
+        self.assertEqual(self.catalog.get_stats()["load_errors"], 1)
+    
+    def test_unknown_service_reads_single_item(self):
+        """Testa que um id fora da carga é lido com get_item e guardado"""
+        pedicure = {"service_id": "pedicure", "name": "Pedicure", "duration_minutes": 60, "price": 25.0}
+        self.db_service.get_service.return_value = (True, pedicure)
+        
+        self.assertEqual(self.catalog.get_service("pedicure"), (True, pedicure))
+        self.assertEqual(self.catalog.get_service("pedicure"), (True, pedicure))
+        
+        self.db_service.get_service.assert_called_once_with("pedicure")
+        self.assertEqual(self.catalog.get_stats()["item_reads"], 1)
+
+if __name__ == '__main__':
+    unittest.main()
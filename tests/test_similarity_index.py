@@ -0,0 +1,77 @@
+import unittest
+import sys
+import os
+from datetime import date
+
+# Adiciona o diretório src ao path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from similarity_index import SimilarityIndex, similarity_scope
+
+SERVICES_RESPONSE = {"message": "Temos estes serviços:", "action": "show_services", "data": {}}
+
+class TestSimilarityIndex(unittest.TestCase):
+    def setUp(self):
+        """Cria um índice com reconstrução síncrona"""
+        self.index = SimilarityIndex(threshold=0.8, background_rebuild=False)
+        self.scope = similarity_scope('greeting', {})
+    
+    def test_paraphrase_reuses_response(self):
+        """Testa que variações da mesma mensagem reaproveitam a resposta"""
+        self.index.add(self.scope, "Quero cortar o cabelo", SERVICES_RESPONSE)
+        
+        self.assertEqual(self.index.lookup(self.scope, "queria cortar meu cabelo!"), SERVICES_RESPONSE)
+        self.assertEqual(self.index.lookup(self.scope, "cortar cabelo"), SERVICES_RESPONSE)
+        self.assertIsNone(self.index.lookup(self.scope, "qual o endereço?"))
+        
+        stats = self.index.get_stats()
+        self.assertEqual((stats['hits'], stats['misses']), (2, 1))
+    
+    def test_guard_words_must_match(self):
+        """Testa que negações, números e datas diferentes impedem o reaproveitamento"""
+        self.index.add(self.scope, "quero corte amanhã às 10", SERVICES_RESPONSE)
+        
+        self.assertIsNone(self.index.lookup(self.scope, "não quero corte amanhã às 10"))
+        self.assertIsNone(self.index.lookup(self.scope, "quero corte hoje às 10"))
+        self.assertIsNone(self.index.lookup(self.scope, "quero corte amanhã às 11"))
+        self.assertIsNotNone(self.index.lookup(self.scope, "queria um corte amanha as 10"))
+    
+    def test_scope_and_client_fields(self):
+        """Testa que o escopo separa estados mas ignora os dados do cliente"""
+        self.index.add(self.scope, "quais serviços vocês fazem", SERVICES_RESPONSE)
+        
+        self.assertIsNone(self.index.lookup(similarity_scope('help', {}), "quais serviços vocês fazem"))
+        self.assertEqual(self.scope, similarity_scope('greeting', {'client_name': 'Ana'}))
+    
+    def test_returns_copy_and_expires_next_day(self):
+        """Testa que a resposta é uma cópia e que o índice vale só para o dia"""
+        self.index.add(self.scope, "quais serviços", SERVICES_RESPONSE, today=date(2024, 1, 1))
+        
+        found = self.index.lookup(self.scope, "quais serviços", today=date(2024, 1, 1))
+        found["message"] = "alterada"
+        self.assertEqual(self.index.lookup(self.scope, "quais serviços", today=date(2024, 1, 1)), SERVICES_RESPONSE)
+        self.assertIsNone(self.index.lookup(self.scope, "quais serviços", today=date(2024, 1, 2)))
+    
+    def test_ivf_rebuild_keeps_entries_searchable(self):
+        """Testa a busca depois da troca para o índice agrupado"""
+        index = SimilarityIndex(threshold=0.8, flat_limit=64, nprobe=4, background_rebuild=False)
+        for i in range(300):
+            index.add(self.scope, f"mensagem numero{i} palavra{i * 7} texto{i * 13}", {"message": str(i)})
+        
+        stats = index.get_stats()
+        self.assertGreaterEqual(stats['rebuilds'], 1)
+        self.assertEqual(stats['entries'], 300)
+        found = index.lookup(self.scope, "mensagem numero123 palavra861 texto1599")
+        self.assertEqual(found, {"message": "123"})
+    
+    def test_max_entries_and_dedup(self):
+        """Testa o limite de entradas e que mensagens repetidas não são indexadas de novo"""
+        index = SimilarityIndex(max_entries=2)
+        self.assertTrue(index.add(self.scope, "quais serviços", SERVICES_RESPONSE))
+        self.assertFalse(index.add(self.scope, "Quais serviços?", SERVICES_RESPONSE))
+        self.assertTrue(index.add(self.scope, "endereço do salão", SERVICES_RESPONSE))
+        self.assertFalse(index.add(self.scope, "horário de funcionamento", SERVICES_RESPONSE))
+        self.assertEqual(index.get_stats()['skipped'], 2)
+
+if __name__ == '__main__':
+    unittest.main()
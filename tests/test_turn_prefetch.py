@@ -0,0 +1,49 @@
+import unittest
+import sys
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Adiciona o diretório src ao path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from turn_prefetch import TurnPrefetch, TurnTimer, TurnStats
+
+class TestTurnPrefetch(unittest.TestCase):
+    def setUp(self):
+        self.executor = ThreadPoolExecutor(max_workers=4)
+    
+    def tearDown(self):
+        self.executor.shutdown(wait=True)
+    
+    def test_slowest_blocking_read_is_the_critical_path(self):
+        """Testa que a leitura mais lenta aguardada antes do LLM é registrada como caminho crítico"""
+        prefetch = TurnPrefetch(self.executor)
+        timer = TurnTimer()
+        prefetch.submit('context', None, lambda: (time.sleep(0.01), (True, {}))[1])
+        prefetch.submit('client', None, lambda: (time.sleep(0.08), (True, {}))[1])
+        
+        self.assertEqual(prefetch.result('context'), (True, {}))
+        self.assertEqual(prefetch.result('client'), (True, {}))
+        timer.mark('reads')
+        
+        stats = TurnStats()
+        stats.record(timer, prefetch, blocking_reads=('context', 'client'))
+        result = stats.get_stats()
+        self.assertEqual(result["critical_reads"], {"client": 1})
+        self.assertGreaterEqual(result["reads_ms"]["client"]["max"], 80)
+        self.assertGreaterEqual(result["segments_ms"]["reads"]["max"], 80)
+    
+    def test_failed_read_returns_default_and_key_must_match(self):
+        """Testa o valor padrão de leituras com erro e a chave das leituras antecipadas"""
+        prefetch = TurnPrefetch(self.executor)
+        prefetch.submit('services', None, lambda: 1 / 0)
+        prefetch.submit('availability', ('manicure', '2026-12-25'), lambda: ('service', []))
+        
+        self.assertEqual(prefetch.result('services', (False, None)), (False, None))
+        self.assertFalse(prefetch.has('availability', ('manicure', '2026-12-26')))
+        self.assertTrue(prefetch.has('availability', ('manicure', '2026-12-25')))
+        self.assertEqual(prefetch.unused(), ['availability'])
+
+if __name__ == '__main__':
+    unittest.main()
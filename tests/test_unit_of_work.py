@@ -0,0 +1,77 @@
+import unittest
+import sys
+import os
+from unittest.mock import Mock
+
+# Adiciona o diretório src ao path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from unit_of_work import TurnUnitOfWork, TurnLimitExceeded, UnitOfWorkStats, read_units, write_units
+
+class TestTurnUnitOfWork(unittest.TestCase):
+    def setUp(self):
+        self.db_service = Mock()
+        self.db_service.get_client.return_value = (True, {"phone_number": "5511999999999", "name": "Ana"})
+        self.db_service.get_conversation_context.return_value = (True, {"state": "greeting", "data": {}})
+        self.db_service.save_conversation_context.return_value = (True, "Contexto salvo com sucesso")
+    
+    def test_repeated_reads_hit_dynamodb_once(self):
+        """Testa que o mesmo item é lido uma única vez por turno"""
+        uow = TurnUnitOfWork(self.db_service)
+        
+        for _ in range(3):
+            self.assertEqual(uow.get_client("5511999999999")[1]["name"], "Ana")
+        
+        self.db_service.get_client.assert_called_once_with("5511999999999")
+        self.assertEqual(uow.reads, 1)
+        self.assertEqual(uow.memo_hits, 2)
+        self.assertEqual(uow.read_units, 0.5)
+    
+    def test_context_write_is_staged_until_flush(self):
+        """Testa que o contexto é gravado uma vez no flush, na última versão, e lido de volta antes disso"""
+        uow = TurnUnitOfWork(self.db_service)
+        uow.save_conversation_context("5511999999999", {"state": "date_selection", "data": {}})
+        uow.save_conversation_context("5511999999999", {"state": "time_selection", "data": {}})
+        
+        self.assertEqual(uow.get_conversation_context("5511999999999")[1]["state"], "time_selection")
+        self.db_service.save_conversation_context.assert_not_called()
+        self.db_service.get_conversation_context.assert_not_called()
+        
+        self.assertTrue(uow.flush())
+        self.db_service.save_conversation_context.assert_called_once_with(
+            "5511999999999", {"state": "time_selection", "data": {}})
+        self.assertEqual((uow.writes, uow.write_units), (1, 1))
+    
+    def test_reads_and_writes_above_cap_are_refused(self):
+        """Testa o limite de leituras e gravações por turno"""
+        uow = TurnUnitOfWork(self.db_service, max_reads=1, max_writes=0)
+        
+        self.assertTrue(uow.get_client("5511999999999")[0])
+        self.assertFalse(uow.get_conversation_context("5511999999999")[0])
+        self.assertFalse(uow.create_appointment(phone_number="5511999999999", service_id="manicure",
+                                                appointment_date="2026-12-25", appointment_time="14:00")[0])
+        self.db_service.create_appointment.assert_not_called()
+        self.assertEqual(uow.capped, 2)
+        
+        stats = UnitOfWorkStats()
+        stats.record(uow)
+        self.assertEqual(stats.get_stats()["capped_turns"], 1)
+    
+    def test_appointment_listing_above_cap_raises(self):
+        """Testa que a lista de agendamentos recusada pelo limite não parece uma lista vazia"""
+        uow = TurnUnitOfWork(self.db_service, max_reads=0)
+        
+        with self.assertRaises(TurnLimitExceeded):
+            uow.iter_appointments_by_phone("5511999999999", status='scheduled')
+        self.db_service.iter_appointments_by_phone.assert_not_called()
+        self.assertEqual(uow.capped, 1)
+    
+    def test_capacity_unit_estimates(self):
+        """Testa a estimativa de RCU (4 KB) e WCU (1 KB)"""
+        self.assertEqual(read_units(100), 0.5)
+        self.assertEqual(read_units(9000), 1.5)
+        self.assertEqual(write_units(100), 1)
+        self.assertEqual(write_units(2500), 3)
+
+if __name__ == '__main__':
+    unittest.main()
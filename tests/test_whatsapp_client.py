@@ -0,0 +1,118 @@
+import unittest
+import sys
+import os
+from unittest.mock import Mock
+import requests
+
+# Adiciona o diretório src ao path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from whatsapp_client import WhatsAppClient
+
+def mock_response(status_code, json_data=None, headers=None):
+    response = Mock()
+    response.status_code = status_code
+    response.json.return_value = json_data or {}
+    response.text = str(json_data)
+    response.headers = headers or {}
+    return response
+
+class TestWhatsAppClient(unittest.TestCase):
+    def setUp(self):
+        """Configura o cliente com a sessão HTTP mockada"""
+        self.client = WhatsAppClient(
+            token="token",
+            phone_id="123",
+            base_url="https://graph.example.com",
+            api_version="v18.0",
+            max_retries=2,
+            backoff_base=0
+        )
+        self.client.session = Mock()
+    
+    def test_headers_and_url_are_prebuilt(self):
+        """Testa que URL e cabeçalhos são montados uma única vez"""
+        client = WhatsAppClient(token="abc", phone_id="999", base_url="https://graph.example.com/", api_version="v18.0")
+        
+        self.assertEqual(client.messages_url, "https://graph.example.com/v18.0/999/messages")
+        self.assertEqual(client.session.headers["Authorization"], "Bearer abc")
+    
+    def test_send_text_success(self):
+        """Testa envio de texto com sucesso"""
+        self.client.session.post.return_value = mock_response(200, {"messages": [{"id": "wamid.1"}]})
+        
+        success, result = self.client.send_text("5511999999999", "Olá")
+        
+        self.assertTrue(success)
+        self.assertEqual(result["messages"][0]["id"], "wamid.1")
+        kwargs = self.client.session.post.call_args.kwargs
+        self.assertEqual(kwargs["json"]["text"]["body"], "Olá")
+        self.assertEqual(kwargs["timeout"], self.client.timeout)
+    
+    def test_retries_transient_errors(self):
+        """Testa nova tentativa para 503 e 429"""
+        self.client.session.post.side_effect = [
+            mock_response(503),
+            mock_response(429, headers={"Retry-After": "0"}),
+            mock_response(200)
+        ]
+        
+        success, _ = self.client.send_text("5511999999999", "Olá")
+        
+        self.assertTrue(success)
+        self.assertEqual(self.client.session.post.call_count, 3)
+    
+    def test_does_not_retry_client_errors(self):
+        """Testa que erros 4xx (exceto 429) não são repetidos"""
+        self.client.session.post.return_value = mock_response(400, {"error": {"message": "invalid"}})
+        
+        success, error = self.client.send_text("5511999999999", "Olá")
+        
+        self.assertFalse(success)
+        self.assertIn("400", error)
+        self.assertEqual(self.client.session.post.call_count, 1)
+    
+    def test_gives_up_after_max_retries(self):
+        """Testa que desiste após esgotar as tentativas de conexão"""
+        self.client.session.post.side_effect = requests.exceptions.ConnectionError("recusada")
+        
+        success, error = self.client.send_text("5511999999999", "Olá")
+        
+        self.assertFalse(success)
+        self.assertIn("conexão", error)
+        self.assertEqual(self.client.session.post.call_count, 3)
+    
+    def test_read_timeout_is_ambiguous(self):
+        """Testa que o timeout de leitura não é repetido e retorna resultado desconhecido"""
+        self.client.session.post.side_effect = requests.exceptions.ReadTimeout("sem resposta")
+        
+        success, error = self.client.send_text("5511999999999", "Olá")
+        
+        self.assertIsNone(success)
+        self.assertIn("sem resposta", error)
+        self.assertEqual(self.client.session.post.call_count, 1)
+    
+    def test_send_list_payload(self):
+        """Testa o payload de mensagem com lista"""
+        self.client.session.post.return_value = mock_response(200)
+        sections = [{"title": "Serviços", "rows": [{"id": "service_manicure", "title": "Manicure"}]}]
+        
+        self.client.send_list("5511999999999", "Escolha um serviço", "Ver serviços", sections, header_text="Salão")
+        
+        payload = self.client.session.post.call_args.kwargs["json"]
+        self.assertEqual(payload["interactive"]["type"], "list")
+        self.assertEqual(payload["interactive"]["action"]["sections"], sections)
+        self.assertEqual(payload["interactive"]["header"]["text"], "Salão")
+    
+    def test_send_response_uses_buttons_when_present(self):
+        """Testa que a resposta do agente com botões vira mensagem interativa"""
+        self.client.session.post.return_value = mock_response(200)
+        buttons = [{"type": "reply", "reply": {"id": "time_14:00", "title": "14:00"}}]
+        
+        self.client.send_response("5511999999999", {"message": "Horários:", "buttons": buttons})
+        
+        payload = self.client.session.post.call_args.kwargs["json"]
+        self.assertEqual(payload["interactive"]["type"], "button")
+
+if __name__ == '__main__':
+    unittest.main()
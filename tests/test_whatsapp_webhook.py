@@ -0,0 +1,166 @@
+import unittest
+import sys
+import os
+import json
+import shutil
+import tempfile
+import threading
+from unittest.mock import Mock, patch
+
+# Adiciona o diretório src ao path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import whatsapp_webhook
+from message_deduplicator import MessageDeduplicator
+from message_spool import MessageSpool, SpoolDrainer
+
+STATUS_PAYLOAD = {
+    "entry": [{
+        "changes": [{
+            "field": "messages",
+            "value": {
+                "statuses": [{"id": "wamid.1", "status": "delivered", "recipient_id": "5511999999999"}]
+            }
+        }]
+    }]
+}
+
+MESSAGE_PAYLOAD = {
+    "entry": [{
+        "changes": [{
+            "value": {
+                "messages": [{
+                    "from": "5511999999999",
+                    "id": "wamid.webhook.test",
+                    "type": "text",
+                    "text": {"body": "Olá"}
+                }]
+            }
+        }]
+    }]
+}
+
+class TestWhatsAppWebhook(unittest.TestCase):
+    def setUp(self):
+        """Configura o cliente de teste do Flask"""
+        self.client = whatsapp_webhook.app.test_client()
+    
+    def test_outbox_is_not_opened_on_import(self):
+        """Testa que importar o módulo não cria o arquivo do outbox"""
+        self.assertIsNone(whatsapp_webhook.outbox)
+        self.assertIsNone(whatsapp_webhook.outbox_drainer)
+    
+    def test_classify_payload(self):
+        """Testa a classificação do corpo sem parse"""
+        self.assertEqual(whatsapp_webhook.classify_payload(json.dumps(STATUS_PAYLOAD).encode()), 'statuses')
+        self.assertEqual(whatsapp_webhook.classify_payload(json.dumps(MESSAGE_PAYLOAD).encode()), 'messages')
+        self.assertEqual(whatsapp_webhook.classify_payload(b'{}'), 'other')
+    
+    def test_message_text_does_not_look_like_messages_key(self):
+        """Testa que o texto de um status não é confundido com a chave messages"""
+        payload = {"entry": [{"changes": [{"value": {"statuses": [{"errors": [{"title": "\"messages\""}]}]}}]}]}
+        
+        self.assertEqual(whatsapp_webhook.classify_payload(json.dumps(payload).encode()), 'statuses')
+    
+    def test_status_callback_skips_processing(self):
+        """Testa que callbacks de status retornam 200 sem chamar o handler"""
+        statuses_before = whatsapp_webhook.get_ingress_stats()["statuses"]
+        
+        with patch.object(whatsapp_webhook, 'process_message') as process_message:
+            response = self.client.post('/webhook', data=json.dumps(STATUS_PAYLOAD), content_type='application/json')
+            
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.get_json(), {"status": "success"})
+            process_message.assert_not_called()
+        
+        self.assertEqual(whatsapp_webhook.get_ingress_stats()["statuses"], statuses_before + 1)
+    
+    def test_message_is_processed(self):
+        """Testa que mensagens passam pelo handler"""
+        with patch.object(whatsapp_webhook, 'process_message') as process_message:
+            response = self.client.post('/webhook', data=json.dumps(MESSAGE_PAYLOAD), content_type='application/json')
+            
+            self.assertEqual(response.status_code, 200)
+            process_message.assert_called_once()
+            self.assertEqual(process_message.call_args[0][0]["text"]["body"], "Olá")
+    
+    def test_retry_after_spool_failure_is_accepted(self):
+        """Testa que a reentrega após um 500 não é descartada como duplicada"""
+        spool = Mock()
+        spool.append_many.side_effect = [Exception("disco cheio"), None]
+        
+        with patch.object(whatsapp_webhook, 'message_spool', spool), \
+             patch.object(whatsapp_webhook, 'deduplicator', MessageDeduplicator()):
+            first = self.client.post('/webhook', data=json.dumps(MESSAGE_PAYLOAD), content_type='application/json')
+            retry = self.client.post('/webhook', data=json.dumps(MESSAGE_PAYLOAD), content_type='application/json')
+            duplicate = self.client.post('/webhook', data=json.dumps(MESSAGE_PAYLOAD), content_type='application/json')
+        
+        self.assertEqual(first.status_code, 500)
+        self.assertEqual(retry.status_code, 200)
+        self.assertEqual(duplicate.status_code, 200)
+        # Gravada na reentrega; a terceira entrega já é duplicada
+        self.assertEqual(spool.append_many.call_count, 2)
+    
+    def test_retry_after_dispatch_failure_is_accepted(self):
+        """Testa a reentrega quando o despacho da mensagem falha"""
+        with patch.object(whatsapp_webhook, 'deduplicator', MessageDeduplicator()), \
+             patch.object(whatsapp_webhook, 'route_message', side_effect=[Exception("fila cheia"), Mock()]) as route_message:
+            first = self.client.post('/webhook', data=json.dumps(MESSAGE_PAYLOAD), content_type='application/json')
+            retry = self.client.post('/webhook', data=json.dumps(MESSAGE_PAYLOAD), content_type='application/json')
+        
+        self.assertEqual(first.status_code, 500)
+        self.assertEqual(retry.status_code, 200)
+        self.assertEqual(route_message.call_count, 2)
+    
+    def test_agent_failure_without_spool_replies_with_error(self):
+        """Testa que sem o spool (sem nova tentativa) o cliente recebe o aviso de erro na hora"""
+        agent = Mock()
+        agent.process_message.side_effect = Exception("DynamoDB indisponível")
+        handler = whatsapp_webhook.make_agent_handler(agent)
+        message = MESSAGE_PAYLOAD["entry"][0]["changes"][0]["value"]["messages"][0]
+        
+        with patch.object(whatsapp_webhook, 'message_spool', None), \
+             patch.object(whatsapp_webhook, 'send_reply') as send_reply:
+            handler(message, {})
+        
+        send_reply.assert_called_once_with("5511999999999", whatsapp_webhook.ERROR_REPLY)
+    
+    def test_spool_retries_agent_failure_then_reports_it(self):
+        """Testa que uma falha do agente volta ao spool e o aviso só sai quando a mensagem é descartada"""
+        temp_dir = tempfile.mkdtemp()
+        spool = MessageSpool(os.path.join(temp_dir, 'spool.db'), max_attempts=2)
+        agent = Mock()
+        agent.process_message.side_effect = [Exception("DynamoDB indisponível"), {"message": "Olá!"},
+                                             Exception("DynamoDB indisponível"), Exception("DynamoDB indisponível")]
+        handler = whatsapp_webhook.make_agent_handler(agent)
+        replies = []
+        done = threading.Event()
+        
+        def send_reply(phone_number, response):
+            replies.append(response["message"])
+            if len(replies) == 2:
+                done.set()
+        
+        drainer = SpoolDrainer(spool, handler=handler, num_workers=1, max_in_flight=1, poll_interval=0.01,
+                               on_dead=whatsapp_webhook.report_failure)
+        message = MESSAGE_PAYLOAD["entry"][0]["changes"][0]["value"]["messages"][0]
+        try:
+            with patch.object(whatsapp_webhook, 'message_spool', spool), \
+                 patch.object(whatsapp_webhook, 'send_reply', side_effect=send_reply):
+                drainer.start()
+                spool.append(message, {})
+                spool.append(dict(message, id="wamid.webhook.test.2"), {})
+                self.assertTrue(done.wait(5))
+                drainer.stop()
+            
+            # Primeira mensagem: falha e depois responde; segunda: falha duas vezes e vai para 'dead'
+            self.assertEqual(replies, ["Olá!", whatsapp_webhook.ERROR_REPLY["message"]])
+            self.assertEqual(agent.process_message.call_count, 4)
+            self.assertEqual(spool.get_stats(), {'pending': 0, 'processing': 0, 'dead': 1})
+        finally:
+            drainer.stop()
+            spool.close()
+            shutil.rmtree(temp_dir)
+
+if __name__ == '__main__':
+    unittest.main()